@@ -90,4 +90,93 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are named by content hash and sharded (see moulding/storage.py);
+# set MEDIA_CONTENT_ADDRESSED=0 to keep the upload names
+MEDIA_CONTENT_ADDRESSED = os.environ.get('MEDIA_CONTENT_ADDRESSED', 'True').lower() in ('1', 'true', 'yes')
+STORAGES = {
+    'default': {
+        'BACKEND': (
+            'moulding.storage.ContentAddressedStorage' if MEDIA_CONTENT_ADDRESSED
+            else 'django.core.files.storage.FileSystemStorage'
+        ),
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Product comparison worker pool (0 runs comparisons on the request thread).
+# Every web process starts its own pool, so keep this small and scale with
+# the number of web processes instead
+COMPARISON_WORKERS = int(os.environ.get('COMPARISON_WORKERS', 2))
+
+# Comparisons queued or running for longer than this are considered lost
+# (e.g. to a restart) and queued again by requeue_comparisons, up to
+# COMPARISON_MAX_ATTEMPTS times before they are marked failed
+COMPARISON_STALE_MINUTES = int(os.environ.get('COMPARISON_STALE_MINUTES', 15))
+COMPARISON_MAX_ATTEMPTS = int(os.environ.get('COMPARISON_MAX_ATTEMPTS', 3))
+
+# Preprocessed master sample arrays, memory-mapped by every worker
+FEATURE_STORE_ROOT = Path(os.environ.get('FEATURE_STORE_ROOT', BASE_DIR / 'feature_store'))
+
+# Coarse-to-fine comparison: score a downscaled image first (1/2 or 1/4) and
+# only go to full resolution when the score falls between the reject and
+# accept bands
+COMPARISON_CASCADE = os.environ.get('COMPARISON_CASCADE', 'False').lower() in ('1', 'true', 'yes')
+COMPARISON_CASCADE_SCALE = int(os.environ.get('COMPARISON_CASCADE_SCALE', 4))
+COMPARISON_CASCADE_ACCEPT = float(os.environ.get('COMPARISON_CASCADE_ACCEPT', 95))
+COMPARISON_CASCADE_REJECT = float(os.environ.get('COMPARISON_CASCADE_REJECT', 70))
+
+# Memory budget for one comparison; larger images are compared in tiles
+# (0 disables tiling)
+COMPARISON_MEMORY_BUDGET_MB = int(os.environ.get('COMPARISON_MEMORY_BUDGET_MB', 512))
+
+# Watched by the watch_hot_folder command; one subdirectory per machine
+HOT_FOLDER_ROOT = Path(os.environ.get('HOT_FOLDER_ROOT', BASE_DIR / 'hot_folder'))
+
+# Comparison results kept in memory per process for repeated product photos
+# (0 disables result reuse)
+COMPARISON_CACHE_SIZE = int(os.environ.get('COMPARISON_CACHE_SIZE', 1024))
+
+# Colour prefilter run before the structural comparison: flags colour drift
+# above COLOR_DRIFT_DELTA_E and skips SSIM for parts beyond the reject limits
+COLOR_PREFILTER = os.environ.get('COLOR_PREFILTER', 'True').lower() in ('1', 'true', 'yes')
+COLOR_DRIFT_DELTA_E = float(os.environ.get('COLOR_DRIFT_DELTA_E', 5))
+COLOR_REJECT_DELTA_E = float(os.environ.get('COLOR_REJECT_DELTA_E', 20))
+COLOR_REJECT_SCORE = float(os.environ.get('COLOR_REJECT_SCORE', 40))
+
+# Video clip comparisons: frames scored per second of clip, frames compared
+# (the sharpest of each part of the clip) and the longest clip decoded
+VIDEO_SAMPLE_FPS = float(os.environ.get('VIDEO_SAMPLE_FPS', 5))
+VIDEO_FRAMES = int(os.environ.get('VIDEO_FRAMES', 5))
+VIDEO_MAX_SECONDS = float(os.environ.get('VIDEO_MAX_SECONDS', 30))
+
+# Uploaded photos are shrunk to this many pixels on the long side and
+# re-encoded as WebP at this quality (see moulding/image_ingest.py)
+IMAGE_MAX_SIDE = int(os.environ.get('IMAGE_MAX_SIDE', 2560))
+IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 90))
+
+# Retention of product comparison images (see moulding/retention.py): full
+# resolution for RETENTION_FULL_DAYS, then downscaled, then moved into zip
+# files under ARCHIVE_ROOT after RETENTION_ARCHIVE_DAYS
+RETENTION_FULL_DAYS = int(os.environ.get('RETENTION_FULL_DAYS', 90))
+RETENTION_ARCHIVE_DAYS = int(os.environ.get('RETENTION_ARCHIVE_DAYS', 365))
+RETENTION_MAX_SIDE = int(os.environ.get('RETENTION_MAX_SIDE', 1024))
+RETENTION_QUALITY = int(os.environ.get('RETENTION_QUALITY', 70))
+RETENTION_ISSUE_LOOKBACK_DAYS = int(os.environ.get('RETENTION_ISSUE_LOOKBACK_DAYS', 7))
+ARCHIVE_ROOT = Path(os.environ.get('ARCHIVE_ROOT', BASE_DIR / 'archive'))
+
+# Seconds the dashboard counters and lists are cached for; saves invalidate
+# them sooner (see moulding/dashboard.py)
+DASHBOARD_CACHE_SECONDS = int(os.environ.get('DASHBOARD_CACHE_SECONDS', 10))
+
+# Live screen updates (see moulding/live.py): how often each open stream
+# checks for changes, and how long a stream stays open before the browser
+# reconnects
+LIVE_POLL_SECONDS = float(os.environ.get('LIVE_POLL_SECONDS', 2))
+LIVE_STREAM_SECONDS = int(os.environ.get('LIVE_STREAM_SECONDS', 300))
+
+# Rows per page of the list views (keyset paginated, see moulding/pagination.py)
+LIST_PAGE_SIZE = int(os.environ.get('LIST_PAGE_SIZE', 50))
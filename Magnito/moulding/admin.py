@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     Mould, MouldChange, TroubleshootingIssue, TroubleshootingLog,
-    HourlyChecklist, MasterSample, ProductComparison, DefectType, MouldRun
+    HourlyChecklist, MasterSample, ProductComparison, DefectType, MouldRun,
+    IngestedImage, ScoreBand, DefectSizeClass, KpiCounter
 )
 
 
@@ -42,8 +43,8 @@ class HourlyChecklistAdmin(admin.ModelAdmin):
 
 @admin.register(MasterSample)
 class MasterSampleAdmin(admin.ModelAdmin):
-    list_display = ['sample_number', 'mould', 'is_active', 'created_by', 'created_at']
-    list_filter = ['is_active', 'created_at']
+    list_display = ['sample_number', 'mould', 'engine', 'is_active', 'created_by', 'created_at']
+    list_filter = ['is_active', 'engine', 'created_at']
     search_fields = ['sample_number', 'mould__name']
 
 
@@ -60,6 +61,19 @@ class DefectTypeAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
 
 
+@admin.register(ScoreBand)
+class ScoreBandAdmin(admin.ModelAdmin):
+    list_display = ['name', 'min_score', 'passes', 'description', 'updated_at']
+    list_editable = ['min_score', 'passes']
+
+
+@admin.register(DefectSizeClass)
+class DefectSizeClassAdmin(admin.ModelAdmin):
+    list_display = ['name', 'min_area', 'max_area', 'heading', 'order']
+    list_editable = ['order']
+    filter_horizontal = ['defect_types']
+
+
 @admin.register(MouldRun)
 class MouldRunAdmin(admin.ModelAdmin):
     list_display = ['mould', 'machine_number', 'setter_name', 'start_time', 'setter_completion_time', 'is_active', 'created_by']
@@ -132,3 +146,16 @@ class HousekeepingTaskAdmin(admin.ModelAdmin):
     list_filter = ['status', 'area_type', 'started_at', 'completed_at']
     search_fields = ['task_number', 'area_description']
     date_hierarchy = 'created_at'
+
+
+@admin.register(IngestedImage)
+class IngestedImageAdmin(admin.ModelAdmin):
+    list_display = ['source_name', 'machine_number', 'status', 'comparison', 'created_at']
+    list_filter = ['status', 'machine_number']
+    search_fields = ['source_name', 'content_hash']
+
+
+@admin.register(KpiCounter)
+class KpiCounterAdmin(admin.ModelAdmin):
+    list_display = ['name', 'value', 'updated_at']
+    readonly_fields = ['name', 'value', 'updated_at']
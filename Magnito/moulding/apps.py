@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class MouldingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'moulding'
+
+    def ready(self):
+        from . import counters, dashboard, defect_rules
+        counters.connect_signals()
+        dashboard.connect_signals()
+        defect_rules.connect_signals()
@@ -0,0 +1,169 @@
+"""
+Shop-floor counts kept in the ``KpiCounter`` table.
+
+Each counter in ``COUNTERS`` counts the rows of one model that match a few
+field conditions. Rather than counting on every page, the counters are
+adjusted as rows change: before a row is saved or deleted its stored state
+is read (locked when inside a transaction), and afterwards the counters it
+entered or left are moved by one with an ``F()`` update. Views that change
+a status do so in ``transaction.atomic()``, so the row and its counters
+commit together.
+
+Changes that bypass the model signals (``QuerySet.update``, raw SQL,
+``loaddata``) are not seen; ``python manage.py reconcile_counters``
+recounts from the tables and repairs any drift.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+
+OPEN_ISSUE_STATUSES = ['open', 'in_progress']
+
+# name: (model, field conditions)
+COUNTERS = {
+    'active_moulds': ('Mould', {'is_active': True}),
+    'active_runs': ('MouldRun', {'is_active': True}),
+    'pending_changes': ('MouldChange', {'status': 'planned'}),
+    'open_issues': ('Issue', {'status__in': OPEN_ISSUE_STATUSES}),
+    'critical_issues': ('Issue', {'status__in': OPEN_ISSUE_STATUSES, 'priority': 'critical'}),
+    'pending_orders': ('ProductionOrder', {'status': 'pending'}),
+    'urgent_orders': ('ProductionOrder', {'status': 'pending', 'priority': 'urgent'}),
+    'pending_housekeeping': ('HousekeepingTask', {'status': 'pending'}),
+    'active_housekeeping': ('HousekeepingTask', {'status': 'in_progress'}),
+}
+
+
+def _model(model_name):
+    from django.apps import apps
+    return apps.get_model('moulding', model_name)
+
+
+def _counters_of(model):
+    return {name: conditions for name, (model_name, conditions) in COUNTERS.items() if model_name == model.__name__}
+
+
+def _fields(conditions):
+    return {lookup.split('__')[0] for lookup in conditions}
+
+
+def _matches(values, conditions):
+    for lookup, expected in conditions.items():
+        field, _, operator = lookup.partition('__')
+        if operator == 'in':
+            if values[field] not in expected:
+                return False
+        elif values[field] != expected:
+            return False
+    return True
+
+
+def memberships(model, values):
+    """Names of the counters a row with these field values counts towards"""
+    return {name for name, conditions in _counters_of(model).items() if _matches(values, conditions)}
+
+
+def _fields_of(model):
+    return set().union(*(_fields(conditions) for conditions in _counters_of(model).values()))
+
+
+def _stored(model, pk):
+    """Counters the stored row ``pk`` counts towards (empty if there is none)"""
+    rows = model._default_manager.filter(pk=pk)
+    if connection.in_atomic_block:
+        rows = rows.select_for_update()
+    values = rows.values(*_fields_of(model)).first()
+    return memberships(model, values) if values else set()
+
+
+def adjust(deltas):
+    """Add ``{name: delta}`` to the counters"""
+    from .models import KpiCounter
+
+    with transaction.atomic():
+        for name, delta in deltas.items():
+            if delta and not KpiCounter.objects.filter(name=name).update(
+                value=F('value') + delta, updated_at=timezone.now()
+            ):
+                # First use: the row is created from a full count, which already includes this change
+                reconcile([name])
+
+
+def recount(names=None):
+    """Count the counters from the tables: one conditional aggregate per model"""
+    names = set(names or COUNTERS)
+    counts = {}
+    for model_name in {COUNTERS[name][0] for name in names}:
+        aggregates = {
+            name: Count('pk', filter=Q(**conditions))
+            for name, (counter_model, conditions) in COUNTERS.items()
+            if counter_model == model_name and name in names
+        }
+        counts.update(_model(model_name).objects.aggregate(**aggregates))
+    return counts
+
+
+def reconcile(names=None, dry_run=False):
+    """
+    Recount the counters and store the true values.
+
+    Returns ``{name: (stored, actual)}`` for the counters that had drifted
+    (``stored`` is None for counters that had no row yet).
+    """
+    from .models import KpiCounter
+
+    with transaction.atomic():
+        actual = recount(names)
+        stored = dict(KpiCounter.objects.select_for_update().filter(name__in=actual).values_list('name', 'value'))
+        drift = {name: (stored.get(name), value) for name, value in actual.items() if stored.get(name) != value}
+        if not dry_run:
+            for name, (_, value) in drift.items():
+                KpiCounter.objects.update_or_create(name=name, defaults={'value': value})
+    return drift
+
+
+def values():
+    """All counters, read from the table in one query"""
+    from .models import KpiCounter
+
+    stored = dict(KpiCounter.objects.values_list('name', 'value'))
+    missing = [name for name in COUNTERS if name not in stored]
+    if missing:
+        stored.update({name: value for name, (_, value) in reconcile(missing).items()})
+    return {name: stored[name] for name in COUNTERS}
+
+
+def _before_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._counted = _stored(sender, instance.pk) if instance.pk else set()
+
+
+def _after_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_counted', set())
+    after = memberships(sender, {field: getattr(instance, field) for field in _fields_of(sender)})
+    deltas = {name: 1 for name in after - before}
+    deltas.update({name: -1 for name in before - after})
+    adjust(deltas)
+    instance._counted = after
+
+
+def _before_delete(sender, instance, **kwargs):
+    instance._counted = _stored(sender, instance.pk)
+
+
+def _after_delete(sender, instance, **kwargs):
+    adjust({name: -1 for name in getattr(instance, '_counted', set())})
+
+
+def connect_signals():
+    """Keep the counters up to date as counted rows are saved and deleted"""
+    from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+    for model_name in {model_name for model_name, _ in COUNTERS.values()}:
+        model = _model(model_name)
+        pre_save.connect(_before_save, sender=model, dispatch_uid=f'counters_pre_save_{model_name}')
+        post_save.connect(_after_save, sender=model, dispatch_uid=f'counters_post_save_{model_name}')
+        pre_delete.connect(_before_delete, sender=model, dispatch_uid=f'counters_pre_delete_{model_name}')
+        post_delete.connect(_after_delete, sender=model, dispatch_uid=f'counters_post_delete_{model_name}')
@@ -0,0 +1,94 @@
+"""
+Counters and lists shown on the dashboard, cached as one snapshot.
+
+The counters are read from the ``KpiCounter`` table in one query (see
+``counters.py``) and the lists are fetched with their related rows joined,
+so building the snapshot costs a fixed handful of queries. Wall displays
+refresh every few seconds, so the snapshot is kept in the cache for ``DASHBOARD_CACHE_SECONDS``; saving or
+deleting any model it shows moves the cache to a new generation once the
+transaction commits (see ``connect_signals``), so the next load rebuilds it.
+
+With the default per-process cache each web worker keeps its own snapshot
+and other workers see a change after at most ``DASHBOARD_CACHE_SECONDS``;
+a shared cache backend in ``CACHES`` makes invalidation immediate for all.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from . import counters
+
+
+CACHE_KEY = 'moulding:dashboard:{}'
+GENERATION_KEY = 'moulding:dashboard:generation'
+
+OPEN_ISSUE = Q(status__in=counters.OPEN_ISSUE_STATUSES)
+
+# Counters shown on the dashboard (see counters.py)
+COUNTERS = [
+    'active_moulds', 'pending_changes', 'open_issues', 'critical_issues',
+    'urgent_orders', 'pending_housekeeping', 'active_housekeeping',
+]
+
+
+def build():
+    """Counters and lists for the dashboard template"""
+    from .models import HourlyChecklist, Issue, MouldRun, ProductionOrder
+
+    values = counters.values()
+    context = {name: values[name] for name in COUNTERS}
+    context['pending_orders_count'] = values['pending_orders']
+    context.update({
+        'recent_checklists': list(
+            HourlyChecklist.objects.select_related('mould', 'operator').order_by('-check_time')[:5]
+        ),
+        'active_runs': list(
+            MouldRun.objects.filter(is_active=True).select_related('mould').order_by('-start_time')
+        ),
+        'pending_orders': list(
+            ProductionOrder.objects.filter(status='pending').select_related('mould').order_by('priority', 'due_date')
+        ),
+        'open_issues_list': list(
+            Issue.objects.filter(OPEN_ISSUE).select_related('category', 'mould').order_by('-priority', '-reported_date')[:5]
+        ),
+    })
+    return context
+
+
+def generation():
+    """Changes whenever a model shown on the dashboard is saved or deleted"""
+    return cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+
+
+def snapshot():
+    """The cached dashboard context, rebuilt when missing or out of date"""
+    return cache.get_or_set(CACHE_KEY.format(generation()), build, settings.DASHBOARD_CACHE_SECONDS)
+
+
+def invalidate():
+    """Make the next ``snapshot`` rebuild"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Evicted: start from a value no earlier generation can have used
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def _changed(sender, **kwargs):
+    # After commit, so a snapshot built meanwhile cannot outlive the change
+    transaction.on_commit(invalidate)
+
+
+def connect_signals():
+    """Invalidate the snapshot whenever a model shown on the dashboard changes"""
+    from django.db.models.signals import post_delete, post_save
+    from .models import (
+        HourlyChecklist, HousekeepingTask, Issue, IssueCategory, Mould, MouldChange, MouldRun, ProductionOrder
+    )
+
+    for model in (Mould, MouldChange, Issue, IssueCategory, ProductionOrder, HousekeepingTask, HourlyChecklist, MouldRun):
+        post_save.connect(_changed, sender=model, dispatch_uid=f'dashboard_save_{model.__name__}')
+        post_delete.connect(_changed, sender=model, dispatch_uid=f'dashboard_delete_{model.__name__}')
@@ -0,0 +1,178 @@
+"""
+Defect rules kept in the database and compiled for fast evaluation.
+
+``ScoreBand`` rows split the similarity score into bands, each with a
+finding and fix steps; ``DefectSizeClass`` rows group defects by area and
+link the ``DefectType`` entries to check for (a class covers areas above
+``min_area`` up to and including ``max_area``). ``RuleSet`` compiles them
+into sorted thresholds searched with ``bisect``, so evaluating a comparison
+is a couple of binary searches and no queries.
+
+Each process keeps one compiled ``RuleSet``. Editing a rule clears it in
+the editing process straight away (see ``connect_signals``); other
+processes notice the change within ``CHECK_INTERVAL`` seconds by comparing
+the row counts and latest ``updated_at`` of the rule tables.
+"""
+import bisect
+import re
+import threading
+import time
+
+from django.db import DatabaseError
+from django.db.models import Count, Max
+
+
+CHECK_INTERVAL = 5.0
+
+# Used when the rule tables do not exist yet (e.g. before migrating)
+DEFAULT_BANDS = [
+    {'min_score': 95, 'passes': True, 'description': "Product matches master sample. No defects detected.", 'fix_instructions': ""},
+    {'min_score': 85, 'passes': False, 'description': "Minor differences detected",
+     'fix_instructions': "Fine-tune injection speed\nCheck material temperature\nVerify mould temperature is consistent"},
+    {'min_score': 70, 'passes': False, 'description': "Moderate differences detected",
+     'fix_instructions': "Check injection pressure and holding pressure\nVerify cooling time is adequate\nInspect mould for wear or damage"},
+    {'min_score': 0, 'passes': False, 'description': "Major differences detected from master sample",
+     'fix_instructions': "Check if correct mould is being used\nVerify material type and color match specifications\n"
+                         "Review machine settings (temperature, pressure, cycle time)"},
+]
+DEFAULT_SIZE_CLASSES = [
+    {'min_area': 1000, 'max_area': None, 'heading': "Large defects detected - check for:",
+     'defect_types': ['Short Shot', 'Flash', 'Sink Marks']},
+    {'min_area': 0, 'max_area': 1000, 'heading': "Small defects detected - check for:",
+     'defect_types': ['Surface Blemishes', 'Flow Marks', 'Contamination']},
+]
+
+_STEP_NUMBER = re.compile(r'^\s*\d+[.)]\s*')
+
+
+def _steps(text):
+    """Fix steps from a text with one step per line (any numbering removed)"""
+    return tuple(_STEP_NUMBER.sub('', line).strip() for line in text.splitlines() if line.strip())
+
+
+class RuleSet:
+    """Compiled score bands and defect size classes"""
+
+    def __init__(self, bands, size_classes):
+        bands = sorted(bands, key=lambda band: band['min_score'])
+        self.thresholds = [band['min_score'] for band in bands]
+        self.bands = [(band['passes'], band['description'], _steps(band['fix_instructions'])) for band in bands]
+        self.size_classes = [
+            (size_class['min_area'], size_class['max_area'], size_class['heading'], tuple(size_class['defect_types']))
+            for size_class in size_classes
+        ]
+
+    def band(self, similarity_score):
+        """``(passes, description, steps)`` of the band a score falls in, or None"""
+        index = bisect.bisect_right(self.thresholds, similarity_score) - 1
+        return self.bands[index] if index >= 0 else None
+
+    def passing_ranges(self):
+        """``(low, high)`` score ranges of the passing bands; ``high`` is None for the top band"""
+        limits = self.thresholds[1:] + [None]
+        return [(low, high) for low, high, band in zip(self.thresholds, limits, self.bands) if band[0]]
+
+    def evaluate(self, defects, similarity_score):
+        """Defect description and numbered fix instructions for one comparison"""
+        band = self.band(similarity_score)
+        if band is not None and band[0]:
+            return band[1], ""
+
+        description = [band[1]] if band is not None else []
+        steps = band[2] if band is not None else ()
+        lines = [f"{number}. {step}" for number, step in enumerate(steps, start=1)]
+        number = len(steps)
+
+        if defects:
+            description.append(f"{len(defects)} defect area(s) identified")
+            areas = sorted(defect['area'] for defect in defects)
+            for min_area, max_area, heading, defect_types in self.size_classes:
+                start = bisect.bisect_right(areas, min_area)
+                end = len(areas) if max_area is None else bisect.bisect_right(areas, max_area)
+                if start < end:
+                    number += 1
+                    lines.append(f"{number}. {heading}")
+                    lines.extend(f"   - {name}" for name in defect_types)
+
+        return "\n".join(description), "\n".join(lines)
+
+
+def default_rules():
+    """Rule set built from ``DEFAULT_BANDS`` and ``DEFAULT_SIZE_CLASSES``"""
+    return RuleSet(DEFAULT_BANDS, DEFAULT_SIZE_CLASSES)
+
+
+def compile_rules():
+    """Load the rules from the database into a new ``RuleSet``"""
+    from .models import DefectSizeClass, ScoreBand
+
+    bands = list(ScoreBand.objects.values('min_score', 'passes', 'description', 'fix_instructions'))
+    size_classes = [
+        {
+            'min_area': size_class.min_area,
+            'max_area': size_class.max_area,
+            'heading': size_class.heading,
+            'defect_types': [defect_type.name for defect_type in size_class.defect_types.all()],
+        }
+        for size_class in DefectSizeClass.objects.prefetch_related('defect_types')
+    ]
+    return RuleSet(bands, size_classes)
+
+
+def rules_version():
+    """Changes whenever a rule row is added, edited or deleted"""
+    from .models import DefectSizeClass, DefectType, ScoreBand
+
+    return tuple(
+        tuple(model.objects.aggregate(count=Count('pk'), updated=Max('updated_at')).values())
+        for model in (ScoreBand, DefectSizeClass, DefectType)
+    )
+
+
+_rules = None
+_version = None
+_checked = 0.0
+_lock = threading.Lock()
+
+
+def get_rules():
+    """This process's compiled rules, recompiled when the tables have changed"""
+    global _rules, _version, _checked
+    if _rules is not None and time.monotonic() - _checked < CHECK_INTERVAL:
+        return _rules
+    with _lock:
+        try:
+            version = rules_version()
+            if _rules is None or version != _version:
+                _rules = compile_rules()
+                _version = version
+        except DatabaseError:
+            _rules, _version = default_rules(), None
+        _checked = time.monotonic()
+        return _rules
+
+
+def invalidate(**kwargs):
+    """Drop this process's compiled rules (signal receiver)"""
+    global _rules
+    _rules = None
+
+
+def _touch(sender, instance, action, **kwargs):
+    """Linking defect types saves neither side; bump ``updated_at`` so other processes notice"""
+    from django.utils import timezone
+
+    if action.startswith('post_'):
+        type(instance).objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+        invalidate()
+
+
+def connect_signals():
+    """Invalidate the compiled rules whenever a rule is edited"""
+    from django.db.models.signals import m2m_changed, post_delete, post_save
+    from .models import DefectSizeClass, DefectType, ScoreBand
+
+    for model in (ScoreBand, DefectSizeClass, DefectType):
+        post_save.connect(invalidate, sender=model, dispatch_uid=f'defect_rules_save_{model.__name__}')
+        post_delete.connect(invalidate, sender=model, dispatch_uid=f'defect_rules_delete_{model.__name__}')
+    m2m_changed.connect(_touch, sender=DefectSizeClass.defect_types.through, dispatch_uid='defect_rules_m2m')
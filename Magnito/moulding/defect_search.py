@@ -0,0 +1,164 @@
+"""
+Search for past comparisons that looked like a new one.
+
+Each finished comparison with defects is described by two 64-bit codes:
+the perceptual hash of the product photo (``product_phash``) and the 8x8
+map of where its defects were found (``defect_signature``). The index keeps
+these codes for every such comparison in flat numpy arrays, so a query is
+one vectorised Hamming-distance scan followed by a partial sort; a few
+hundred thousand comparisons are searched in milliseconds.
+
+The index lives in each process and is brought up to date from the
+database before every query, reading only comparisons it has not seen,
+those that were still unfinished at the previous refresh and those queued
+again since (``queued_at``), whose old codes are replaced.
+"""
+import functools
+import threading
+from datetime import timedelta
+
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .utils import CV2_AVAILABLE
+from .lazy import np
+
+
+@functools.lru_cache(maxsize=None)
+def _popcount():
+    """Bits set in each byte value"""
+    return np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _code(value):
+    return int(value, 16) if value else 0
+
+
+# Re-read comparisons queued this long before the previous refresh, for
+# clock differences between the processes that queue them
+REQUEUE_SLACK = timedelta(seconds=30)
+
+
+class DefectIndex:
+    """Hamming-distance index over (product hash, defect signature) codes"""
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.masters = np.empty(0, dtype=np.int64)
+        self.codes = np.empty((0, 2), dtype=np.uint64)
+        self._seen = set()
+        self._watermark = 0
+        self._waiting = set()
+        self._refreshed = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, rows):
+        """Add ``(pk, master_sample_id, product_phash, defect_signature)`` rows"""
+        self.evict([row[0] for row in rows if row[0] in self._seen])
+        if not rows:
+            return
+        self.ids = np.concatenate([self.ids, np.array([row[0] for row in rows], dtype=np.int64)])
+        self.masters = np.concatenate([self.masters, np.array([row[1] for row in rows], dtype=np.int64)])
+        self.codes = np.concatenate([
+            self.codes,
+            np.array([(_code(row[2]), _code(row[3])) for row in rows], dtype=np.uint64),
+        ])
+        self._seen.update(row[0] for row in rows)
+
+    def evict(self, pks):
+        """Drop the rows of these comparisons"""
+        pks = [pk for pk in pks if pk in self._seen]
+        if not pks:
+            return
+        keep = ~np.isin(self.ids, pks)
+        self.ids, self.masters, self.codes = self.ids[keep], self.masters[keep], self.codes[keep]
+        self._seen.difference_update(pks)
+
+    def refresh(self):
+        """Index comparisons finished since the last refresh"""
+        from .models import ProductComparison
+
+        with self._lock:
+            started = timezone.now()
+            top = ProductComparison.objects.aggregate(top=Max('pk'))['top'] or 0
+            changed = Q(pk__gt=self._watermark, pk__lte=top) | Q(pk__in=self._waiting)
+            if self._refreshed is not None:
+                # Re-run comparisons: their old codes must not be found any more
+                changed |= Q(queued_at__gte=self._refreshed - REQUEUE_SLACK)
+            candidates = list(
+                ProductComparison.objects.filter(changed).order_by('pk').values_list(
+                    'pk', 'status', 'defects_found', 'master_sample_id', 'product_phash', 'defect_signature'
+                )
+            )
+            self.evict([pk for pk, *_ in candidates])
+            self.add([
+                (pk, master_sample_id, product_phash, defect_signature)
+                for pk, status, defects_found, master_sample_id, product_phash, defect_signature in candidates
+                if status == 'done' and defects_found and product_phash
+            ])
+            # Comparisons still queued or running are looked up by id on later
+            # refreshes, so a stuck one does not hold the watermark back
+            self._waiting = {pk for pk, status, *_ in candidates if status in ('pending', 'running')}
+            self._watermark = top
+            self._refreshed = started
+
+    def search(self, product_phash, defect_signature, k=10, exclude=None, master_sample_id=None):
+        """Return up to ``k`` ``(pk, distance)`` pairs, closest first.
+
+        The distance is the number of differing bits in the product hash
+        plus those in the defect signature (0 to 128).
+        """
+        query = np.array([_code(product_phash), _code(defect_signature)], dtype=np.uint64)
+        with self._lock:
+            ids, masters, codes = self.ids, self.masters, self.codes
+        if not len(ids):
+            return []
+
+        distances = _popcount()[(codes ^ query).view(np.uint8)].reshape(len(ids), -1).sum(axis=1, dtype=np.int32)
+        valid = np.ones(len(ids), dtype=bool)
+        if exclude is not None:
+            valid &= ids != exclude
+        if master_sample_id is not None:
+            valid &= masters == master_sample_id
+        candidates = np.flatnonzero(valid)
+        if not len(candidates):
+            return []
+
+        k = min(k, len(candidates))
+        nearest = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+        return [(int(ids[i]), int(distances[i])) for i in nearest]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Return this process's defect index, brought up to date"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DefectIndex()
+    _index.refresh()
+    return _index
+
+
+def similar_comparisons(comparison, k=10, same_master=False):
+    """Past comparisons most like ``comparison``, as ``(comparison, distance)`` pairs"""
+    from .models import ProductComparison
+
+    if not CV2_AVAILABLE or not comparison.product_phash:
+        return []
+    matches = get_index().search(
+        comparison.product_phash, comparison.defect_signature, k=k, exclude=comparison.pk,
+        master_sample_id=comparison.master_sample_id if same_master else None,
+    )
+    found = ProductComparison.objects.select_related('master_sample', 'master_sample__mould').in_bulk(
+        [pk for pk, _ in matches]
+    )
+    # Comparisons deleted since they were indexed are skipped
+    return [(found[pk], distance) for pk, distance in matches if pk in found]
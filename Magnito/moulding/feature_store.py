@@ -0,0 +1,176 @@
+"""
+On-disk store of preprocessed master sample data.
+
+Each master image is decoded once, converted to grayscale and saved as
+``.npy`` arrays in a directory named after the image's content hash::
+
+    FEATURE_STORE_ROOT/<sha256>/gray.npy      full resolution grayscale
+    FEATURE_STORE_ROOT/<sha256>/gray_2.npy    1/2 scale
+    FEATURE_STORE_ROOT/<sha256>/gray_4.npy    1/4 scale
+    FEATURE_STORE_ROOT/<sha256>/hist_color.npy colour histogram
+    FEATURE_STORE_ROOT/<sha256>/descriptor.npy identification descriptor
+    FEATURE_STORE_ROOT/<sha256>/lab_blocks.npy block mean Lab colours
+    FEATURE_STORE_ROOT/<sha256>/meta.json
+
+Arrays are opened with ``mmap_mode='r'`` so every worker process maps the
+same read-only pages from the OS page cache instead of holding its own copy.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+
+from .utils import CV2_AVAILABLE, downscale, color_histogram, image_descriptor, lab_blocks
+from .lazy import cv2, np
+
+
+SCALES = (1, 2, 4)
+HIST_FILE = 'hist_color.npy'
+DESCRIPTOR_FILE = 'descriptor.npy'
+LAB_FILE = 'lab_blocks.npy'
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class MasterFeatures:
+    """Read-only view of the preprocessed data for one master image"""
+
+    def __init__(self, content_hash, path):
+        self.content_hash = content_hash
+        self.path = path
+        self._levels = {}
+        self._color_hist = None
+        self._lab_blocks = None
+
+    def __getstate__(self):
+        # Worker processes reopen the memory maps rather than copying arrays
+        return {'content_hash': self.content_hash, 'path': self.path, '_levels': {}, '_color_hist': None, '_lab_blocks': None}
+
+    @property
+    def gray(self):
+        return self.level(1)
+
+    @property
+    def shape(self):
+        return self.gray.shape
+
+    @property
+    def color_hist(self):
+        if self._color_hist is None:
+            self._color_hist = np.load(os.path.join(self.path, HIST_FILE))
+        return self._color_hist
+
+    @property
+    def lab_blocks(self):
+        if self._lab_blocks is None:
+            self._lab_blocks = np.load(os.path.join(self.path, LAB_FILE))
+        return self._lab_blocks
+
+    @property
+    def descriptor(self):
+        return np.load(os.path.join(self.path, DESCRIPTOR_FILE))
+
+    def levels(self, scales=SCALES):
+        """Stored levels as ``{scale: array}``"""
+        return {scale: self.level(scale) for scale in scales}
+
+    def level(self, scale):
+        """Grayscale master downscaled by ``scale`` (1, 2 or 4)"""
+        if scale not in self._levels:
+            self._levels[scale] = np.load(os.path.join(self.path, _level_name(scale)), mmap_mode='r')
+        return self._levels[scale]
+
+
+def _level_name(scale):
+    return 'gray.npy' if scale == 1 else f'gray_{scale}.npy'
+
+
+def _expected_files():
+    return [_level_name(scale) for scale in SCALES] + [HIST_FILE, DESCRIPTOR_FILE, LAB_FILE, 'meta.json']
+
+
+def _is_complete(path):
+    return all(os.path.isfile(os.path.join(path, name)) for name in _expected_files())
+
+
+def store_root():
+    return str(settings.FEATURE_STORE_ROOT)
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build(image_path, content_hash=None):
+    """Preprocess a master image into the store and return its content hash.
+
+    The entry is written to a temporary directory and renamed into place, so
+    concurrent builders and readers never see a partial entry.
+    """
+    if not CV2_AVAILABLE:
+        return content_hash or file_hash(image_path)
+
+    content_hash = content_hash or file_hash(image_path)
+    target = os.path.join(store_root(), content_hash)
+    if _is_complete(target):
+        return content_hash
+
+    master = cv2.imread(image_path)
+    if master is None:
+        raise ValueError(f"Error loading master image: {image_path}")
+    gray = cv2.cvtColor(master, cv2.COLOR_BGR2GRAY)
+
+    os.makedirs(store_root(), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f'.{content_hash}-', dir=store_root())
+    try:
+        for scale in SCALES:
+            level = gray if scale == 1 else downscale(gray, scale)
+            np.save(os.path.join(tmp_dir, _level_name(scale)), np.ascontiguousarray(level))
+        # Decoded the same way the histogram engine decodes products
+        reduced = cv2.imread(image_path, cv2.IMREAD_REDUCED_COLOR_4)
+        np.save(os.path.join(tmp_dir, HIST_FILE), color_histogram(reduced))
+        np.save(os.path.join(tmp_dir, DESCRIPTOR_FILE), image_descriptor(reduced))
+        np.save(os.path.join(tmp_dir, LAB_FILE), lab_blocks(reduced))
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump({
+                'content_hash': content_hash,
+                'height': int(gray.shape[0]),
+                'width': int(gray.shape[1]),
+                'scales': list(SCALES),
+            }, f)
+        if os.path.isdir(target):
+            # Entry from an older layout; readers keep their open maps
+            shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.rename(tmp_dir, target)
+        except OSError:
+            # Another process finished the same entry first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return content_hash
+
+
+def load(master_sample):
+    """Return ``MasterFeatures`` for a master sample, building them if missing"""
+    content_hash = master_sample.content_hash
+    if not content_hash or not _is_complete(os.path.join(store_root(), content_hash)):
+        content_hash = build(master_sample.image.path, content_hash or None)
+
+    with _cache_lock:
+        features = _cache.get(content_hash)
+        if features is None:
+            features = MasterFeatures(content_hash, os.path.join(store_root(), content_hash))
+            _cache[content_hash] = features
+    return features
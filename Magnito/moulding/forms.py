@@ -1,8 +1,10 @@
 from django import forms
+from django.core.validators import FileExtensionValidator
 from .models import (
     MouldChange, TroubleshootingLog, HourlyChecklist,
     MasterSample, ProductComparison, MouldRun, HousekeepingTask
 )
+from .video import VIDEO_EXTENSIONS
 
 
 class MouldChangeForm(forms.ModelForm):
@@ -44,8 +46,9 @@ class HourlyChecklistForm(forms.ModelForm):
 class MasterSampleForm(forms.ModelForm):
     class Meta:
         model = MasterSample
-        fields = ['mould', 'sample_number', 'image', 'description', 'specifications']
+        fields = ['mould', 'sample_number', 'image', 'engine', 'regions', 'region_mask', 'description', 'specifications']
         widgets = {
+            'regions': forms.Textarea(attrs={'rows': 3}),
             'description': forms.Textarea(attrs={'rows': 3}),
             'specifications': forms.Textarea(attrs={'rows': 4}),
         }
@@ -59,6 +62,78 @@ class ProductComparisonForm(forms.ModelForm):
             'notes': forms.Textarea(attrs={'rows': 3}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['master_sample'].required = False
+        self.fields['master_sample'].help_text = 'Leave blank to identify the master sample from the photo'
+        self.identification = None
+
+    def clean(self):
+        cleaned_data = super().clean()
+        image = cleaned_data.get('product_image')
+        if cleaned_data.get('master_sample') or not image:
+            return cleaned_data
+
+        from .master_index import MIN_CONFIDENCE, MIN_SIMILARITY, identify_master
+        matches = identify_master(image)
+        if not matches or matches[0][1] < MIN_SIMILARITY:
+            self.add_error('master_sample', 'No master sample could be identified. Please choose one.')
+        elif matches[0][2] < MIN_CONFIDENCE:
+            suggestions = ', '.join(f'{master} ({confidence:.0%})' for master, _, confidence in matches)
+            self.add_error('master_sample', f'Not sure which master sample this is: {suggestions}. Please choose one.')
+        else:
+            master, similarity, confidence = matches[0]
+            cleaned_data['master_sample'] = master
+            self.identification = {'similarity': similarity, 'confidence': confidence}
+        return cleaned_data
+
+
+class MultipleImageInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+# Most photos one batch upload may send (one per cavity of the largest moulds)
+MAX_BATCH_IMAGES = 64
+
+
+class MultipleImageField(forms.ImageField):
+    """Image field that accepts several files from one input"""
+    def __init__(self, *args, max_files=None, **kwargs):
+        self.max_files = max_files
+        kwargs.setdefault('widget', MultipleImageInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        single_file_clean = super().clean
+        if not isinstance(data, (list, tuple)):
+            data = [data] if data else []
+        if not data:
+            if self.required:
+                raise forms.ValidationError(self.error_messages['required'], code='required')
+            return []
+        if self.max_files is not None and len(data) > self.max_files:
+            raise forms.ValidationError(
+                f'Upload at most {self.max_files} photos at a time ({len(data)} were sent).', code='max_files'
+            )
+        return [single_file_clean(d, initial) for d in data]
+
+
+class ProductComparisonBatchForm(forms.Form):
+    master_sample = forms.ModelChoiceField(queryset=MasterSample.objects.filter(is_active=True))
+    product_images = MultipleImageField(max_files=MAX_BATCH_IMAGES, help_text="Select one photo per cavity")
+    machine_number = forms.CharField(max_length=50)
+    notes = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 3}))
+
+
+class ProductComparisonVideoForm(forms.Form):
+    master_sample = forms.ModelChoiceField(queryset=MasterSample.objects.filter(is_active=True))
+    product_video = forms.FileField(
+        validators=[FileExtensionValidator(VIDEO_EXTENSIONS)],
+        help_text="Short clip (about 10 seconds) rotating the part",
+    )
+    machine_number = forms.CharField(max_length=50)
+    notes = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 3}))
+
 
 class MouldRunForm(forms.ModelForm):
     class Meta:
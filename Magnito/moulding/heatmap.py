@@ -0,0 +1,104 @@
+"""
+Per-master heatmaps of where defects are found.
+
+Each ``DefectHeatmap`` holds an int32 grid (the master image shrunk to at
+most ``HEATMAP_MAX_SIDE`` cells on its long side) counting how many defect
+boxes covered each cell. Finished comparisons add their boxes and re-run
+comparisons take their old boxes out again, so the grid is always the sum
+over history without ever rescanning it.
+"""
+from django.db import transaction
+
+from .utils import CV2_AVAILABLE, unpack_defects
+from .lazy import cv2, np
+
+
+HEATMAP_MAX_SIDE = 256
+
+
+def grid_shape(height, width):
+    """Heatmap cells for a master of ``height`` x ``width`` pixels"""
+    scale = HEATMAP_MAX_SIDE / max(height, width, 1)
+    return max(1, round(height * scale)), max(1, round(width * scale))
+
+
+def _paint(grid, defects, height, width, weight):
+    rows, cols = grid.shape
+    for defect in defects:
+        x0 = min(cols - 1, defect['x'] * cols // width)
+        y0 = min(rows - 1, defect['y'] * rows // height)
+        x1 = min(cols - 1, (defect['x'] + max(defect['width'], 1) - 1) * cols // width)
+        y1 = min(rows - 1, (defect['y'] + max(defect['height'], 1) - 1) * rows // height)
+        grid[y0:y1 + 1, x0:x1 + 1] += weight
+
+
+def load_grid(heatmap):
+    """The heatmap's counts as a (writable) int32 array"""
+    shape = grid_shape(heatmap.height, heatmap.width)
+    data = bytes(heatmap.grid or b'')
+    if len(data) != shape[0] * shape[1] * 4:
+        return np.zeros(shape, dtype=np.int32)
+    return np.frombuffer(data, dtype='<i4').reshape(shape).copy()
+
+
+def update(master_sample, shape, comparisons, previous=None):
+    """Count the defect boxes of finished ``comparisons`` in the master's heatmap.
+
+    ``shape`` is the master image shape (None if it could not be loaded) and
+    ``previous`` maps comparison ids to the packed boxes they contributed
+    before being re-run. Sets ``in_heatmap`` on the comparisons; call inside
+    the transaction that saves them.
+    """
+    from .models import DefectHeatmap
+
+    if not CV2_AVAILABLE:
+        return
+    previous = previous or {}
+    added = [c for c in comparisons if c.status == 'done']
+    if not added and not previous:
+        return
+
+    with transaction.atomic():
+        heatmap, _ = DefectHeatmap.objects.select_for_update().get_or_create(master_sample=master_sample)
+        grid = load_grid(heatmap)
+        if previous and heatmap.content_hash == master_sample.content_hash:
+            for data in previous.values():
+                removed = unpack_defects(data)
+                _paint(grid, removed, heatmap.height, heatmap.width, -1)
+                heatmap.defect_count -= len(removed)
+            heatmap.comparison_count -= len(previous)
+        if shape is not None and (
+            heatmap.content_hash != master_sample.content_hash
+            or (heatmap.height, heatmap.width) != tuple(shape[:2])
+        ):
+            # New master image: start counting again
+            heatmap.content_hash = master_sample.content_hash
+            heatmap.height, heatmap.width = shape[:2]
+            heatmap.comparison_count = heatmap.defect_count = 0
+            grid = np.zeros(grid_shape(*shape[:2]), dtype=np.int32)
+        if shape is not None:
+            for comparison in added:
+                defects = unpack_defects(comparison.defect_boxes)
+                _paint(grid, defects, heatmap.height, heatmap.width, 1)
+                heatmap.defect_count += len(defects)
+                comparison.in_heatmap = True
+            heatmap.comparison_count += len(added)
+        np.maximum(grid, 0, out=grid)
+        heatmap.comparison_count = max(0, heatmap.comparison_count)
+        heatmap.defect_count = max(0, heatmap.defect_count)
+        heatmap.grid = grid.astype('<i4').tobytes()
+        heatmap.save()
+
+
+def render(heatmap, background=None):
+    """PNG bytes of the heatmap, blended over the grayscale master if given"""
+    grid = load_grid(heatmap)
+    peak = grid.max()
+    scaled = np.uint8(grid * (255.0 / peak)) if peak else np.zeros(grid.shape, dtype=np.uint8)
+    size = (grid.shape[1] * 2, grid.shape[0] * 2)
+    colour = cv2.applyColorMap(cv2.resize(scaled, size, interpolation=cv2.INTER_LINEAR), cv2.COLORMAP_JET)
+    if background is not None:
+        base = cv2.cvtColor(cv2.resize(np.asarray(background), size, interpolation=cv2.INTER_AREA), cv2.COLOR_GRAY2BGR)
+        alpha = cv2.resize(scaled, size, interpolation=cv2.INTER_LINEAR)[..., None] / 255.0 * 0.6
+        colour = np.uint8(base * (1 - alpha) + colour * alpha)
+    return cv2.imencode('.png', colour)[1].tobytes()
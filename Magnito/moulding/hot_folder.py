@@ -0,0 +1,192 @@
+"""
+Hot-folder ingestion of product images dropped by press-side cameras.
+
+Cameras write into one subdirectory per machine::
+
+    HOT_FOLDER_ROOT/<machine_number>/<image>
+
+Each image is matched to the active ``MouldRun`` on that machine and
+compared against the newest active ``MasterSample`` of the run's mould.
+Handled files are moved to ``processed/`` (or ``rejected/`` when there is
+nothing to compare against) inside the machine folder.
+
+Every image is recorded as an ``IngestedImage`` keyed by its content hash.
+The comparison is created and linked to that record in one transaction, so
+a restart at any point neither loses an image nor compares it twice.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+
+from . import image_ingest
+from .feature_store import file_hash
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff'}
+PROCESSED_DIR = 'processed'
+REJECTED_DIR = 'rejected'
+
+
+class NoActiveMaster(Exception):
+    """Raised when a machine has no active run or its mould has no master sample"""
+
+
+class _AlreadyIngested(Exception):
+    pass
+
+
+def root():
+    return str(settings.HOT_FOLDER_ROOT)
+
+
+def scan(folder, settle_seconds=2.0):
+    """Yield ``(machine_number, path)`` for images that have finished writing.
+
+    A file counts as finished once it has not been modified for
+    ``settle_seconds``; half-written files are picked up on a later scan.
+    """
+    if not os.path.isdir(folder):
+        return
+    now = time.time()
+    for machine in sorted(os.listdir(folder)):
+        machine_dir = os.path.join(folder, machine)
+        if machine.startswith('.') or not os.path.isdir(machine_dir):
+            continue
+        for entry in sorted(os.scandir(machine_dir), key=lambda e: e.name):
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            stat = entry.stat()
+            if stat.st_size == 0 or now - stat.st_mtime < settle_seconds:
+                continue
+            yield machine, entry.path
+
+
+def active_master(machine_number):
+    """Return the master sample to compare images from ``machine_number`` against"""
+    from .models import MasterSample, MouldRun
+
+    run = (
+        MouldRun.objects.filter(machine_number=machine_number, is_active=True)
+        .select_related('mould').order_by('-start_time').first()
+    )
+    if run is None:
+        raise NoActiveMaster(f"No active mould run on machine {machine_number}")
+    master = (
+        MasterSample.objects.filter(mould=run.mould, is_active=True)
+        .order_by('-created_at').first()
+    )
+    if master is None:
+        raise NoActiveMaster(f"No active master sample for mould {run.mould.mould_number}")
+    return master
+
+
+def _move(path, subdir):
+    """Move a handled file aside so it is not scanned again"""
+    target_dir = os.path.join(os.path.dirname(path), subdir)
+    os.makedirs(target_dir, exist_ok=True)
+    name = os.path.basename(path)
+    target = os.path.join(target_dir, name)
+    if os.path.exists(target):
+        stem, ext = os.path.splitext(name)
+        target = os.path.join(target_dir, f"{stem}-{int(time.time() * 1000)}{ext}")
+    os.replace(path, target)
+    return target
+
+
+def _operator():
+    from django.contrib.auth.models import User
+    operator, _ = User.objects.get_or_create(
+        username='operator',
+        defaults={'first_name': 'Default', 'last_name': 'Operator'}
+    )
+    return operator
+
+
+def ingest(machine_number, path):
+    """Record one dropped image and create its comparison.
+
+    Returns the id of the new ``ProductComparison``, or None when the image
+    was already ingested. Raises ``NoActiveMaster`` when there is nothing to
+    compare it against; the image is then moved to ``rejected/``.
+    """
+    from .models import IngestedImage, ProductComparison
+
+    content_hash = file_hash(path)
+    record, _ = IngestedImage.objects.get_or_create(
+        content_hash=content_hash,
+        defaults={'machine_number': machine_number, 'source_name': os.path.basename(path)},
+    )
+    if record.comparison_id:
+        # Seen before, e.g. the daemon stopped before moving the file
+        _move(path, PROCESSED_DIR)
+        return None
+
+    try:
+        master = active_master(machine_number)
+    except NoActiveMaster as e:
+        IngestedImage.objects.filter(pk=record.pk).update(status='rejected', error_message=str(e))
+        _move(path, REJECTED_DIR)
+        raise
+
+    comparison = ProductComparison(
+        master_sample=master,
+        operator=_operator(),
+        machine_number=machine_number,
+        status='pending',
+        notes=f"Hot folder: {os.path.basename(path)}",
+    )
+    with open(path, 'rb') as f:
+        processed = image_ingest.process_image(f, os.path.basename(path))
+        content = processed[0] if processed else File(f, name=os.path.basename(path))
+        comparison.product_image.save(content.name, content, save=False)
+    try:
+        with transaction.atomic():
+            comparison.save()
+            # Only the first worker to link a comparison to the record wins
+            claimed = IngestedImage.objects.filter(pk=record.pk, comparison__isnull=True).update(
+                comparison=comparison, machine_number=machine_number, source_name=os.path.basename(path),
+                status='queued', error_message='',
+            )
+            if not claimed:
+                raise _AlreadyIngested
+    except _AlreadyIngested:
+        comparison.product_image.delete(save=False)
+        _move(path, PROCESSED_DIR)
+        return None
+    except Exception:
+        comparison.product_image.delete(save=False)
+        raise
+
+    _move(path, PROCESSED_DIR)
+    return comparison.pk
+
+
+def compare(comparison_id):
+    """Run an ingested comparison and mark its record as compared"""
+    from .models import IngestedImage, ProductComparison
+    from .tasks import enqueue_comparison
+
+    status = ProductComparison.objects.filter(pk=comparison_id).values_list('status', flat=True).first()
+    if status in ('pending', 'running'):
+        pending = enqueue_comparison(comparison_id)
+        # Wait, so the ingest queue backs up instead of the comparison pool
+        status = pending.result() if hasattr(pending, 'result') else pending
+        close_old_connections()
+    IngestedImage.objects.filter(comparison_id=comparison_id).update(status='compared')
+    close_old_connections()
+    return status
+
+
+def unfinished():
+    """Comparison ids of ingested images that were not compared before a restart"""
+    from .models import IngestedImage
+
+    return list(
+        IngestedImage.objects.filter(status='queued', comparison__isnull=False)
+        .order_by('pk').values_list('comparison_id', flat=True)
+    )
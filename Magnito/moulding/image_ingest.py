@@ -0,0 +1,150 @@
+"""
+Processing of uploaded images before they are stored.
+
+Phone photos arrive as 5-10 MB JPEGs with EXIF data. On upload they are
+turned the right way up, shrunk to at most ``IMAGE_MAX_SIDE`` pixels on
+the long side, re-encoded as WebP (which drops the metadata) and
+thumbnails in the ``THUMBNAIL_SIZES`` are written next to them::
+
+    MEDIA_ROOT/<upload_to>/<name>.webp
+    MEDIA_ROOT/thumbnails/<size>/<upload_to>/<name>.webp
+
+Templates ask for thumbnails with the ``thumbnail`` filter (see
+``templatetags/media_tags.py``); missing ones are made on first use.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+
+# Long side of each thumbnail size in pixels
+THUMBNAIL_SIZES = {
+    'small': 160,
+    'medium': 480,
+    'large': 1280,
+}
+THUMBNAIL_ROOT = 'thumbnails'
+FORMAT = 'WEBP'
+EXTENSION = '.webp'
+
+
+def _open(source):
+    """Decode an image the right way up, or None if it is not an image"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        image = Image.open(source)
+        image.load()
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    return image
+
+
+def _encode(image, quality):
+    buffer = io.BytesIO()
+    # Only pixels are written: EXIF, GPS and other metadata are dropped
+    image.save(buffer, FORMAT, quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def process_image(source, name, max_side=None, quality=None):
+    """
+    Shrink and re-encode an uploaded image.
+
+    Returns ``(ContentFile, scale)``, where ``scale`` is the factor the
+    image was shrunk by (1.0 when it was small enough), or None when
+    ``source`` could not be decoded.
+    """
+    from PIL import Image
+
+    max_side = max_side or settings.IMAGE_MAX_SIDE
+    quality = quality or settings.IMAGE_QUALITY
+    image = _open(source)
+    if image is None:
+        return None
+
+    scale = 1.0
+    if max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return ContentFile(_encode(image, quality), name=stem + EXTENSION), scale
+
+
+def ingest(field_file):
+    """
+    Process a newly assigned (not yet stored) image of a model in place.
+
+    Returns the scale factor applied. Images already stored, and files that
+    are not images, are left alone for the model's own validation.
+    """
+    if not field_file or field_file._committed:
+        return 1.0
+    processed = process_image(field_file.file, field_file.name)
+    if processed is None:
+        return 1.0
+    content, scale = processed
+    setattr(field_file.instance, field_file.field.attname, content)
+    return scale
+
+
+def thumbnail_name(name, size):
+    """Storage name of an image's thumbnail"""
+    stem = os.path.splitext(name)[0]
+    return f"{THUMBNAIL_ROOT}/{size}/{stem}{EXTENSION}"
+
+
+def make_thumbnails(field_file, sizes=None):
+    """Write the thumbnails of a stored image; returns the names written"""
+    from PIL import Image
+
+    if not field_file:
+        return []
+    with field_file.storage.open(field_file.name, 'rb') as source:
+        image = _open(source)
+    if image is None:
+        return []
+
+    written = []
+    for size in sizes or THUMBNAIL_SIZES:
+        thumb = image.copy()
+        thumb.thumbnail((THUMBNAIL_SIZES[size], THUMBNAIL_SIZES[size]), Image.LANCZOS)
+        name = thumbnail_name(field_file.name, size)
+        if field_file.storage.exists(name):
+            field_file.storage.delete(name)
+        written.append(field_file.storage.save(name, ContentFile(_encode(thumb, settings.IMAGE_QUALITY))))
+    return written
+
+
+def delete_thumbnails(name, storage=None):
+    """Remove the thumbnails of an image that is being replaced or deleted"""
+    storage = storage or default_storage
+    for size in THUMBNAIL_SIZES:
+        thumb = thumbnail_name(name, size)
+        if storage.exists(thumb):
+            storage.delete(thumb)
+
+
+def thumbnail_url(field_file, size):
+    """URL of an image's thumbnail, made on first use; the image URL if that fails"""
+    if not field_file:
+        return ''
+    name = thumbnail_name(field_file.name, size)
+    storage = field_file.storage
+    if not storage.exists(name):
+        try:
+            make_thumbnails(field_file, [size])
+        except OSError:
+            return field_file.url
+        if not storage.exists(name):
+            return field_file.url
+    return storage.url(name)
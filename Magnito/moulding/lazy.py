@@ -0,0 +1,56 @@
+"""
+Deferred imports of the image processing libraries.
+
+OpenCV, numpy, Pillow and scikit-image take most of a process's start-up
+time and memory, yet web workers and most management commands only need
+them once an image is compared. Modules therefore use the stand-ins below
+(``from .lazy import cv2, np``): the real module is imported on first
+attribute access and its attributes are copied onto the stand-in, so later
+lookups cost the same as on the module itself.
+"""
+import importlib
+import importlib.util
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Module stand-in that imports ``name`` on first use"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_loaded'] = None
+
+    def _load(self):
+        module = self.__dict__['_loaded']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__.update(
+                (key, value) for key, value in vars(module).items() if key not in ('__name__', '__spec__', '__loader__')
+            )
+            self.__dict__['_loaded'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_loaded'] is not None else 'not loaded'
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def available(*names):
+    """True if all the named top-level modules are installed (without importing them)"""
+    return all(importlib.util.find_spec(name) is not None for name in names)
+
+
+cv2 = LazyModule('cv2')
+np = LazyModule('numpy')
+
+
+def structural_similarity(*args, **kwargs):
+    """``skimage.metrics.structural_similarity``, imported on first call"""
+    from skimage.metrics import structural_similarity as ssim
+    return ssim(*args, **kwargs)
@@ -0,0 +1,129 @@
+"""
+Live updates for wall screens over server-sent events.
+
+A screen (see ``SCREENS``) is described by its counters and lists of
+rendered items (``{'order': [ids], 'html': {id: html}}``). The state of a
+screen is built once per dashboard cache generation (see ``dashboard.py``)
+and shared by every connection in the process. Each connection compares it
+with what it last sent every ``LIVE_POLL_SECONDS`` and pushes only the
+counters that changed and the items that were added, changed or reordered.
+``static/live.js`` patches the page to match.
+
+Streams end after ``LIVE_STREAM_SECONDS`` and the browser reconnects, so
+a worker thread is never held indefinitely; the first event of a
+connection carries the full state.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from . import dashboard
+
+
+STATE_KEY = 'moulding:live:{}:{}'
+# Seconds between comment lines that keep idle connections open through proxies
+HEARTBEAT_SECONDS = 15
+# Completed runs kept up to date on the mould runs screen
+COMPLETED_RUNS = 50
+
+
+def _items(template, name, objects, partial=False):
+    """A live list: item ids in display order and their rendered HTML"""
+    html = {str(obj.pk): render_to_string(template, {name: obj}) for obj in objects}
+    return {'order': list(html), 'html': html, 'partial': partial}
+
+
+def dashboard_state():
+    context = dashboard.snapshot()
+    return {
+        'counters': {name: context[name] for name in dashboard.COUNTERS + ['pending_orders_count']},
+        'lists': {
+            'active_runs': _items('moulding/partials/run_card.html', 'run', context['active_runs']),
+            'open_issues_list': _items('moulding/partials/issue_card.html', 'issue', context['open_issues_list']),
+            'recent_checklists': _items('moulding/partials/checklist_row.html', 'checklist', context['recent_checklists']),
+        },
+    }
+
+
+def mould_runs_state():
+    from .models import MouldRun
+
+    runs = MouldRun.objects.select_related('mould').order_by('-start_time')
+    return {
+        'counters': {},
+        'lists': {
+            'active_runs': _items('moulding/partials/run_row_active.html', 'run', runs.filter(is_active=True)),
+            # Only the newest completed runs are sent: new ones are added, older rows are left alone
+            'completed_runs': _items(
+                'moulding/partials/run_row_completed.html', 'run', runs.filter(is_active=False)[:COMPLETED_RUNS],
+                partial=True,
+            ),
+        },
+    }
+
+
+SCREENS = {
+    'dashboard': dashboard_state,
+    'mould_runs': mould_runs_state,
+}
+
+
+def state(screen):
+    """Current state of a screen, shared by the connections in this process"""
+    key = STATE_KEY.format(screen, dashboard.generation())
+    return cache.get_or_set(key, SCREENS[screen], settings.DASHBOARD_CACHE_SECONDS)
+
+
+def diff(old, new):
+    """What changed from ``old`` (None for a new connection) to ``new``"""
+    delta = {}
+    counters = {
+        name: value for name, value in new['counters'].items()
+        if old is None or old['counters'].get(name) != value
+    }
+    if counters:
+        delta['counters'] = counters
+
+    lists = {}
+    for name, items in new['lists'].items():
+        previous = old['lists'].get(name) if old else None
+        html = {
+            pk: fragment for pk, fragment in items['html'].items()
+            if previous is None or previous['html'].get(pk) != fragment
+        }
+        if previous is None or html or previous['order'] != items['order']:
+            lists[name] = {'order': items['order'], 'html': html, 'partial': items['partial']}
+    if lists:
+        delta['lists'] = lists
+    return delta
+
+
+def event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def stream(screen, poll=None, duration=None):
+    """Server-sent events for one connection to a screen"""
+    poll = poll or settings.LIVE_POLL_SECONDS
+    deadline = time.monotonic() + (duration or settings.LIVE_STREAM_SECONDS)
+    # Reconnect quickly when the stream ends
+    yield f"retry: {int(poll * 1000)}\n\n"
+
+    sent = None
+    quiet_since = time.monotonic()
+    while True:
+        current = state(screen)
+        delta = diff(sent, current)
+        if delta:
+            yield event('update', delta)
+            sent = current
+            quiet_since = time.monotonic()
+        elif time.monotonic() - quiet_since >= HEARTBEAT_SECONDS:
+            yield ': heartbeat\n\n'
+            quiet_since = time.monotonic()
+        if time.monotonic() + poll > deadline:
+            return
+        time.sleep(poll)
@@ -0,0 +1,48 @@
+"""
+Apply the comparison image retention policy (see ``moulding.retention``).
+
+Meant to run daily from cron or another scheduler. ``--dry-run`` reports
+how many images each tier would take and the bytes that would be freed
+without changing anything.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from moulding import retention
+from moulding.models import ProductComparison
+
+
+class Command(BaseCommand):
+    help = 'Downscale and archive old product comparison images according to the retention policy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be done and the bytes reclaimed')
+        parser.add_argument('--full-days', type=int, help='Days images are kept at full resolution (default RETENTION_FULL_DAYS)')
+        parser.add_argument('--archive-days', type=int, help='Days before images move to the archive (default RETENTION_ARCHIVE_DAYS)')
+        parser.add_argument('--limit', type=int, default=0, help='Handle at most this many comparisons')
+        parser.add_argument('--restore', type=int, metavar='ID', help='Put an archived comparison back into media storage')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            try:
+                retention.restore(ProductComparison.objects.get(pk=options['restore']))
+            except (ProductComparison.DoesNotExist, ValueError, OSError) as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Restored comparison {options['restore']}"))
+            return
+
+        full_days = options['full_days']
+        archive_days = options['archive_days']
+        if full_days is not None and archive_days is not None and archive_days < full_days:
+            raise CommandError('--archive-days must not be less than --full-days')
+
+        report = retention.apply(full_days, archive_days, dry_run=options['dry_run'], limit=options['limit'])
+        for tier in ('downscaled', 'archived'):
+            self.stdout.write(
+                f"{tier.capitalize():<11} {report.counts[tier]:>7} comparison(s)  "
+                f"{report.reclaimed[tier] / 1e6:>10.1f} MB reclaimed"
+            )
+        if report.counts['missing']:
+            self.stdout.write(self.style.WARNING(f"{report.counts['missing']} comparison(s) with missing files skipped"))
+        total = sum(report.reclaimed.values())
+        verb = 'Would reclaim' if options['dry_run'] else 'Reclaimed'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total / 1e6:.1f} MB"))
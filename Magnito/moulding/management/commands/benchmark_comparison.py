@@ -0,0 +1,179 @@
+"""
+Benchmark the comparison pipeline stage by stage on synthetic images.
+
+For every resolution a master part is drawn and one product per defect in
+``moulding.synthetic.DEFECTS`` is generated, saved as JPEG and compared.
+Decode, resize, grayscale, SSIM, threshold, contours and defect analysis are
+timed separately; the median of ``--repeat`` runs is reported, with whether
+the part passed the score bands. 'none' should pass and the structural
+defects fail; a colour shift barely changes the grayscale image and is left
+to the colour prefilter, which this benchmark does not run.
+
+Results can be written as JSON and checked against an earlier run with
+``--baseline``, in which case the command fails when any stage slowed down
+by more than ``--tolerance``.
+"""
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from moulding.defect_rules import get_rules
+from moulding.synthetic import DEFECTS, make_master, make_product, parse_resolution
+from moulding.utils import CV2_AVAILABLE, analyze_defects, compare_gray
+from moulding.lazy import cv2
+
+
+STAGES = ['decode', 'resize', 'grayscale', 'ssim', 'threshold', 'contours', 'analyze']
+
+# Stages faster than this are too noisy to flag as regressions
+MIN_REGRESSION_MS = 1.0
+
+
+def _time_pair(master_path, product_path):
+    """Run the comparison pipeline once and return (timings in seconds, result)"""
+    timings = {}
+    started = time.perf_counter()
+    master = cv2.imread(master_path, cv2.IMREAD_GRAYSCALE)
+    product = cv2.imread(product_path)
+    timings['decode'] = time.perf_counter() - started
+
+    result = compare_gray(master, product, timings=timings)
+
+    started = time.perf_counter()
+    analyze_defects(result['defects'], result['similarity_score'])
+    timings['analyze'] = time.perf_counter() - started
+    return timings, result
+
+
+class Command(BaseCommand):
+    help = 'Time each stage of the image comparison on synthetic master/product pairs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resolutions', nargs='+', default=['640x480', '1920x1080', '4000x3000'],
+                            help='Image sizes as WIDTHxHEIGHT')
+        parser.add_argument('--defect', action='append', dest='defects', choices=DEFECTS,
+                            help='Defect to inject (repeatable, default all)')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per pair; the median is reported')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the camera noise')
+        parser.add_argument('--output', help='Write machine-readable results to this file')
+        parser.add_argument('--save-pairs', help='Keep the generated pairs in this folder (usable by benchmark_engines)')
+        parser.add_argument('--baseline', help='Earlier --output file to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed slowdown per stage against the baseline (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        if not CV2_AVAILABLE:
+            raise CommandError('OpenCV is required to run the comparison benchmark')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        try:
+            resolutions = [parse_resolution(value) for value in options['resolutions']]
+        except ValueError:
+            raise CommandError('Resolutions must look like 1920x1080')
+        defects = options['defects'] or DEFECTS
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline: {e}")
+
+        folder = options['save_pairs'] or tempfile.mkdtemp(prefix='moulding-bench-')
+        try:
+            results = self.run(resolutions, defects, folder, options['repeat'], options['seed'])
+        finally:
+            if not options['save_pairs']:
+                shutil.rmtree(folder, ignore_errors=True)
+
+        self.print_report(results)
+        report = {
+            'environment': {
+                'python': platform.python_version(),
+                'opencv': cv2.__version__,
+                'machine': platform.machine(),
+                'cpu_count': os.cpu_count(),
+            },
+            'repeat': options['repeat'],
+            'seed': options['seed'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if baseline is not None:
+            regressions = self.compare_baseline(results, baseline, options['tolerance'])
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(line)
+                raise CommandError(f"{len(regressions)} stage(s) slower than the baseline")
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def run(self, resolutions, defects, folder, repeat, seed):
+        results = []
+        for width, height in resolutions:
+            master = make_master(width, height)
+            for defect in defects:
+                pair_dir = os.path.join(folder, f'{width}x{height}_{defect}')
+                os.makedirs(pair_dir, exist_ok=True)
+                master_path = os.path.join(pair_dir, 'master.jpg')
+                product_path = os.path.join(pair_dir, 'product.jpg')
+                cv2.imwrite(master_path, master)
+                cv2.imwrite(product_path, make_product(master, defect, seed=seed))
+
+                runs = [_time_pair(master_path, product_path) for _ in range(repeat)]
+                result = runs[-1][1]
+                stages_ms = {
+                    stage: round(statistics.median(timings[stage] for timings, _ in runs) * 1000, 3)
+                    for stage in STAGES
+                }
+                results.append({
+                    'resolution': f'{width}x{height}',
+                    'defect': defect,
+                    'similarity_score': result['similarity_score'],
+                    'passes': get_rules().band(result['similarity_score'])[0],
+                    'defect_count': result['defect_count'],
+                    'stages_ms': stages_ms,
+                    'total_ms': round(sum(stages_ms.values()), 3),
+                })
+        return results
+
+    def compare_baseline(self, results, baseline, tolerance):
+        previous = {
+            (row['resolution'], row['defect']): row
+            for row in baseline.get('results', [])
+        }
+        regressions = []
+        for row in results:
+            old = previous.get((row['resolution'], row['defect']))
+            if old is None:
+                continue
+            for stage, ms in row['stages_ms'].items():
+                old_ms = old.get('stages_ms', {}).get(stage)
+                if old_ms is None or ms < MIN_REGRESSION_MS:
+                    continue
+                if ms > old_ms * (1 + tolerance):
+                    regressions.append(
+                        f"{row['resolution']} {row['defect']}: {stage} {old_ms} ms -> {ms} ms"
+                    )
+        return regressions
+
+    def print_report(self, results):
+        header = f"{'resolution':<12}{'defect':<13}" + ''.join(f'{stage:>10}' for stage in STAGES) + f"{'total':>10}{'score':>8}{'passes':>8}{'boxes':>7}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in results:
+            self.stdout.write(
+                f"{row['resolution']:<12}{row['defect']:<13}"
+                + ''.join(f"{row['stages_ms'][stage]:>10}" for stage in STAGES)
+                + f"{row['total_ms']:>10}{row['similarity_score']:>8}{'yes' if row['passes'] else 'no':>8}{row['defect_count']:>7}"
+            )
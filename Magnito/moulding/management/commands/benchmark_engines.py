@@ -0,0 +1,199 @@
+"""
+Benchmark every comparison engine on a set of master/product image pairs.
+
+Pairs come either from a folder, one subdirectory per pair holding a
+``master.*`` and a ``product.*`` image, or from stored comparisons
+(``--comparisons``). A subdirectory named after a ``ProductComparison`` id
+is checked against that comparison's stored similarity score.
+
+Each engine runs in its own process so its peak memory can be reported;
+the process sets Django up itself, like the comparison workers.
+"""
+import json
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from moulding.tasks import init_worker
+from moulding.utils import ENGINES, DecodedMaster, get_engine
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percent / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _benchmark_engine(name, pairs, repeat):
+    """Run one engine over all pairs (in a child process) and time it"""
+    engine = get_engine(name)
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    masters = {}
+    latencies = []
+    scores = []
+    errors = 0
+    for pair in pairs:
+        if pair['master'] not in masters:
+            # Decode masters up front, as the feature store does in production
+            master = DecodedMaster(pair['master'])
+            try:
+                master.levels((1, 2, 4))
+                master.color_hist
+            except ValueError:
+                pass
+            masters[pair['master']] = master
+        master = masters[pair['master']]
+        for _ in range(repeat):
+            started = time.perf_counter()
+            try:
+                result = engine(master, pair['product'])
+            except Exception:
+                result = None
+            latencies.append(time.perf_counter() - started)
+        if isinstance(result, dict) and not result.get('error'):
+            scores.append((pair.get('reference'), float(result['similarity_score'])))
+        else:
+            errors += 1
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'engine': name,
+        'latencies': latencies,
+        'scores': scores,
+        'errors': errors,
+        'peak_rss_mb': round(peak_kb / 1024, 1),
+        'peak_rss_growth_mb': round((peak_kb - baseline_kb) / 1024, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the image comparison engines for latency, memory and agreement with stored scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('folder', nargs='?', help='Folder with one subdirectory (master.*, product.*) per pair')
+        parser.add_argument('--comparisons', action='store_true', help='Use stored product comparisons as the pairs')
+        parser.add_argument('--limit', type=int, default=100, help='Maximum number of stored comparisons to use')
+        parser.add_argument('--engine', action='append', dest='engines', help='Engine to benchmark (repeatable, default all)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per pair')
+        parser.add_argument('--pass-score', type=float, default=95, help='Score at which a product passes')
+        parser.add_argument('--json', dest='json_path', help='Write machine-readable results to this file')
+
+    def handle(self, *args, **options):
+        engines = options['engines'] or list(ENGINES)
+        for name in engines:
+            if name not in ENGINES:
+                raise CommandError(f"Unknown engine '{name}'. Choose from: {', '.join(ENGINES)}")
+
+        if options['comparisons']:
+            pairs = self.pairs_from_comparisons(options['limit'])
+        elif options['folder']:
+            pairs = self.pairs_from_folder(options['folder'])
+        else:
+            raise CommandError('Give a folder of image pairs or --comparisons')
+        if not pairs:
+            raise CommandError('No image pairs found')
+
+        self.stdout.write(f"Benchmarking {len(engines)} engine(s) on {len(pairs)} pair(s), {options['repeat']} run(s) each")
+
+        context = multiprocessing.get_context('spawn')
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'injection_moulding.settings')
+        report = []
+        for name in engines:
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=context, initializer=init_worker, initargs=(settings_module,)
+            ) as executor:
+                raw = executor.submit(_benchmark_engine, name, pairs, options['repeat']).result()
+            report.append(self.summarise(raw, options['pass_score']))
+
+        self.print_report(report)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'pairs': len(pairs), 'repeat': options['repeat'], 'engines': report}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['json_path']}"))
+
+    def pairs_from_comparisons(self, limit):
+        from moulding.models import ProductComparison
+
+        comparisons = (
+            ProductComparison.objects.filter(status='done', similarity_score__isnull=False)
+            .exclude(product_image='').select_related('master_sample').order_by('-created_at')[:limit]
+        )
+        return [
+            {
+                'name': str(comparison.pk),
+                'master': comparison.master_sample.image.path,
+                'product': comparison.product_image.path,
+                'reference': comparison.similarity_score,
+            }
+            for comparison in comparisons
+        ]
+
+    def pairs_from_folder(self, folder):
+        from moulding.models import ProductComparison
+
+        if not os.path.isdir(folder):
+            raise CommandError(f"Folder not found: {folder}")
+        pairs = []
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if not os.path.isdir(path):
+                continue
+            files = {os.path.splitext(f)[0]: os.path.join(path, f) for f in os.listdir(path)}
+            if 'master' not in files or 'product' not in files:
+                continue
+            pairs.append({'name': name, 'master': files['master'], 'product': files['product'], 'reference': None})
+
+        references = dict(
+            ProductComparison.objects.filter(
+                pk__in=[int(pair['name']) for pair in pairs if pair['name'].isdigit()],
+                similarity_score__isnull=False
+            ).values_list('pk', 'similarity_score')
+        )
+        for pair in pairs:
+            if pair['name'].isdigit():
+                pair['reference'] = references.get(int(pair['name']))
+        return pairs
+
+    def summarise(self, raw, pass_score):
+        latencies_ms = [latency * 1000 for latency in raw['latencies']]
+        compared = [(reference, score) for reference, score in raw['scores'] if reference is not None]
+        summary = {
+            'engine': raw['engine'],
+            'runs': len(latencies_ms),
+            'errors': raw['errors'],
+            'latency_ms': {
+                'mean': round(sum(latencies_ms) / len(latencies_ms), 2),
+                'p50': round(_percentile(latencies_ms, 50), 2),
+                'p90': round(_percentile(latencies_ms, 90), 2),
+                'p99': round(_percentile(latencies_ms, 99), 2),
+                'max': round(max(latencies_ms), 2),
+            },
+            'peak_rss_mb': raw['peak_rss_mb'],
+            'peak_rss_growth_mb': raw['peak_rss_growth_mb'],
+            'agreement': None,
+        }
+        if compared:
+            summary['agreement'] = {
+                'pairs': len(compared),
+                'mean_abs_diff': round(sum(abs(reference - score) for reference, score in compared) / len(compared), 2),
+                'verdict_match': round(
+                    sum((reference >= pass_score) == (score >= pass_score) for reference, score in compared) / len(compared), 3
+                ),
+            }
+        return summary
+
+    def print_report(self, report):
+        header = f"{'engine':<12}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'peak MB':>10}{'+MB':>8}{'errors':>8}{'|diff|':>9}{'verdict':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in report:
+            agreement = row['agreement'] or {}
+            self.stdout.write(
+                f"{row['engine']:<12}"
+                f"{row['latency_ms']['p50']:>10}{row['latency_ms']['p90']:>10}{row['latency_ms']['p99']:>10}"
+                f"{row['peak_rss_mb']:>10}{row['peak_rss_growth_mb']:>8}{row['errors']:>8}"
+                f"{agreement.get('mean_abs_diff', '-'):>9}{agreement.get('verdict_match', '-'):>9}"
+            )
@@ -0,0 +1,106 @@
+"""
+Shrink, re-encode and thumbnail images uploaded before the ingest step.
+
+Every master sample, product comparison and housekeeping picture that is
+not yet WebP goes through ``image_ingest.process_image``; the original file
+is replaced (unless ``--keep-originals``) and thumbnails are written. Master
+samples also get their inspection regions scaled and their feature store
+entry rebuilt. Use ``--dry-run`` first to see what would change.
+"""
+from django.core.management.base import BaseCommand
+
+from moulding import feature_store, image_ingest
+from moulding.models import MasterSample, ProductComparison, scale_regions
+from moulding.models_housekeeping import HousekeepingTask
+from moulding.utils import CV2_AVAILABLE, perceptual_hash
+
+
+TARGETS = [
+    (MasterSample, ['image']),
+    (ProductComparison, ['product_image']),
+    (HousekeepingTask, ['before_image', 'after_image']),
+]
+
+
+class Command(BaseCommand):
+    help = 'Downscale, re-encode and thumbnail images uploaded before upload processing existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be processed without changing anything')
+        parser.add_argument('--keep-originals', action='store_true', help='Leave the original files in storage')
+        parser.add_argument('--thumbnails', action='store_true', help='Also (re)write thumbnails of images already processed')
+        parser.add_argument('--limit', type=int, default=0, help='Process at most this many images')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.totals = {'processed': 0, 'skipped': 0, 'failed': 0, 'before': 0, 'after': 0}
+        for model, fields in TARGETS:
+            for field in fields:
+                self.process_field(model, field)
+
+        totals = self.totals
+        saved = totals['before'] - totals['after']
+        verb = 'Would process' if options['dry_run'] else 'Processed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {totals['processed']} image(s), {totals['skipped']} already done, {totals['failed']} unreadable; "
+            f"{totals['before'] / 1e6:.1f} MB -> {totals['after'] / 1e6:.1f} MB ({saved / 1e6:.1f} MB saved)"
+        ))
+
+    def process_field(self, model, field):
+        queryset = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).order_by('pk')
+        if model is ProductComparison:
+            # Running comparisons are still reading their image
+            queryset = queryset.exclude(status__in=['pending', 'running'])
+        for instance in queryset.iterator():
+            if self.options['limit'] and self.totals['processed'] >= self.options['limit']:
+                return
+            field_file = getattr(instance, field)
+            if field_file.name.lower().endswith(image_ingest.EXTENSION):
+                self.totals['skipped'] += 1
+                if self.options['thumbnails'] and not self.options['dry_run']:
+                    image_ingest.make_thumbnails(field_file)
+                continue
+            try:
+                self.process(instance, field, field_file)
+            except OSError as e:
+                self.totals['failed'] += 1
+                self.stderr.write(f"{model.__name__} {instance.pk}: {e}")
+
+    def process(self, instance, field, field_file):
+        with field_file.storage.open(field_file.name, 'rb') as source:
+            before = field_file.storage.size(field_file.name)
+            processed = image_ingest.process_image(source, field_file.name)
+        if processed is None:
+            self.totals['failed'] += 1
+            self.stderr.write(f"{type(instance).__name__} {instance.pk}: not an image ({field_file.name})")
+            return
+        content, scale = processed
+        self.totals['processed'] += 1
+        self.totals['before'] += before
+        self.totals['after'] += content.size
+        if self.options['dry_run']:
+            return
+
+        old_name = field_file.name
+        new_name = field_file.storage.save(field_file.field.generate_filename(instance, content.name), content)
+        updates = {field: new_name}
+        path = field_file.storage.path(new_name)
+        if isinstance(instance, MasterSample):
+            if scale != 1.0 and instance.regions:
+                updates['regions'] = scale_regions(instance.regions, scale)
+            try:
+                updates['content_hash'] = feature_store.build(path)
+            except ValueError:
+                updates['content_hash'] = ''
+        elif isinstance(instance, ProductComparison) and CV2_AVAILABLE:
+            try:
+                updates['product_phash'] = perceptual_hash(path)
+            except ValueError:
+                pass
+        type(instance).objects.filter(pk=instance.pk).update(**updates)
+
+        setattr(instance, field, new_name)
+        image_ingest.make_thumbnails(getattr(instance, field))
+        image_ingest.delete_thumbnails(old_name, field_file.storage)
+        if not self.options['keep_originals']:
+            field_file.storage.delete(old_name)
@@ -0,0 +1,162 @@
+"""
+Profile the imports a fresh process pays for before serving a request.
+
+A new interpreter is started with ``python -X importtime``; it sets up
+Django and imports the URLconf (and so every view), like a web worker
+does. The command reports the total import time and peak memory, the
+slowest modules and the time per top-level package, and warns when one of
+the heavy image libraries (see ``HEAVY_MODULES``) is imported at start-up
+instead of on first use.
+
+Results can be written as JSON and checked against an earlier run with
+``--baseline``, in which case the command fails when start-up slowed down
+by more than ``--tolerance`` or a heavy library started loading eagerly.
+"""
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Libraries that should only be imported by the first comparison
+HEAVY_MODULES = ['cv2', 'numpy', 'PIL', 'skimage', 'scipy']
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$')
+
+STARTUP_SCRIPT = """
+import importlib, resource, sys
+import django
+django.setup()
+from django.conf import settings
+importlib.import_module(settings.ROOT_URLCONF)
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def parse_importtime(output):
+    """``{module: (self_us, cumulative_us, depth)}`` from ``-X importtime`` output"""
+    modules = {}
+    for line in output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return modules
+
+
+class Command(BaseCommand):
+    help = 'Report import time per module for a freshly started process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--import', dest='extra', action='append', default=[], metavar='MODULE',
+                            help='Also import this module after the URLconf (repeatable)')
+        parser.add_argument('--repeat', type=int, default=3, help='Start-ups to run; the median is reported')
+        parser.add_argument('--top', type=int, default=20, help='Slowest modules to list')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='Earlier --output file to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed slowdown of the total against the baseline (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline: {e}")
+
+        runs = [self.run_once(options['extra']) for _ in range(options['repeat'])]
+        report = self.summarise(runs)
+        self.print_report(report, options['top'])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if baseline is not None:
+            problems = self.compare_baseline(report, baseline, options['tolerance'])
+            if problems:
+                for problem in problems:
+                    self.stdout.write(self.style.ERROR(problem))
+                raise CommandError(f"{len(problems)} start-up regression(s) against the baseline")
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def run_once(self, extra):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT, *extra],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Start-up failed:\n{result.stderr[-2000:]}")
+        return {
+            'modules': parse_importtime(result.stderr),
+            'max_rss_kb': int(result.stdout.strip().splitlines()[-1]),
+        }
+
+    def summarise(self, runs):
+        names = set().union(*(run['modules'] for run in runs))
+        modules = []
+        for name in names:
+            timings = [run['modules'][name] for run in runs if name in run['modules']]
+            modules.append({
+                'module': name,
+                'self_ms': round(statistics.median(t[0] for t in timings) / 1000, 2),
+                'cumulative_ms': round(statistics.median(t[1] for t in timings) / 1000, 2),
+                'top_level': any(t[2] == 0 for t in timings),
+            })
+        modules.sort(key=lambda row: -row['cumulative_ms'])
+
+        packages = {}
+        for row in modules:
+            package = row['module'].split('.')[0]
+            packages[package] = round(packages.get(package, 0) + row['self_ms'], 2)
+
+        return {
+            'python': sys.version.split()[0],
+            'repeat': len(runs),
+            'total_ms': round(sum(row['cumulative_ms'] for row in modules if row['top_level']), 2),
+            'max_rss_mb': round(statistics.median(run['max_rss_kb'] for run in runs) / 1024, 1),
+            'module_count': len(modules),
+            'heavy_modules': sorted(package for package in HEAVY_MODULES if package in packages),
+            'packages': dict(sorted(packages.items(), key=lambda item: -item[1])),
+            'modules': modules,
+        }
+
+    def print_report(self, report, top):
+        self.stdout.write(
+            f"Start-up imports: {report['total_ms']:.0f} ms, {report['module_count']} modules, "
+            f"peak memory {report['max_rss_mb']:.0f} MB (median of {report['repeat']})"
+        )
+        self.stdout.write(f"\n{'Module':<50} {'self ms':>9} {'cumul. ms':>10}")
+        for row in report['modules'][:top]:
+            self.stdout.write(f"{row['module']:<50} {row['self_ms']:>9.1f} {row['cumulative_ms']:>10.1f}")
+        self.stdout.write(f"\n{'Package':<50} {'self ms':>9}")
+        for package, ms in list(report['packages'].items())[:top]:
+            self.stdout.write(f"{package:<50} {ms:>9.1f}")
+        if report['heavy_modules']:
+            self.stdout.write(self.style.WARNING(
+                f"\nHeavy libraries imported at start-up: {', '.join(report['heavy_modules'])}"
+            ))
+
+    def compare_baseline(self, report, baseline, tolerance):
+        problems = []
+        old_ms = baseline.get('total_ms')
+        if old_ms and report['total_ms'] > old_ms * (1 + tolerance):
+            problems.append(f"Start-up imports took {report['total_ms']:.0f} ms (baseline {old_ms:.0f} ms)")
+        new_heavy = set(report['heavy_modules']) - set(baseline.get('heavy_modules', []))
+        if new_heavy:
+            problems.append(f"Now imported at start-up: {', '.join(sorted(new_heavy))}")
+        return problems
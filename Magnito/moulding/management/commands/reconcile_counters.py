@@ -0,0 +1,35 @@
+"""
+Recount the shop-floor counters and repair any drift.
+
+The ``KpiCounter`` rows are adjusted as rows are saved and deleted (see
+``moulding/counters.py``); bulk updates, raw SQL and ``loaddata`` bypass
+that. Run this after such changes, or nightly from cron.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from moulding import counters
+
+
+class Command(BaseCommand):
+    help = 'Recount the dashboard counters from their tables and fix any that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='COUNTER', help='Counters to check (default all)')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        unknown = sorted(set(options['names']) - set(counters.COUNTERS))
+        if unknown:
+            raise CommandError(f"Unknown counter(s): {', '.join(unknown)} (choose from {', '.join(counters.COUNTERS)})")
+
+        drift = counters.reconcile(options['names'] or None, dry_run=options['dry_run'])
+        for name, (stored, actual) in sorted(drift.items()):
+            stored = 'missing' if stored is None else stored
+            self.stdout.write(f"{name}: stored {stored}, actual {actual}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('All counters match their tables'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} counter(s) drifted (dry run, nothing changed)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drift)} counter(s)"))
@@ -0,0 +1,37 @@
+"""
+Queue product comparisons that were lost before they finished.
+
+The worker pool lives in the web processes, so a restart or deploy drops
+the comparisons still waiting in it and they would stay "pending" forever.
+Comparisons queued or running for longer than ``COMPARISON_STALE_MINUTES``
+are queued again and compared by this command; after
+``COMPARISON_MAX_ATTEMPTS`` they are marked failed instead. Run it after
+every deploy and every few minutes from cron.
+"""
+from django.core.management.base import BaseCommand
+
+from moulding.tasks import requeue_stale, stale_comparisons
+
+
+class Command(BaseCommand):
+    help = 'Queue comparisons that were lost (e.g. to a restart) again, or fail them after too many attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List stale comparisons without queuing them')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            stale = list(stale_comparisons().order_by('pk').values_list('pk', 'status', 'attempts'))
+            for pk, status, attempts in stale:
+                self.stdout.write(f"Comparison {pk}: {status}, queued {attempts} time(s)")
+            self.stdout.write(f"{len(stale)} stale comparison(s) (dry run, nothing queued)")
+            return
+
+        jobs, failed = requeue_stale()
+        for job in jobs:
+            # Stay alive until the pool has compared them
+            if hasattr(job, 'result'):
+                job.result()
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Marked {len(failed)} comparison(s) failed: {', '.join(map(str, failed))}"))
+        self.stdout.write(self.style.SUCCESS(f"Requeued {len(jobs)} job(s)"))
@@ -0,0 +1,70 @@
+"""
+Move media stored under upload names into the content-addressed layout.
+
+Files uploaded before ``ContentAddressedStorage`` was enabled stay readable
+under their old names; this command re-saves each one under its hashed,
+sharded name (duplicates collapse into one file), points the record at it
+and removes the old file and its thumbnails.
+"""
+import os
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from moulding import image_ingest
+from moulding.models import ProductComparison
+from moulding.storage import ContentAddressedStorage, is_hashed
+
+
+class Command(BaseCommand):
+    help = 'Rename existing media files by content hash into sharded directories'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Count the files that would move without moving them')
+        parser.add_argument('--limit', type=int, default=0, help='Move at most this many files')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('The default storage is not content addressed (see MEDIA_CONTENT_ADDRESSED)')
+
+        moved = missing = 0
+        names = set()
+        for model in apps.get_app_config('moulding').get_models():
+            for field in model._meta.concrete_fields:
+                if not isinstance(field, models.FileField):
+                    continue
+                queryset = model.objects.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+                if model is ProductComparison:
+                    # Running comparisons are still reading their image
+                    queryset = queryset.exclude(status__in=['pending', 'running'])
+                for instance in queryset.order_by('pk').iterator():
+                    if options['limit'] and moved >= options['limit']:
+                        break
+                    field_file = getattr(instance, field.name)
+                    if is_hashed(field_file.name):
+                        continue
+                    if not field_file.storage.exists(field_file.name):
+                        missing += 1
+                        continue
+                    moved += 1
+                    if options['dry_run']:
+                        continue
+                    old_name = field_file.name
+                    with field_file.storage.open(old_name, 'rb') as f:
+                        new_name = field_file.storage.save(
+                            field.generate_filename(instance, os.path.basename(old_name)), f
+                        )
+                    model.objects.filter(pk=instance.pk).update(**{field.name: new_name})
+                    names.add(new_name)
+                    image_ingest.delete_thumbnails(old_name, field_file.storage)
+                    field_file.storage.delete(old_name)
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        summary = f"{verb} {moved} file(s)"
+        if not options['dry_run']:
+            summary += f" into {len(names)} stored file(s)"
+        if missing:
+            summary += f"; {missing} missing from storage"
+        self.stdout.write(self.style.SUCCESS(summary))
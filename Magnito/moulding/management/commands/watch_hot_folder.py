@@ -0,0 +1,141 @@
+"""
+Watch the hot folder and compare every image the press cameras drop into it.
+
+The main thread scans the folder and feeds a bounded queue; a pool of
+ingest threads records each image, creates its comparison and waits for
+the comparison pool to finish it. When the queue is full the scanner
+blocks, so a burst of images simply waits on disk until there is room.
+
+On start-up comparisons that were ingested but not finished before the
+last shutdown are queued again.
+"""
+import os
+import queue
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from moulding import hot_folder
+
+
+class Command(BaseCommand):
+    help = 'Ingest product images dropped into the hot folder (one subdirectory per machine) and compare them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('folder', nargs='?', help='Folder to watch (default HOT_FOLDER_ROOT)')
+        parser.add_argument('--workers', type=int, default=max(1, settings.COMPARISON_WORKERS),
+                            help='Ingest threads (default COMPARISON_WORKERS)')
+        parser.add_argument('--queue-size', type=int, default=100, help='Images waiting to be ingested before scanning pauses')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between folder scans')
+        parser.add_argument('--settle', type=float, default=2.0,
+                            help='Seconds a file must be unchanged before it is picked up')
+        parser.add_argument('--once', action='store_true', help='Process the images already there and exit')
+
+    def handle(self, *args, **options):
+        folder = options['folder'] or hot_folder.root()
+        if not os.path.isdir(folder):
+            raise CommandError(f"Folder not found: {folder}")
+        if options['workers'] < 1 or options['queue_size'] < 1:
+            raise CommandError('--workers and --queue-size must be at least 1')
+
+        self.work = queue.Queue(maxsize=options['queue_size'])
+        self.in_flight = set()
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.stop)
+
+        workers = [threading.Thread(target=self.worker, daemon=True) for _ in range(options['workers'])]
+        for thread in workers:
+            thread.start()
+
+        resumed = hot_folder.unfinished()
+        if resumed:
+            self.stdout.write(f"Resuming {len(resumed)} unfinished comparison(s)")
+        for comparison_id in resumed:
+            self.put(('resume', comparison_id))
+
+        self.stdout.write(f"Watching {folder} with {len(workers)} worker(s)")
+        while not self.stopping.is_set():
+            for machine, path in hot_folder.scan(folder, options['settle']):
+                with self.lock:
+                    if path in self.in_flight:
+                        continue
+                    self.in_flight.add(path)
+                if not self.put(('ingest', machine, path)):
+                    break
+            close_old_connections()
+            if options['once']:
+                break
+            self.stopping.wait(options['interval'])
+
+        # Let the workers drain what is already queued, then stop them
+        for _ in workers:
+            self.work.put(None)
+        for thread in workers:
+            thread.join()
+        self.stdout.write('Hot folder watcher stopped')
+
+    def stop(self, signum, frame):
+        self.stdout.write('Stopping after the queued images...')
+        self.stopping.set()
+
+    def put(self, item):
+        """Block until the queue has room; False if the watcher is stopping"""
+        while not self.stopping.is_set():
+            try:
+                self.work.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        if item[0] == 'ingest':
+            with self.lock:
+                self.in_flight.discard(item[2])
+        return False
+
+    def worker(self):
+        while True:
+            item = self.work.get()
+            if item is None:
+                return
+            try:
+                if item[0] == 'resume':
+                    self.compare(item[1])
+                else:
+                    self.ingest(item[1], item[2])
+            finally:
+                close_old_connections()
+                if item[0] == 'ingest':
+                    with self.lock:
+                        self.in_flight.discard(item[2])
+
+    def ingest(self, machine, path):
+        name = os.path.basename(path)
+        try:
+            comparison_id = hot_folder.ingest(machine, path)
+        except hot_folder.NoActiveMaster as e:
+            self.stderr.write(f"{machine}/{name}: rejected ({e})")
+            return
+        except Exception as e:
+            # Left in place and retried on the next scan
+            self.stderr.write(f"{machine}/{name}: {e}")
+            return
+        if comparison_id is None:
+            self.stdout.write(f"{machine}/{name}: already ingested")
+            return
+        self.compare(comparison_id, f"{machine}/{name}")
+
+    def compare(self, comparison_id, label=None):
+        started = time.perf_counter()
+        try:
+            status = hot_folder.compare(comparison_id)
+        except Exception as e:
+            self.stderr.write(f"Comparison {comparison_id}: {e}")
+            return
+        self.stdout.write(
+            f"{label or 'resumed'}: comparison {comparison_id} {status} in {time.perf_counter() - started:.2f}s"
+        )
@@ -0,0 +1,104 @@
+"""
+Identify which master sample a product photo shows.
+
+Every active master's descriptor (see ``utils.image_descriptor``, stored in
+the feature store) is a row of one float32 matrix, so identifying a photo is
+a single matrix-vector product instead of a comparison against every
+master. The index is rebuilt only for masters that were added, changed or
+deactivated since the last lookup.
+"""
+import threading
+
+from .utils import CV2_AVAILABLE, image_descriptor
+from .lazy import cv2, np
+
+
+# Softmax temperature turning similarities into a confidence
+TEMPERATURE = 0.02
+# Below this confidence the operator has to choose the master
+MIN_CONFIDENCE = 0.6
+# Confidence only ranks the masters against each other (with one master it is
+# always 1), so the best match must also be at least this similar to the photo.
+# Photos of a master score above 0.75 even with lighting changes; unrelated
+# images score near or below 0
+MIN_SIMILARITY = 0.5
+
+
+class MasterIndex:
+    """Descriptor matrix over the active master samples"""
+
+    def __init__(self):
+        self.ids = []
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self._hashes = {}
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Pick up masters added, changed or deactivated since the last call"""
+        from .models import MasterSample
+        from . import feature_store
+
+        active = dict(MasterSample.objects.filter(is_active=True).values_list('pk', 'content_hash'))
+        with self._lock:
+            if active == self._hashes:
+                return
+            rows = {pk: row for pk, row in self._rows.items() if self._hashes.get(pk) == active.get(pk)}
+            for master_sample in MasterSample.objects.filter(pk__in=set(active) - set(rows)):
+                try:
+                    rows[master_sample.pk] = feature_store.load(master_sample).descriptor
+                except (OSError, ValueError):
+                    continue  # Unreadable master image; it cannot be matched
+            self._rows = rows
+            self._hashes = active
+            self.ids = sorted(rows)
+            self.matrix = np.stack([rows[pk] for pk in self.ids]) if rows else np.empty((0, 0), dtype=np.float32)
+
+    def identify(self, descriptor, k=3):
+        """Best ``k`` matches as ``(master_sample_id, similarity, confidence)``"""
+        with self._lock:
+            ids, matrix = self.ids, self.matrix
+        if not ids:
+            return []
+        similarities = matrix @ descriptor
+        weights = np.exp((similarities - similarities.max()) / TEMPERATURE)
+        confidences = weights / weights.sum()
+        best = np.argsort(-similarities)[:k]
+        return [(ids[i], float(similarities[i]), float(confidences[i])) for i in best]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Return this process's master index, brought up to date"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = MasterIndex()
+    _index.refresh()
+    return _index
+
+
+def identify_master(image_file, k=3):
+    """Rank active master samples for an uploaded product photo.
+
+    Returns ``(master_sample, similarity, confidence)`` tuples, best first;
+    ``confidence`` is the probability (0-1) that the photo shows that master
+    rather than one of the others, so a match is only trustworthy when its
+    ``similarity`` is at least ``MIN_SIMILARITY`` as well.
+    """
+    from .models import MasterSample
+
+    if not CV2_AVAILABLE:
+        return []
+    data = image_file.read()
+    image_file.seek(0)
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_4)
+    if image is None:
+        return []
+
+    matches = get_index().identify(image_descriptor(image), k=k)
+    masters = MasterSample.objects.select_related('mould').in_bulk([pk for pk, _, _ in matches])
+    return [(masters[pk], similarity, confidence) for pk, similarity, confidence in matches if pk in masters]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0006_housekeepingtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcomparison',
+            name='error_message',
+            field=models.TextField(blank=True),
+        ),
+        # Existing comparisons were processed synchronously, so they are done
+        migrations.AddField(
+            model_name='productcomparison',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='done', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='productcomparison',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
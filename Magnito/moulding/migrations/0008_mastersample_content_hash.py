@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0007_productcomparison_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mastersample',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the image file', max_length=64),
+        ),
+    ]
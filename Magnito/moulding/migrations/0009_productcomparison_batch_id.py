@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0008_mastersample_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcomparison',
+            name='batch_id',
+            field=models.CharField(blank=True, db_index=True, help_text='Set when uploaded as part of a batch', max_length=32),
+        ),
+    ]
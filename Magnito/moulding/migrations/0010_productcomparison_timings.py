@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0009_productcomparison_batch_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcomparison',
+            name='timings',
+            field=models.JSONField(blank=True, default=dict, help_text='Seconds spent per comparison stage'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0010_productcomparison_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mastersample',
+            name='engine',
+            field=models.CharField(choices=[('ssim', 'Structural similarity (SSIM)'), ('histogram', 'Colour histogram distance'), ('phase', 'Phase-correlation aligned difference')], default='ssim', help_text='Image comparison engine', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='productcomparison',
+            name='engine',
+            field=models.CharField(blank=True, help_text='Engine that produced the score', max_length=30),
+        ),
+    ]
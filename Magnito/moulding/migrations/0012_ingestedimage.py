@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0011_comparison_engines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestedImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the image file', max_length=64, unique=True)),
+                ('machine_number', models.CharField(max_length=50)),
+                ('source_name', models.CharField(help_text='File name as dropped by the camera', max_length=255)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('compared', 'Compared'), ('rejected', 'Rejected')], default='queued', max_length=20)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('comparison', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingested_image', to='moulding.productcomparison')),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:11
+
+from django.db import migrations, models
+import moulding.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0012_ingestedimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mastersample',
+            name='region_mask',
+            field=models.ImageField(blank=True, help_text='Optional mask image the size of the master; only white areas are compared (SSIM engine)', null=True, upload_to='master_samples/masks/'),
+        ),
+        migrations.AddField(
+            model_name='mastersample',
+            name='regions',
+            field=models.JSONField(blank=True, default=list, help_text='Inspection regions in master image pixels, e.g. [{"name": "Cavity 1", "x": 40, "y": 60, "width": 300, "height": 200}]. Only these areas are compared (SSIM engine); leave empty to compare the whole image.', validators=[moulding.models.validate_regions]),
+        ),
+        migrations.AddField(
+            model_name='productcomparison',
+            name='region_scores',
+            field=models.JSONField(blank=True, default=list, help_text='Score per inspection region'),
+        ),
+    ]
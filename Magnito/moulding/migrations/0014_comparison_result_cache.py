@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0013_inspection_regions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcomparison',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Identifies identical comparisons', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='productcomparison',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, help_text='Earlier comparison whose result was reused', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='moulding.productcomparison'),
+        ),
+        migrations.AddField(
+            model_name='productcomparison',
+            name='product_phash',
+            field=models.CharField(blank=True, editable=False, help_text='Perceptual hash of the product image', max_length=16),
+        ),
+    ]
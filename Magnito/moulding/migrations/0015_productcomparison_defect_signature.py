@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0014_comparison_result_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcomparison',
+            name='defect_signature',
+            field=models.CharField(blank=True, editable=False, help_text='8x8 map of where defects were found', max_length=16),
+        ),
+    ]
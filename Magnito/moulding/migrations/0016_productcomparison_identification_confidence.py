@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0015_productcomparison_defect_signature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcomparison',
+            name='identification_confidence',
+            field=models.FloatField(blank=True, help_text='Confidence (0-1) when the master sample was identified from the photo', null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0016_productcomparison_identification_confidence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcomparison',
+            name='defect_boxes',
+            field=models.BinaryField(blank=True, default=b'', help_text='Packed defect boxes (see utils.pack_defects)'),
+        ),
+        migrations.AddField(
+            model_name='productcomparison',
+            name='in_heatmap',
+            field=models.BooleanField(default=False, editable=False, help_text="Defect boxes are counted in the master's heatmap"),
+        ),
+        migrations.CreateModel(
+            name='DefectHeatmap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(blank=True, help_text='Master image the counts refer to', max_length=64)),
+                ('height', models.IntegerField(default=0, help_text='Master image height in pixels')),
+                ('width', models.IntegerField(default=0, help_text='Master image width in pixels')),
+                ('grid', models.BinaryField(default=b'', help_text='int32 counts per cell (see heatmap.grid_shape)')),
+                ('comparison_count', models.IntegerField(default=0)),
+                ('defect_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('master_sample', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='defect_heatmap', to='moulding.mastersample')),
+            ],
+        ),
+    ]
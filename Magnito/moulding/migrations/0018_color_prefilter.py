@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0017_defect_heatmap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcomparison',
+            name='color_check',
+            field=models.JSONField(blank=True, default=dict, help_text='Colour prefilter result (histogram score, delta E)'),
+        ),
+        migrations.AddField(
+            model_name='productcomparison',
+            name='color_drift',
+            field=models.BooleanField(default=False, help_text='Colour differs noticeably from the master'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0018_color_prefilter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcomparison',
+            name='frame_scores',
+            field=models.JSONField(blank=True, default=list, help_text='Score per sampled video frame'),
+        ),
+        migrations.AddField(
+            model_name='productcomparison',
+            name='product_video',
+            field=models.FileField(blank=True, help_text='Inspection clip; its worst frame becomes the product image', upload_to='product_videos/'),
+        ),
+    ]
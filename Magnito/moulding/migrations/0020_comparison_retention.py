@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0019_product_video'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcomparison',
+            name='archive_path',
+            field=models.CharField(blank=True, editable=False, help_text='Zip file in ARCHIVE_ROOT holding the archived files', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='productcomparison',
+            name='retention_tier',
+            field=models.CharField(choices=[('full', 'Full resolution'), ('downscaled', 'Downscaled'), ('archived', 'Archived')], db_index=True, default='full', editable=False, help_text='Storage tier of the product image (see moulding/retention.py)', max_length=20),
+        ),
+    ]
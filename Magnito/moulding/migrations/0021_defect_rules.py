@@ -0,0 +1,117 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:30
+
+from django.db import migrations, models
+
+
+# The rules analyze_defects used to hard-code
+SCORE_BANDS = [
+    ('Match', 95, True, "Product matches master sample. No defects detected.", ""),
+    ('Minor', 85, False, "Minor differences detected",
+     "Fine-tune injection speed\nCheck material temperature\nVerify mould temperature is consistent"),
+    ('Moderate', 70, False, "Moderate differences detected",
+     "Check injection pressure and holding pressure\nVerify cooling time is adequate\nInspect mould for wear or damage"),
+    ('Major', 0, False, "Major differences detected from master sample",
+     "Check if correct mould is being used\nVerify material type and color match specifications\n"
+     "Review machine settings (temperature, pressure, cycle time)"),
+]
+
+DEFECT_TYPES = {
+    'Short Shot': ('Incomplete filling of the mould cavity',
+                   'Insufficient material, low injection pressure, cold material',
+                   'Increase injection pressure\nIncrease material temperature\nIncrease injection speed\n'
+                   'Check for material blockage\nVerify adequate material supply'),
+    'Flash': ('Excess material escaping at the parting line',
+              'Excessive injection pressure, worn mould, insufficient clamping',
+              'Reduce injection pressure\nReduce material temperature\nIncrease clamping force\n'
+              'Inspect and repair mould parting line\nCheck mould alignment'),
+    'Sink Marks': ('Depressions on the surface caused by shrinkage',
+                   'Insufficient packing pressure, inadequate cooling',
+                   'Increase packing pressure\nExtend packing time\nReduce material temperature\n'
+                   'Increase cooling time\nOptimize gate location'),
+    'Surface Blemishes': ('Small marks, scratches or dull spots on the surface',
+                          'Damaged or dirty mould surface, poor release, moisture in the material',
+                          'Clean and polish the cavity surface\nCheck mould release and ejection\nDry the material'),
+    'Flow Marks': ('Wavy lines or patterns on the surface',
+                   'Low injection speed, cold material, poor venting',
+                   'Increase injection speed\nIncrease material temperature\nImprove mould venting\n'
+                   'Optimize gate location\nIncrease mould temperature'),
+    'Contamination': ('Foreign particles or specks in the part',
+                      'Dirty hopper or regrind, degraded material, mixed materials',
+                      'Clean the hopper and feed throat\nCheck regrind quality and ratio\nPurge the barrel'),
+}
+
+SIZE_CLASSES = [
+    ('Large', 1000, None, "Large defects detected - check for:", ['Short Shot', 'Flash', 'Sink Marks']),
+    ('Small', 0, 1000, "Small defects detected - check for:", ['Surface Blemishes', 'Flow Marks', 'Contamination']),
+]
+
+
+def seed_rules(apps, schema_editor):
+    ScoreBand = apps.get_model('moulding', 'ScoreBand')
+    DefectSizeClass = apps.get_model('moulding', 'DefectSizeClass')
+    DefectType = apps.get_model('moulding', 'DefectType')
+
+    for name, min_score, passes, description, fix_instructions in SCORE_BANDS:
+        ScoreBand.objects.create(
+            name=name, min_score=min_score, passes=passes, description=description, fix_instructions=fix_instructions
+        )
+    for order, (name, min_area, max_area, heading, type_names) in enumerate(SIZE_CLASSES):
+        size_class = DefectSizeClass.objects.create(
+            name=name, min_area=min_area, max_area=max_area, heading=heading, order=order
+        )
+        for type_name in type_names:
+            defect_type = DefectType.objects.filter(name__iexact=type_name).first()
+            if defect_type is None:
+                description, causes, fixes = DEFECT_TYPES[type_name]
+                defect_type = DefectType.objects.create(
+                    name=type_name, description=description, common_causes=causes, fix_instructions=fixes
+                )
+            size_class.defect_types.add(defect_type)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0020_comparison_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('min_score', models.FloatField(help_text='Lowest similarity score (0-100) in the band; it runs up to the next band')),
+                ('passes', models.BooleanField(default=False, help_text='Products in this band match the master sample')),
+                ('description', models.CharField(help_text='Finding reported for products in this band', max_length=200)),
+                ('fix_instructions', models.TextField(blank=True, help_text='Steps to fix, one per line')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-min_score'],
+            },
+        ),
+        migrations.AddField(
+            model_name='defecttype',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.CreateModel(
+            name='DefectSizeClass',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('min_area', models.PositiveIntegerField(default=0, help_text='Defects must be larger than this area in pixels')),
+                ('max_area', models.PositiveIntegerField(blank=True, help_text='Largest defect area included (blank for no limit)', null=True)),
+                ('heading', models.CharField(help_text='Fix step shown when such defects are found, e.g. "Large defects detected - check for:"', max_length=200)),
+                ('order', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('defect_types', models.ManyToManyField(blank=True, help_text='Defect types to check for', related_name='size_classes', to='moulding.defecttype')),
+            ],
+            options={
+                'verbose_name_plural': 'defect size classes',
+                'ordering': ['order', 'min_area'],
+            },
+        ),
+        migrations.RunPython(seed_rules, migrations.RunPython.noop),
+    ]
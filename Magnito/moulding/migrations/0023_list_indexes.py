@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0022_kpi_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hourlychecklist',
+            index=models.Index(fields=['-check_time', '-id'], name='hourlychecklist_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='housekeepingtask',
+            index=models.Index(fields=['-created_at', '-id'], name='housekeepingtask_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['-priority', '-reported_date', '-id'], name='issue_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenancejobcard',
+            index=models.Index(fields=['-scheduled_date', '-created_at', '-id'], name='jobcard_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mouldchange',
+            index=models.Index(fields=['-scheduled_time', '-id'], name='mouldchange_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mouldrun',
+            index=models.Index(fields=['is_active', '-start_time', '-id'], name='mouldrun_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productcomparison',
+            index=models.Index(fields=['-created_at', '-id'], name='productcomparison_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='troubleshootinglog',
+            index=models.Index(fields=['-created_at', '-id'], name='troubleshootinglog_list_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0023_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcomparison',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Times the comparison was queued'),
+        ),
+        migrations.AddField(
+            model_name='productcomparison',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Last time the comparison was queued', null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:40
+
+from django.db import migrations
+
+
+# The warpage fix steps get_defect_fix_instructions used to hard-code
+WARPAGE = ('Distortion or bending of the part after ejection',
+           'Uneven cooling, high material temperature, residual stress',
+           'Optimize cooling system\nReduce material temperature\nAdjust packing pressure\n'
+           'Increase cooling time\nCheck mould temperature uniformity')
+
+
+def seed_warpage(apps, schema_editor):
+    DefectType = apps.get_model('moulding', 'DefectType')
+
+    if not DefectType.objects.filter(name__iexact='Warpage').exists():
+        description, causes, fixes = WARPAGE
+        DefectType.objects.create(
+            name='Warpage', description=description, common_causes=causes, fix_instructions=fixes
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0024_comparison_queue_state'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_warpage, migrations.RunPython.noop),
+    ]
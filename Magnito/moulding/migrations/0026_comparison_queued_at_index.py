@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0025_seed_warpage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productcomparison',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='Last time the comparison was queued', null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moulding', '0026_comparison_queued_at_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productcomparison',
+            name='product_image',
+            field=models.ImageField(db_index=True, upload_to='product_comparisons/'),
+        ),
+        migrations.AlterField(
+            model_name='productcomparison',
+            name='product_video',
+            field=models.FileField(blank=True, db_index=True, help_text='Inspection clip; its worst frame becomes the product image', upload_to='product_videos/'),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.utils import timezone
+from .utils import ENGINE_CHOICES, DEFAULT_ENGINE, MIN_REGION_SIZE
+from . import image_ingest
 
 
 class Mould(models.Model):
@@ -39,6 +42,9 @@ class MouldChange(models.Model):
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['-scheduled_time', '-id'], name='mouldchange_list_idx')]
+
     def __str__(self):
         return f"Change to {self.mould_to} on {self.scheduled_time}"
 
@@ -78,6 +84,9 @@ class TroubleshootingLog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['-created_at', '-id'], name='troubleshootinglog_list_idx')]
+
     def __str__(self):
         return f"{self.issue.title} - {self.created_at}"
 
@@ -110,10 +119,42 @@ class HourlyChecklist(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['-check_time', '-id'], name='hourlychecklist_list_idx')]
+
     def __str__(self):
         return f"Checklist - {self.machine_number} - {self.check_time}"
 
 
+def validate_regions(value):
+    """Inspection regions must be a list of {name, x, y, width, height} rectangles"""
+    if not isinstance(value, list):
+        raise ValidationError('Regions must be a list of rectangles.')
+    for region in value:
+        if not isinstance(region, dict) or not all(
+            isinstance(region.get(key), int) for key in ('x', 'y', 'width', 'height')
+        ):
+            raise ValidationError('Each region needs integer x, y, width and height.')
+        if region['x'] < 0 or region['y'] < 0:
+            raise ValidationError('Region x and y cannot be negative.')
+        if region['width'] < MIN_REGION_SIZE or region['height'] < MIN_REGION_SIZE:
+            raise ValidationError(f'Regions must be at least {MIN_REGION_SIZE} pixels wide and high.')
+
+
+def scale_regions(regions, scale):
+    """Inspection regions for a master image resized by ``scale``"""
+    return [
+        dict(
+            region,
+            x=int(region['x'] * scale),
+            y=int(region['y'] * scale),
+            width=max(MIN_REGION_SIZE, round(region['width'] * scale)),
+            height=max(MIN_REGION_SIZE, round(region['height'] * scale)),
+        )
+        for region in regions
+    ]
+
+
 class MasterSample(models.Model):
     """Model for master samples"""
     mould = models.ForeignKey(Mould, on_delete=models.CASCADE)
@@ -122,17 +163,65 @@ class MasterSample(models.Model):
     description = models.TextField(blank=True)
     specifications = models.TextField(help_text="Key specifications and tolerances")
     is_active = models.BooleanField(default=True)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False, help_text="SHA-256 of the image file")
+    engine = models.CharField(max_length=30, choices=ENGINE_CHOICES, default=DEFAULT_ENGINE, help_text="Image comparison engine")
+    regions = models.JSONField(
+        default=list, blank=True, validators=[validate_regions],
+        help_text='Inspection regions in master image pixels, e.g. [{"name": "Cavity 1", "x": 40, "y": 60, "width": 300, "height": 200}]. '
+                  'Only these areas are compared (SSIM engine); leave empty to compare the whole image.'
+    )
+    region_mask = models.ImageField(
+        upload_to='master_samples/masks/', blank=True, null=True,
+        help_text="Optional mask image the size of the master; only white areas are compared (SSIM engine)"
+    )
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        # A newly uploaded image has not been written to storage yet
+        image_changed = bool(self.image) and not self.image._committed
+        scale = image_ingest.ingest(self.image)
+        if scale != 1.0 and self.regions:
+            # Regions were drawn on the image as uploaded
+            self.regions = scale_regions(self.regions, scale)
+        super().save(*args, **kwargs)
+        if image_changed:
+            image_ingest.make_thumbnails(self.image)
+        if self.image and (image_changed or not self.content_hash):
+            # Preprocess the master once so comparisons only decode the product
+            from . import feature_store
+            try:
+                self.content_hash = feature_store.build(self.image.path)
+            except ValueError:
+                # Unreadable image; comparisons will retry and report the error
+                self.content_hash = ''
+            MasterSample.objects.filter(pk=self.pk).update(content_hash=self.content_hash)
+
     def __str__(self):
         return f"{self.sample_number} - {self.mould}"
 
 
 class ProductComparison(models.Model):
     """Model for product comparisons against master sample"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    RETENTION_CHOICES = [
+        ('full', 'Full resolution'),
+        ('downscaled', 'Downscaled'),
+        ('archived', 'Archived'),
+    ]
+    
     master_sample = models.ForeignKey(MasterSample, on_delete=models.CASCADE)
-    product_image = models.ImageField(upload_to='product_comparisons/')
+    # Indexed for the shared-file lookup of ContentAddressedStorage.delete
+    product_image = models.ImageField(upload_to='product_comparisons/', db_index=True)
+    product_video = models.FileField(
+        upload_to='product_videos/', blank=True, db_index=True,
+        help_text="Inspection clip; its worst frame becomes the product image"
+    )
     operator = models.ForeignKey(User, on_delete=models.CASCADE)
     machine_number = models.CharField(max_length=50)
     
@@ -143,12 +232,106 @@ class ProductComparison(models.Model):
     fix_instructions = models.TextField(blank=True)
     
     # Status
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error_message = models.TextField(blank=True)
+    queued_at = models.DateTimeField(null=True, blank=True, db_index=True, editable=False, help_text="Last time the comparison was queued")
+    attempts = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Times the comparison was queued")
+    batch_id = models.CharField(max_length=32, blank=True, db_index=True, help_text="Set when uploaded as part of a batch")
+    timings = models.JSONField(default=dict, blank=True, help_text="Seconds spent per comparison stage")
+    engine = models.CharField(max_length=30, blank=True, help_text="Engine that produced the score")
+    region_scores = models.JSONField(default=list, blank=True, help_text="Score per inspection region")
+    color_check = models.JSONField(default=dict, blank=True, help_text="Colour prefilter result (histogram score, delta E)")
+    color_drift = models.BooleanField(default=False, help_text="Colour differs noticeably from the master")
+    frame_scores = models.JSONField(default=list, blank=True, help_text="Score per sampled video frame")
+    product_phash = models.CharField(max_length=16, blank=True, editable=False, help_text="Perceptual hash of the product image")
+    defect_signature = models.CharField(max_length=16, blank=True, editable=False, help_text="8x8 map of where defects were found")
+    defect_boxes = models.BinaryField(blank=True, default=b'', editable=False, help_text="Packed defect boxes (see utils.pack_defects)")
+    in_heatmap = models.BooleanField(default=False, editable=False, help_text="Defect boxes are counted in the master's heatmap")
+    cache_key = models.CharField(max_length=64, blank=True, db_index=True, editable=False, help_text="Identifies identical comparisons")
+    identification_confidence = models.FloatField(
+        null=True, blank=True, help_text="Confidence (0-1) when the master sample was identified from the photo"
+    )
+    duplicate_of = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates',
+        help_text="Earlier comparison whose result was reused"
+    )
+    retention_tier = models.CharField(
+        max_length=20, choices=RETENTION_CHOICES, default='full', db_index=True, editable=False,
+        help_text="Storage tier of the product image (see moulding/retention.py)"
+    )
+    archive_path = models.CharField(
+        max_length=255, blank=True, editable=False, help_text="Zip file in ARCHIVE_ROOT holding the archived files"
+    )
     approved = models.BooleanField(default=False)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['-created_at', '-id'], name='productcomparison_list_idx')]
+
+    def save(self, *args, **kwargs):
+        image_changed = bool(self.product_image) and not self.product_image._committed
+        image_ingest.ingest(self.product_image)
+        super().save(*args, **kwargs)
+        if image_changed:
+            image_ingest.make_thumbnails(self.product_image)
+            # Hash new uploads so repeated photos can reuse an earlier result
+            from .utils import CV2_AVAILABLE, perceptual_hash
+            if not CV2_AVAILABLE:
+                return
+            try:
+                self.product_phash = perceptual_hash(self.product_image.path)
+            except ValueError:
+                self.product_phash = ''
+            ProductComparison.objects.filter(pk=self.pk).update(product_phash=self.product_phash)
+
     def __str__(self):
         return f"Comparison - {self.master_sample} - {self.created_at}"
+    
+    def is_processing(self):
+        """Check if the comparison is still queued or running"""
+        return self.status in ['pending', 'running']
+
+    def get_defect_boxes(self):
+        """Stored defect boxes as dicts with x, y, width, height and area"""
+        from .utils import unpack_defects
+        return unpack_defects(self.defect_boxes)
+
+
+class DefectHeatmap(models.Model):
+    """Running count of defect boxes over a master sample's image"""
+    master_sample = models.OneToOneField(MasterSample, on_delete=models.CASCADE, related_name='defect_heatmap')
+    content_hash = models.CharField(max_length=64, blank=True, help_text="Master image the counts refer to")
+    height = models.IntegerField(default=0, help_text="Master image height in pixels")
+    width = models.IntegerField(default=0, help_text="Master image width in pixels")
+    grid = models.BinaryField(default=b'', help_text="int32 counts per cell (see heatmap.grid_shape)")
+    comparison_count = models.IntegerField(default=0)
+    defect_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Heatmap - {self.master_sample}"
+
+
+class IngestedImage(models.Model):
+    """Image picked up from the hot folder, recorded so it is processed only once"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('compared', 'Compared'),
+        ('rejected', 'Rejected'),
+    ]
+
+    content_hash = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the image file")
+    machine_number = models.CharField(max_length=50)
+    source_name = models.CharField(max_length=255, help_text="File name as dropped by the camera")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    comparison = models.OneToOneField(ProductComparison, on_delete=models.SET_NULL, null=True, blank=True, related_name='ingested_image')
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.machine_number}/{self.source_name}"
 
 
 class DefectType(models.Model):
@@ -159,6 +342,41 @@ class DefectType(models.Model):
     fix_instructions = models.TextField(help_text="Step-by-step instructions to fix")
     machine_adjustments = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ScoreBand(models.Model):
+    """Similarity score band of the defect rules (see defect_rules.py)"""
+    name = models.CharField(max_length=100)
+    min_score = models.FloatField(help_text="Lowest similarity score (0-100) in the band; it runs up to the next band")
+    passes = models.BooleanField(default=False, help_text="Products in this band match the master sample")
+    description = models.CharField(max_length=200, help_text="Finding reported for products in this band")
+    fix_instructions = models.TextField(blank=True, help_text="Steps to fix, one per line")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-min_score']
+
+    def __str__(self):
+        return f"{self.name} (from {self.min_score:g})"
+
+
+class DefectSizeClass(models.Model):
+    """Defect areas that point at particular defect types (see defect_rules.py)"""
+    name = models.CharField(max_length=100)
+    min_area = models.PositiveIntegerField(default=0, help_text="Defects must be larger than this area in pixels")
+    max_area = models.PositiveIntegerField(null=True, blank=True, help_text="Largest defect area included (blank for no limit)")
+    heading = models.CharField(max_length=200, help_text='Fix step shown when such defects are found, e.g. "Large defects detected - check for:"')
+    defect_types = models.ManyToManyField(DefectType, blank=True, related_name='size_classes', help_text="Defect types to check for")
+    order = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['order', 'min_area']
+        verbose_name_plural = 'defect size classes'
 
     def __str__(self):
         return self.name
@@ -179,6 +397,7 @@ class MouldRun(models.Model):
 
     class Meta:
         ordering = ['-start_time']
+        indexes = [models.Index(fields=['is_active', '-start_time', '-id'], name='mouldrun_list_idx')]
 
     def __str__(self):
         return f"{self.mould} on {self.machine_number} - {self.start_time}"
@@ -204,6 +423,19 @@ class MouldRun(models.Model):
             return f"{minutes}m"
 
 
+class KpiCounter(models.Model):
+    """Materialized shop-floor count, kept up to date by counters.py"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
 # Import auth models
 from .models_auth import Company, UserProfile
 
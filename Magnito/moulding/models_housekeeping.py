@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from . import image_ingest
+
 
 class HousekeepingTask(models.Model):
     """Model for housekeeping tasks with before/after pictures"""
@@ -47,6 +49,7 @@ class HousekeepingTask(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['-created_at', '-id'], name='housekeepingtask_list_idx')]
     
     def save(self, *args, **kwargs):
         if not self.task_number:
@@ -60,7 +63,16 @@ class HousekeepingTask(models.Model):
                     self.task_number = f'HK-{self.id or 1:05d}'
             else:
                 self.task_number = 'HK-00001'
+        # Shrink and re-encode newly uploaded pictures
+        uploaded = [
+            name for name in ('before_image', 'after_image')
+            if getattr(self, name) and not getattr(self, name)._committed
+        ]
+        for name in uploaded:
+            image_ingest.ingest(getattr(self, name))
         super().save(*args, **kwargs)
+        for name in uploaded:
+            image_ingest.make_thumbnails(getattr(self, name))
     
     def __str__(self):
         return f"{self.task_number} - {self.get_area_type_display()} - {self.area_description}"
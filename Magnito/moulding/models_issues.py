@@ -79,6 +79,7 @@ class Issue(models.Model):
     
     class Meta:
         ordering = ['-priority', '-reported_date']
+        indexes = [models.Index(fields=['-priority', '-reported_date', '-id'], name='issue_list_idx')]
     
     def __str__(self):
         return f"{self.issue_number} - {self.title}"
@@ -165,6 +166,7 @@ class MaintenanceJobCard(models.Model):
     
     class Meta:
         ordering = ['-scheduled_date', '-created_at']
+        indexes = [models.Index(fields=['-scheduled_date', '-created_at', '-id'], name='jobcard_list_idx')]
     
     def __str__(self):
         return f"{self.job_card_number} - {self.title}"
@@ -0,0 +1,154 @@
+"""
+Keyset (cursor) pagination for the list views.
+
+Instead of ``OFFSET``, which makes the database walk past every earlier
+row, a page starts after the sort key of the last row shown: with an index
+on the sort fields a deep page costs the same as the first. The primary
+key is added as a final sort field so rows sharing a timestamp are neither
+skipped nor repeated.
+
+Cursors are the sort values of the boundary row, JSON encoded and base64
+wrapped, passed as ``?after=`` (older rows) or ``?before=`` (newer rows).
+Sort fields must not be nullable.
+"""
+import base64
+import binascii
+import datetime
+import json
+from functools import reduce
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Keeps full microsecond precision, which ``DjangoJSONEncoder`` drops"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPage:
+    """One page of rows plus links to its neighbours"""
+
+    def __init__(self, objects, request, next_cursor, previous_cursor):
+        self.objects = objects
+        self.request = request
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __bool__(self):
+        return bool(self.objects)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def _url(self, param, cursor):
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query[param] = cursor
+        return f"?{query.urlencode()}"
+
+    @property
+    def next_url(self):
+        return self._url('after', self.next_cursor) if self.has_next else ''
+
+    @property
+    def previous_url(self):
+        return self._url('before', self.previous_cursor) if self.has_previous else ''
+
+    @property
+    def first_url(self):
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        return f"?{query.urlencode()}" if query else '?'
+
+
+def _sort_keys(queryset, ordering):
+    """``[(field name, descending)]`` for the ordering plus the primary key"""
+    keys = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+    pk_name = queryset.model._meta.pk.name
+    if not any(name in ('pk', pk_name) for name, _ in keys):
+        keys.append((pk_name, keys[-1][1] if keys else True))
+    return keys
+
+
+def encode_cursor(obj, keys):
+    values = [getattr(obj, name) for name, _ in keys]
+    data = json.dumps(values, cls=CursorEncoder, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, keys):
+    """Sort values from a cursor, or None if it is malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            return None
+        return [model._meta.get_field(name).to_python(value) for (name, _), value in zip(keys, values)]
+    except (ValueError, binascii.Error, ValidationError):
+        return None
+
+
+def _beyond(keys, values, forward):
+    """Rows after the boundary ``values`` in sort order (before it if not ``forward``)"""
+    clauses = []
+    for index, (name, descending) in enumerate(keys):
+        lookup = 'lt' if descending == forward else 'gt'
+        equal = {keys[i][0]: values[i] for i in range(index)}
+        clauses.append(Q(**equal, **{f'{name}__{lookup}': values[index]}))
+    return reduce(lambda a, b: a | b, clauses)
+
+
+def paginate(request, queryset, ordering, per_page=None):
+    """
+    The page of ``queryset`` sorted by ``ordering`` that the request's
+    ``after``/``before`` cursor points at (the first page without one).
+    """
+    per_page = per_page or settings.LIST_PAGE_SIZE
+    keys = _sort_keys(queryset, ordering)
+    order_by = [f"{'-' if descending else ''}{name}" for name, descending in keys]
+    reverse_by = [f"{'' if descending else '-'}{name}" for name, descending in keys]
+
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    boundary = decode_cursor(after or before, queryset.model, keys) if (after or before) else None
+
+    if boundary is not None and before and not after:
+        rows = list(queryset.filter(_beyond(keys, boundary, forward=False)).order_by(*reverse_by)[:per_page + 1])
+        has_more = len(rows) > per_page
+        objects = rows[:per_page][::-1]
+        # Arrived from the next page, so there is one
+        has_next = bool(objects)
+        has_previous = has_more
+    else:
+        if boundary is not None:
+            queryset = queryset.filter(_beyond(keys, boundary, forward=True))
+        rows = list(queryset.order_by(*order_by)[:per_page + 1])
+        objects = rows[:per_page]
+        has_next = len(rows) > per_page
+        has_previous = boundary is not None and bool(objects)
+
+    return KeysetPage(
+        objects,
+        request,
+        encode_cursor(objects[-1], keys) if has_next else None,
+        encode_cursor(objects[0], keys) if has_previous else None,
+    )
@@ -0,0 +1,128 @@
+"""
+Reuse of comparison results for repeated product photos.
+
+A result is identified by the master's content hash, the product's
+perceptual hash, the engine name and version, and a digest of the engine
+options (inspection regions, cascade and memory settings). The key is
+stored on every ``ProductComparison`` as ``cache_key``.
+
+Recent results are kept in a bounded in-process LRU; on a miss the newest
+finished comparison with the same key is looked up in the database, so
+results computed by worker processes or before a restart are reused too.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .utils import CV2_AVAILABLE, get_engine, perceptual_hash
+
+
+CACHED_FIELDS = [
+    'similarity_score', 'defects_found', 'defect_description',
+    'fix_instructions', 'engine', 'region_scores', 'defect_signature',
+    'defect_boxes', 'color_check', 'color_drift',
+]
+
+
+class LRUCache:
+    """Thread-safe mapping that forgets the least recently used entries"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_results = LRUCache(settings.COMPARISON_CACHE_SIZE)
+
+
+def enabled():
+    return CV2_AVAILABLE and settings.COMPARISON_CACHE_SIZE > 0
+
+
+def cache_key(master_sample, product_phash, options):
+    """Digest identifying the result of comparing a product with a master"""
+    engine = get_engine(master_sample.engine)
+    parts = {
+        'master': master_sample.content_hash,
+        'product': product_phash,
+        'engine': f'{engine.engine_name}:{engine.version}',
+        'options': options,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def remember(comparison):
+    """Keep the result of a finished comparison in the in-process cache"""
+    if comparison.cache_key and comparison.status == 'done':
+        _results.put(comparison.cache_key, (
+            comparison.duplicate_of_id or comparison.pk, {field: getattr(comparison, field) for field in CACHED_FIELDS}
+        ))
+
+
+def apply_cached(comparison, options):
+    """Fill in ``comparison`` from an earlier identical comparison.
+
+    Computes the product's perceptual hash and cache key if missing and
+    returns True (without saving) when a cached result was applied.
+    """
+    from .models import ProductComparison
+
+    started = time.perf_counter()
+    if not comparison.product_phash:
+        try:
+            comparison.product_phash = perceptual_hash(comparison.product_image.path)
+        except ValueError:
+            return False
+    if not comparison.master_sample.content_hash:
+        return False
+    comparison.cache_key = cache_key(comparison.master_sample, comparison.product_phash, options)
+
+    cached = _results.get(comparison.cache_key)
+    if cached is None:
+        original = (
+            ProductComparison.objects.filter(cache_key=comparison.cache_key, status='done')
+            .exclude(pk=comparison.pk).order_by('-pk').only('pk', 'cache_key', 'status', 'duplicate_of', *CACHED_FIELDS).first()
+        )
+        if original is None:
+            return False
+        remember(original)
+        cached = (original.duplicate_of_id or original.pk, {field: getattr(original, field) for field in CACHED_FIELDS})
+
+    original_id, fields = cached
+    for field, value in fields.items():
+        setattr(comparison, field, value)
+    comparison.duplicate_of_id = original_id
+    # Re-uploads of the same photo are not counted in the heatmap again
+    comparison.in_heatmap = False
+    comparison.status = 'done'
+    comparison.error_message = ''
+    comparison.timings = {'cache': round(time.perf_counter() - started, 4)}
+    return True
@@ -0,0 +1,234 @@
+"""
+Retention policy for product comparison images.
+
+Comparisons move through three tiers as they age:
+
+- ``full``: the image as uploaded, kept for ``RETENTION_FULL_DAYS``;
+- ``downscaled``: re-encoded at ``RETENTION_MAX_SIDE`` and
+  ``RETENTION_QUALITY`` in media storage, kept until
+  ``RETENTION_ARCHIVE_DAYS``;
+- ``archived``: the image (and video clip, if any) moved into a monthly zip
+  file under ``ARCHIVE_ROOT`` and removed from media storage. The scores,
+  defects and hashes stay on the comparison.
+
+Comparisons of rejected parts (a score outside the passing bands of the
+defect rules, colour drift or a failed comparison, and not approved) and
+those that may be evidence for an open issue (same mould and machine, taken
+from ``RETENTION_ISSUE_LOOKBACK_DAYS`` before the issue was reported) are
+never touched. ``defects_found`` is not used: passing parts usually have a
+few small difference areas too.
+
+Media files are content addressed and may be shared by several comparisons,
+so only files that are actually removed count as reclaimed. Appends to an
+archive are serialised with a lock file next to it, so concurrent runs do
+not corrupt it.
+"""
+import os
+import zipfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import locks
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import image_ingest
+from .defect_rules import get_rules
+
+
+def rejected():
+    """Comparisons whose product did not match its master sample"""
+    passed = Q(pk__in=[])
+    for low, high in get_rules().passing_ranges():
+        band = Q(similarity_score__gte=low)
+        if high is not None:
+            band &= Q(similarity_score__lt=high)
+        passed |= band
+    return Q(status='failed') | Q(color_drift=True) | Q(similarity_score__isnull=True) | ~passed
+
+
+def protected():
+    """Comparisons whose images are always kept at full resolution"""
+    from .models_issues import Issue
+
+    open_issues = Issue.objects.filter(
+        status__in=['open', 'in_progress'],
+        mould=OuterRef('master_sample__mould'),
+        reported_date__lte=OuterRef('created_at') + timedelta(days=settings.RETENTION_ISSUE_LOOKBACK_DAYS),
+    ).filter(Q(machine_number='') | Q(machine_number=OuterRef('machine_number')))
+    return (rejected() & Q(approved=False)) | Q(Exists(open_issues))
+
+
+def due(tiers, days, now=None):
+    """Comparisons in one of ``tiers`` older than ``days`` that the policy may move on"""
+    from .models import ProductComparison
+
+    now = now or timezone.now()
+    return (
+        ProductComparison.objects.filter(retention_tier__in=tiers, created_at__lt=now - timedelta(days=days))
+        .exclude(status__in=['pending', 'running'])
+        .exclude(protected())
+        .order_by('pk')
+    )
+
+
+class Report:
+    """
+    Files and bytes handled per tier
+
+    A dry run cannot tell whether a shared file would be kept for another
+    comparison, so it counts every file once.
+    """
+
+    def __init__(self):
+        self.counts = {'downscaled': 0, 'archived': 0, 'missing': 0}
+        self.reclaimed = {'downscaled': 0, 'archived': 0}
+        self._seen = set()
+
+    def add(self, tier, name, reclaimed):
+        self.counts[tier] += 1
+        # Files shared by several comparisons are only freed once
+        if reclaimed > 0 and name not in self._seen:
+            self._seen.add(name)
+            self.reclaimed[tier] += reclaimed
+
+
+def _size(field_file):
+    try:
+        return field_file.storage.size(field_file.name)
+    except OSError:
+        return None
+
+
+def _remove(storage, name):
+    """Delete a file and its thumbnails; False when storage kept it for another record"""
+    image_ingest.delete_thumbnails(name, storage)
+    storage.delete(name)
+    return not storage.exists(name)
+
+
+def downscale(comparison, report, dry_run=False):
+    """Re-encode a comparison's image at archive quality"""
+    field_file = comparison.product_image
+    size = _size(field_file) if field_file else None
+    if size is None:
+        report.counts['missing'] += 1
+        return
+    with field_file.storage.open(field_file.name, 'rb') as source:
+        processed = image_ingest.process_image(
+            source, field_file.name, max_side=settings.RETENTION_MAX_SIDE, quality=settings.RETENTION_QUALITY
+        )
+    if processed is None or processed[0].size >= size:
+        # Not an image, or already smaller than a re-encode would be
+        report.add('downscaled', field_file.name, 0)
+        if not dry_run:
+            type(comparison).objects.filter(pk=comparison.pk).update(retention_tier='downscaled')
+        return
+    content = processed[0]
+    if dry_run:
+        report.add('downscaled', field_file.name, size - content.size)
+        return
+
+    old_name = field_file.name
+    new_name = field_file.storage.save(field_file.field.generate_filename(comparison, content.name), content)
+    type(comparison).objects.filter(pk=comparison.pk).update(product_image=new_name, retention_tier='downscaled')
+    removed = _remove(field_file.storage, old_name)
+    report.add('downscaled', old_name, size - content.size if removed else 0)
+
+
+def archive_name(comparison):
+    """Zip file (relative to ``ARCHIVE_ROOT``) for a comparison's month"""
+    return f"product_comparisons-{comparison.created_at:%Y-%m}.zip"
+
+
+class _ArchiveLock:
+    """Exclusive lock on an archive file, held through a ``.lock`` file next to it"""
+
+    def __init__(self, full_path):
+        self.path = f"{full_path}.lock"
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, 'a')
+        locks.lock(self.file, locks.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        locks.unlock(self.file)
+        self.file.close()
+
+
+def archive(comparison, report, dry_run=False):
+    """Move a comparison's image and video into the zip archive tier"""
+    files = [field_file for field_file in (comparison.product_image, comparison.product_video) if field_file]
+    sizes = [_size(field_file) for field_file in files]
+    if not files or None in sizes:
+        report.counts['missing'] += 1
+        return
+    if dry_run:
+        for field_file, size in zip(files, sizes):
+            report.add('archived', field_file.name, size)
+        return
+
+    path = archive_name(comparison)
+    full_path = os.path.join(settings.ARCHIVE_ROOT, path)
+    with _ArchiveLock(full_path):
+        # Another run may have archived it while this one waited for the lock
+        if type(comparison).objects.filter(pk=comparison.pk, retention_tier='archived').exists():
+            return
+        # Photos and clips are compressed already; deflating them again is slow for nothing
+        with zipfile.ZipFile(full_path, 'a', compression=zipfile.ZIP_STORED) as archive_file:
+            for field_file in files:
+                member = f"{comparison.pk}/{field_file.field.name}{os.path.splitext(field_file.name)[1]}"
+                with field_file.storage.open(field_file.name, 'rb') as source, archive_file.open(member, 'w') as target:
+                    for chunk in source.chunks():
+                        target.write(chunk)
+        type(comparison).objects.filter(pk=comparison.pk).update(
+            product_image='', product_video='', retention_tier='archived', archive_path=path
+        )
+    for field_file, size in zip(files, sizes):
+        removed = _remove(field_file.storage, field_file.name)
+        report.add('archived', field_file.name, size if removed else 0)
+
+
+def apply(full_days=None, archive_days=None, dry_run=False, limit=0, now=None):
+    """Move every comparison that is due to its next tier; returns a ``Report``"""
+    full_days = settings.RETENTION_FULL_DAYS if full_days is None else full_days
+    archive_days = settings.RETENTION_ARCHIVE_DAYS if archive_days is None else archive_days
+    now = now or timezone.now()
+    report = Report()
+
+    # Oldest first: archive whatever has outlived both tiers, then downscale
+    stages = [
+        (due(['full', 'downscaled'], archive_days, now), archive),
+        (due(['full'], full_days, now).filter(created_at__gte=now - timedelta(days=archive_days)), downscale),
+    ]
+    handled = 0
+    for queryset, action in stages:
+        for comparison in queryset.exclude(product_image='', product_video='').iterator():
+            if limit and handled >= limit:
+                return report
+            action(comparison, report, dry_run)
+            handled += 1
+    return report
+
+
+def restore(comparison):
+    """Put an archived comparison's files back into media storage"""
+    from django.core.files.base import ContentFile
+
+    if comparison.retention_tier != 'archived' or not comparison.archive_path:
+        raise ValueError(f"Comparison {comparison.pk} is not archived")
+    updates = {}
+    full_path = os.path.join(settings.ARCHIVE_ROOT, comparison.archive_path)
+    with _ArchiveLock(full_path), zipfile.ZipFile(full_path) as archive_file:
+        for member in archive_file.namelist():
+            if not member.startswith(f"{comparison.pk}/"):
+                continue
+            field_name, extension = os.path.splitext(os.path.basename(member))
+            field = comparison._meta.get_field(field_name)
+            content = ContentFile(archive_file.read(member), name=f"{comparison.pk}{extension}")
+            updates[field_name] = field.storage.save(field.generate_filename(comparison, content.name), content)
+    if not updates:
+        raise ValueError(f"Comparison {comparison.pk} not found in {comparison.archive_path}")
+    type(comparison).objects.filter(pk=comparison.pk).update(retention_tier='downscaled', archive_path='', **updates)
@@ -0,0 +1,132 @@
+"""
+Content-addressed media storage.
+
+Uploads are named after the SHA-256 of their contents and sharded into two
+levels of subdirectories under their ``upload_to`` directory::
+
+    MEDIA_ROOT/product_comparisons/3f/a2/3fa2...c9.webp
+
+so no directory grows past a few thousand entries and an identical upload
+is stored only once: saving it again returns the existing name. Because a
+file can then belong to several records, ``delete`` keeps it while a file
+field of this storage with the same upload directory still refers to it.
+
+Names are validated as ``Storage.save`` does. ``get_available_name`` does
+not apply: an existing file under a hashed name holds the same contents,
+and a hash cannot be shortened, so a name longer than ``max_length`` is
+refused instead of truncated.
+
+Names under ``passthrough`` prefixes (thumbnails, whose names are derived
+from the image they belong to) are stored as given.
+"""
+import hashlib
+import os
+import re
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[\w]+)?$')
+
+
+def content_hash(content):
+    """SHA-256 of a Django ``File``, leaving it rewound"""
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def is_hashed(name):
+    """True for names given out by ``ContentAddressedStorage``"""
+    return bool(HASHED_NAME.search(name))
+
+
+def upload_directory(name):
+    """Upload directory of a hashed name (without the two shard levels)"""
+    return name.rsplit('/', 3)[0] if name.count('/') >= 3 else ''
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files by content hash (see module docstring)"""
+
+    def __init__(self, passthrough=('thumbnails/',), **kwargs):
+        super().__init__(**kwargs)
+        self.passthrough = tuple(passthrough)
+        self._fields = None
+
+    def file_fields(self):
+        """``(model, field name, upload directory)`` of the file fields stored here
+
+        The directory is None when ``upload_to`` is a callable or a date
+        pattern, so the field may hold names in any directory.
+        """
+        if self._fields is None:
+            from django.apps import apps
+            from django.db import models
+
+            fields = []
+            for model in apps.get_models():
+                for field in model._meta.concrete_fields:
+                    if not isinstance(field, models.FileField) or not isinstance(field.storage, ContentAddressedStorage):
+                        continue
+                    if field.storage.location != self.location:
+                        continue
+                    upload_to = field.upload_to
+                    directory = None if callable(upload_to) or '%' in upload_to else upload_to.strip('/')
+                    fields.append((model, field.name, directory))
+            self._fields = fields
+        return self._fields
+
+    def referenced(self, name):
+        """True while a file field that can hold ``name`` refers to it"""
+        directory = upload_directory(name)
+        return any(
+            model._default_manager.filter(**{field_name: name}).exists()
+            for model, field_name, field_directory in self.file_fields()
+            if field_directory in (None, directory)
+        )
+
+    def hashed_name(self, name, content):
+        """Sharded name of ``content`` uploaded as ``name``"""
+        digest = content_hash(content)
+        directory = os.path.dirname(name)
+        # Already hashed names (re-saves) keep their upload directory
+        if HASHED_NAME.search(name):
+            directory = os.path.dirname(os.path.dirname(directory))
+        extension = os.path.splitext(name)[1].lower()
+        return '/'.join(part for part in (directory, digest[:2], digest[2:4], digest + extension) if part)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            from django.core.files import File
+            content = File(content, name)
+        if name.startswith(self.passthrough):
+            return super().save(name, content, max_length=max_length)
+
+        validate_file_name(name, allow_relative_path=True)
+        name = self.hashed_name(name.replace('\\', '/'), content)
+        validate_file_name(name, allow_relative_path=True)
+        if max_length is not None and len(name) > max_length:
+            raise SuspiciousFileOperation(
+                f'Content-addressed name "{name}" is longer than {max_length} characters. Please make sure '
+                f'that the corresponding file field allows sufficient "max_length".'
+            )
+        if self.exists(name):
+            return name  # Same contents already stored
+        name = self._save(name, content)
+        validate_file_name(name, allow_relative_path=True)
+        return name
+
+    def delete(self, name):
+        if is_hashed(name) and self.referenced(name):
+            return  # Another record shares this file
+        super().delete(name)
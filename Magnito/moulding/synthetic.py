@@ -0,0 +1,113 @@
+"""
+Synthetic master/product image pairs for benchmarking image comparison.
+
+``make_master`` draws a moulded part (a lid with a rim, ribs, bosses and a
+hole, with a grained surface) on a fixture background. ``make_product``
+copies it with camera noise and optionally injects one of the common
+moulding defects in ``DEFECTS``.
+
+Defect sizes are fractions of the part, so a pair behaves the same at any
+resolution, and each defect is strong enough to fail the default score
+bands: a regression in detection shows up as a defective part passing.
+"""
+from .lazy import cv2, np
+
+
+DEFECTS = ['none', 'short_shot', 'flash', 'sink_mark', 'color_shift']
+
+BACKGROUND = (60, 60, 60)
+PART_COLOR = (40, 110, 200)
+RIB_COLOR = (30, 90, 170)
+# Standard deviation of the surface grain, in grey levels
+TEXTURE_STRENGTH = 16
+
+
+def parse_resolution(value):
+    """'1920x1080' -> (1920, 1080)"""
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def _part_box(width, height):
+    return int(width * 0.15), int(height * 0.15), int(width * 0.85), int(height * 0.85)
+
+
+def _texture(height, width):
+    """Moulded surface grain: the same pixel-scale pattern for every image of a size"""
+    grain = np.random.default_rng(0).standard_normal((height, width), dtype=np.float32)
+    grain = cv2.GaussianBlur(grain, (0, 0), 1)
+    return grain * (TEXTURE_STRENGTH / (grain.std() or 1))
+
+
+def _apply_texture(image, mask):
+    """Add the surface grain to the pixels of ``image`` where ``mask`` is set"""
+    height, width = image.shape[:2]
+    textured = image.astype(np.float32) + _texture(height, width)[..., None]
+    image[mask] = np.clip(textured[mask], 0, 255).astype(np.uint8)
+    return image
+
+
+def make_master(width, height):
+    """Draw a reference part at the given resolution (BGR uint8)"""
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = BACKGROUND
+    x0, y0, x1, y1 = _part_box(width, height)
+    unit = max(1, min(width, height) // 100)
+
+    cv2.rectangle(image, (x0, y0), (x1, y1), PART_COLOR, -1)
+    cv2.rectangle(image, (x0, y0), (x1, y1), RIB_COLOR, 3 * unit)
+    for i in range(1, 4):
+        x = x0 + (x1 - x0) * i // 4
+        cv2.line(image, (x, y0), (x, y1), RIB_COLOR, 2 * unit)
+    for cx in (x0 + (x1 - x0) // 8, x1 - (x1 - x0) // 8):
+        for cy in (y0 + (y1 - y0) // 6, y1 - (y1 - y0) // 6):
+            cv2.circle(image, (cx, cy), 4 * unit, RIB_COLOR, -1)
+    cv2.circle(image, ((x0 + x1) // 2, (y0 + y1) // 2), 8 * unit, BACKGROUND, -1)
+    return _apply_texture(image, np.any(image != BACKGROUND, axis=2))
+
+
+def make_product(master, defect='none', seed=0):
+    """Copy of ``master`` with camera noise and one defect"""
+    if defect not in DEFECTS:
+        raise ValueError(f"Unknown defect '{defect}'. Choose from: {', '.join(DEFECTS)}")
+
+    height, width = master.shape[:2]
+    x0, y0, x1, y1 = _part_box(width, height)
+    part_width, part_height = x1 - x0, y1 - y0
+    product = master.copy()
+
+    if defect == 'short_shot':
+        # The end of the flow path did not fill
+        end = np.array([
+            [x1 - part_width // 5, y0], [x1 + 1, y0], [x1 + 1, y1 + 1], [x1 - part_width // 8, y1 + 1]
+        ], dtype=np.int32)
+        cv2.fillPoly(product, [end], BACKGROUND)
+    elif defect == 'flash':
+        # Excess material squeezed out all along the parting line
+        thickness = max(2, min(width, height) // 25)
+        flash = np.zeros((height, width), dtype=np.uint8)
+        cv2.rectangle(flash, (x0 - thickness, y0 - thickness), (x1 + thickness, y1 + thickness), 255, -1)
+        cv2.rectangle(flash, (x0, y0), (x1, y1), 0, -1)
+        flash = flash > 0
+        product[flash] = PART_COLOR
+        product = _apply_texture(product, flash)
+    elif defect == 'sink_mark':
+        # Depression over the thick section: darker, with the grain smoothed out
+        mask = np.zeros((height, width), dtype=np.float32)
+        centre = (x0 + part_width * 5 // 8, y0 + part_height // 2)
+        axes = (max(3, part_width // 5), max(3, part_height // 3))
+        cv2.ellipse(mask, centre, axes, 0, 0, 360, 1.0, -1)
+        mask = cv2.GaussianBlur(mask, (0, 0), max(1, axes[0] // 10))[..., None]
+        smooth = cv2.GaussianBlur(product, (0, 0), 3).astype(np.float32)
+        product = (product * (1 - mask) + smooth * mask * 0.5).astype(np.uint8)
+    elif defect == 'color_shift':
+        # Wrong masterbatch ratio: the whole part shifts colour
+        part = np.all(product != BACKGROUND, axis=2)
+        shifted = product.astype(np.int16)
+        shifted[part] += np.array([-35, 25, 45], dtype=np.int16)
+        product = np.clip(shifted, 0, 255).astype(np.uint8)
+
+    noise = np.empty(product.shape, dtype=np.int16)
+    cv2.setRNGSeed(seed)
+    cv2.randn(noise, 0, 3)
+    return cv2.add(product, noise, dtype=cv2.CV_8U)
@@ -0,0 +1,405 @@
+"""
+Background processing for product comparisons.
+
+Image comparison is CPU bound, so it runs in a process pool instead of on
+the request thread. Workers are started with the ``spawn`` method and set
+up Django themselves, so each one owns its own database connection.
+
+The pool lives in memory, so jobs queued in a process that stops are lost.
+Each comparison records when it was last queued; ``requeue_stale`` (the
+``requeue_comparisons`` command) queues those that never finished again.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def init_worker(settings_module):
+    """Prepare a freshly spawned worker process to use the ORM"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def get_executor():
+    """Return the shared comparison pool, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.COMPARISON_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'injection_moulding.settings'),),
+            )
+        return _executor
+
+
+RESULT_FIELDS = [
+    'similarity_score', 'defects_found', 'defect_description',
+    'fix_instructions', 'status', 'error_message', 'timings', 'engine',
+    'region_scores', 'defect_signature', 'defect_boxes', 'in_heatmap',
+    'color_check', 'color_drift', 'frame_scores',
+]
+CACHE_FIELDS = ['product_phash', 'cache_key', 'duplicate_of']
+
+
+def memory_budget():
+    """Per-comparison SSIM memory budget in bytes (None for unlimited)"""
+    return settings.COMPARISON_MEMORY_BUDGET_MB * 1024 * 1024 or None
+
+
+def cascade_options():
+    """Keyword arguments for the coarse-to-fine cascade, or None when disabled"""
+    if not settings.COMPARISON_CASCADE:
+        return None
+    return {
+        'scales': (settings.COMPARISON_CASCADE_SCALE, 1),
+        'accept_score': settings.COMPARISON_CASCADE_ACCEPT,
+        'reject_score': settings.COMPARISON_CASCADE_REJECT,
+    }
+
+
+def color_check_options():
+    """Thresholds for the colour prefilter, or None when disabled"""
+    if not settings.COLOR_PREFILTER:
+        return None
+    return {
+        'drift_delta_e': settings.COLOR_DRIFT_DELTA_E,
+        'reject_delta_e': settings.COLOR_REJECT_DELTA_E,
+        'reject_score': settings.COLOR_REJECT_SCORE,
+    }
+
+
+def engine_options(master_sample=None):
+    """Options passed to every comparison engine"""
+    options = {
+        'cascade': cascade_options(),
+        'memory_budget': memory_budget(),
+        'color_check': color_check_options(),
+    }
+    if master_sample is not None:
+        options['regions'] = master_sample.regions or None
+        options['mask_path'] = master_sample.region_mask.path if master_sample.region_mask else None
+    return options
+
+
+def apply_result(comparison, result, shape=None):
+    """Copy a ``compare_images`` result onto a comparison (without saving).
+
+    ``shape`` is the master image shape, used to record where defects are.
+    """
+    from .utils import analyze_defects, defect_signature, describe_color_drift, pack_defects
+
+    comparison.in_heatmap = False
+    if not isinstance(result, dict) or result.get('error'):
+        comparison.status = 'failed'
+        comparison.defect_boxes = b''
+        if isinstance(result, dict):
+            comparison.error_message = result['error']
+        else:
+            comparison.error_message = result[1] if result else 'Error comparing images'
+        return
+
+    color = result.get('color') or {}
+    comparison.color_check = color
+    comparison.color_drift = bool(color.get('drift'))
+    comparison.similarity_score = result['similarity_score']
+    comparison.defects_found = result['defect_count'] > 0 or comparison.color_drift
+    comparison.timings = result.get('timings', {})
+    comparison.region_scores = result.get('regions', [])
+    comparison.defect_boxes = pack_defects(result['defects'])
+    if shape is not None:
+        comparison.defect_signature = defect_signature(result['defects'], shape)
+
+    # Generate defect description and fix instructions
+    defect_desc, fix_inst = analyze_defects(
+        result['defects'],
+        result['similarity_score']
+    )
+    if comparison.color_drift:
+        defect_desc, fix_inst = describe_color_drift(color, defect_desc, fix_inst)
+    comparison.defect_description = defect_desc
+    comparison.fix_instructions = fix_inst
+    comparison.status = 'done'
+    comparison.error_message = ''
+
+
+def run_comparison(comparison_id):
+    """Compare a stored product image with its master and save the results"""
+    from .models import ProductComparison
+    from .utils import run_engine
+    from . import feature_store, heatmap, result_cache
+
+    close_old_connections()
+    comparison = ProductComparison.objects.select_related('master_sample').get(pk=comparison_id)
+    comparison.status = 'running'
+    comparison.save(update_fields=['status'])
+    # Boxes a re-run comparison already counted in the heatmap
+    previous = {comparison.pk: bytes(comparison.defect_boxes)} if comparison.in_heatmap else None
+    shape = None
+
+    try:
+        master = feature_store.load(comparison.master_sample)
+        shape = master.shape
+        comparison.engine = comparison.master_sample.engine
+        result = run_engine(comparison.engine, master, comparison.product_image.path, **engine_options(comparison.master_sample))
+        apply_result(comparison, result, shape)
+        result_cache.remember(comparison)
+    except Exception as e:
+        comparison.status = 'failed'
+        comparison.error_message = str(e)
+        comparison.defect_boxes = b''
+        comparison.in_heatmap = False
+
+    with transaction.atomic():
+        heatmap.update(comparison.master_sample, shape, [comparison], previous)
+        comparison.save()
+    close_old_connections()
+    return comparison.status
+
+
+def run_comparison_batch(comparison_ids):
+    """Compare a batch of products sharing one master sample.
+
+    The master is loaded once, the products are compared in turn within
+    this worker and all results are written back in a single transaction.
+    """
+    from .models import ProductComparison
+    from .utils import compare_images_batch
+    from . import feature_store, heatmap, result_cache
+
+    close_old_connections()
+    comparisons = list(
+        ProductComparison.objects.select_related('master_sample')
+        .filter(pk__in=comparison_ids).order_by('pk')
+    )
+    if not comparisons:
+        return []
+    ProductComparison.objects.filter(pk__in=comparison_ids).update(status='running')
+    previous = {c.pk: bytes(c.defect_boxes) for c in comparisons if c.in_heatmap}
+    master_sample = comparisons[0].master_sample
+    shape = None
+
+    try:
+        master = feature_store.load(master_sample)
+        shape = master.shape
+        results = compare_images_batch(
+            master,
+            [comparison.product_image.path for comparison in comparisons],
+            engine=master_sample.engine,
+            **engine_options(master_sample)
+        )
+        for comparison, result in zip(comparisons, results):
+            comparison.engine = master_sample.engine
+            apply_result(comparison, result, shape)
+            result_cache.remember(comparison)
+    except Exception as e:
+        for comparison in comparisons:
+            comparison.status = 'failed'
+            comparison.error_message = str(e)
+            comparison.defect_boxes = b''
+            comparison.in_heatmap = False
+
+    with transaction.atomic():
+        heatmap.update(master_sample, shape, comparisons, previous)
+        ProductComparison.objects.bulk_update(comparisons, RESULT_FIELDS)
+    close_old_connections()
+    return [comparison.status for comparison in comparisons]
+
+
+def run_video_comparison(comparison_id):
+    """Compare the sharpest frames of a product video clip with its master.
+
+    The frames are compared in turn within this worker and the
+    worst-scoring one becomes the comparison's product image and result.
+    """
+    from django.core.files import File
+    from .models import ProductComparison
+    from .utils import compare_images_batch, perceptual_hash
+    from . import feature_store, heatmap, video
+
+    close_old_connections()
+    comparison = ProductComparison.objects.select_related('master_sample').get(pk=comparison_id)
+    comparison.status = 'running'
+    comparison.save(update_fields=['status'])
+    previous = {comparison.pk: bytes(comparison.defect_boxes)} if comparison.in_heatmap else None
+    master_sample = comparison.master_sample
+    shape = None
+
+    try:
+        master = feature_store.load(master_sample)
+        shape = master.shape
+        comparison.engine = master_sample.engine
+        frames = video.sharpest_frames(
+            comparison.product_video.path,
+            count=settings.VIDEO_FRAMES,
+            sample_fps=settings.VIDEO_SAMPLE_FPS,
+            max_seconds=settings.VIDEO_MAX_SECONDS,
+        )
+        if not frames:
+            raise ValueError("No frames could be decoded from the video")
+        with tempfile.TemporaryDirectory() as directory:
+            paths = video.write_frames(frames, directory)
+            for frame in frames:
+                del frame['image']  # Only the written files are needed now
+            results = compare_images_batch(
+                master, paths,
+                engine=master_sample.engine,
+                **engine_options(master_sample)
+            )
+            scored = [
+                (frame, path, result) for frame, path, result in zip(frames, paths, results)
+                if isinstance(result, dict) and not result.get('error')
+            ]
+            if not scored:
+                apply_result(comparison, results[0], shape)
+            else:
+                worst, path, result = min(scored, key=lambda item: item[2]['similarity_score'])
+                apply_result(comparison, result, shape)
+                with open(path, 'rb') as handle:
+                    name = f"{os.path.splitext(os.path.basename(comparison.product_video.name))[0]}_frame{worst['frame']}.jpg"
+                    comparison.product_image.save(name, File(handle), save=False)
+                comparison.product_phash = perceptual_hash(path)
+            comparison.frame_scores = [
+                dict(
+                    frame,
+                    similarity_score=result['similarity_score'] if isinstance(result, dict) and not result.get('error') else None,
+                    defect_count=result['defect_count'] if isinstance(result, dict) and not result.get('error') else None,
+                    selected=bool(scored) and frame is worst,
+                )
+                for frame, result in zip(frames, results)
+            ]
+    except Exception as e:
+        comparison.status = 'failed'
+        comparison.error_message = str(e)
+        comparison.defect_boxes = b''
+        comparison.in_heatmap = False
+
+    with transaction.atomic():
+        heatmap.update(master_sample, shape, [comparison], previous)
+        comparison.save()
+    close_old_connections()
+    return comparison.status
+
+
+def reuse_cached_results(comparison_ids):
+    """Answer comparisons from earlier identical ones; return the ids left to compare"""
+    from .models import ProductComparison
+    from . import result_cache
+
+    if not result_cache.enabled():
+        return list(comparison_ids)
+
+    comparisons = list(
+        ProductComparison.objects.select_related('master_sample')
+        .filter(pk__in=comparison_ids).order_by('pk')
+    )
+    remaining = []
+    for comparison in comparisons:
+        if not result_cache.apply_cached(comparison, engine_options(comparison.master_sample)):
+            remaining.append(comparison.pk)
+    with transaction.atomic():
+        ProductComparison.objects.bulk_update(comparisons, RESULT_FIELDS + CACHE_FIELDS)
+    return remaining
+
+
+def mark_queued(comparison_ids):
+    """Record that comparisons are (again) waiting for the worker pool"""
+    from .models import ProductComparison
+
+    ProductComparison.objects.filter(pk__in=comparison_ids).update(
+        status='pending', queued_at=timezone.now(), attempts=F('attempts') + 1
+    )
+
+
+def enqueue_comparison(comparison_id):
+    """Queue a comparison for the worker pool.
+
+    Repeated photos are answered from the result cache straight away. With
+    ``COMPARISON_WORKERS = 0`` the comparison runs inline, which is handy
+    for development and for environments without multiprocessing.
+    """
+    if not reuse_cached_results([comparison_id]):
+        return 'done'
+    mark_queued([comparison_id])
+    if settings.COMPARISON_WORKERS <= 0:
+        return run_comparison(comparison_id)
+    return get_executor().submit(run_comparison, comparison_id)
+
+
+def enqueue_comparison_batch(comparison_ids):
+    """Queue a batch of comparisons against the same master sample"""
+    comparison_ids = reuse_cached_results(comparison_ids)
+    if not comparison_ids:
+        return []
+    mark_queued(comparison_ids)
+    if settings.COMPARISON_WORKERS <= 0:
+        return run_comparison_batch(comparison_ids)
+    return get_executor().submit(run_comparison_batch, list(comparison_ids))
+
+
+def enqueue_video_comparison(comparison_id):
+    """Queue a video clip comparison for the worker pool"""
+    mark_queued([comparison_id])
+    if settings.COMPARISON_WORKERS <= 0:
+        return run_video_comparison(comparison_id)
+    return get_executor().submit(run_video_comparison, comparison_id)
+
+
+def stale_comparisons(now=None):
+    """Comparisons queued or running for longer than ``COMPARISON_STALE_MINUTES``"""
+    from .models import ProductComparison
+
+    cutoff = (now or timezone.now()) - timedelta(minutes=settings.COMPARISON_STALE_MINUTES)
+    return (
+        ProductComparison.objects.filter(status__in=['pending', 'running'])
+        .alias(queued=Coalesce('queued_at', 'created_at')).filter(queued__lt=cutoff)
+    )
+
+
+def requeue_stale(now=None):
+    """Queue stale comparisons again; those out of attempts are marked failed.
+
+    Returns ``(jobs, failed ids)`` with one job per comparison or batch
+    queued: a future, or the result when comparisons run inline.
+    """
+    from .models import ProductComparison
+
+    stale = list(
+        stale_comparisons(now).order_by('pk')
+        .values_list('pk', 'attempts', 'batch_id', 'master_sample_id', 'product_video')
+    )
+    failed = [pk for pk, attempts, *_ in stale if attempts >= settings.COMPARISON_MAX_ATTEMPTS]
+    ProductComparison.objects.filter(pk__in=failed).update(
+        status='failed', error_message=f"Comparison did not finish after {settings.COMPARISON_MAX_ATTEMPTS} attempts"
+    )
+
+    jobs = []
+    batches = defaultdict(list)
+    for pk, attempts, batch_id, master_sample_id, product_video in stale:
+        # Claim the comparison, so a sweep running elsewhere does not queue it too
+        if pk in failed or not stale_comparisons(now).filter(pk=pk).update(queued_at=timezone.now()):
+            continue
+        if product_video:
+            jobs.append(enqueue_video_comparison(pk))
+        elif batch_id:
+            batches[batch_id, master_sample_id].append(pk)
+        else:
+            jobs.append(enqueue_comparison(pk))
+    jobs.extend(enqueue_comparison_batch(comparison_ids) for comparison_ids in batches.values())
+    return jobs, failed
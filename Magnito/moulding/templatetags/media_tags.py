@@ -0,0 +1,13 @@
+from django import template
+
+from ..image_ingest import THUMBNAIL_SIZES, thumbnail_url
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail(image, size='medium'):
+    """URL of an image field's thumbnail, e.g. ``{{ sample.image|thumbnail:'small' }}``"""
+    if size not in THUMBNAIL_SIZES:
+        raise template.TemplateSyntaxError(f"Unknown thumbnail size: {size}")
+    return thumbnail_url(image, size)
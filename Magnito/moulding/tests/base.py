@@ -0,0 +1,37 @@
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from moulding.lazy import cv2
+from moulding.models import MasterSample, Mould
+from moulding.synthetic import make_master
+
+
+def encode(image, extension='.png'):
+    """An image as an uploadable file"""
+    return ContentFile(cv2.imencode(extension, image)[1].tobytes())
+
+
+class MediaTestCase(TestCase):
+    """Runs comparisons inline with media, features and archives in a temporary folder"""
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings = override_settings(
+            MEDIA_ROOT=f'{root}/media', FEATURE_STORE_ROOT=f'{root}/features', ARCHIVE_ROOT=f'{root}/archive',
+            COMPARISON_WORKERS=0,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('operator')
+        self.mould = Mould.objects.create(mould_number='M1', name='Cap', cavity_count=1, material_type='PP', cycle_time=10)
+
+    def make_master_sample(self, image=None, number='S1'):
+        sample = MasterSample(mould=self.mould, sample_number=number, specifications='-', created_by=self.user)
+        sample.image.save(f'{number}.png', encode(make_master(320, 240) if image is None else image), save=False)
+        sample.save()
+        return sample
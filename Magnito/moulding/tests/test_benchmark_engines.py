@@ -0,0 +1,30 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from moulding.lazy import cv2
+from moulding.synthetic import make_master, make_product
+
+
+class BenchmarkEnginesCommandTests(SimpleTestCase):
+    def test_runs_engines_in_worker_process(self):
+        with tempfile.TemporaryDirectory() as folder:
+            pair = os.path.join(folder, 'flash')
+            os.mkdir(pair)
+            master = make_master(320, 240)
+            cv2.imwrite(os.path.join(pair, 'master.png'), master)
+            cv2.imwrite(os.path.join(pair, 'product.png'), make_product(master, 'flash'))
+            output = os.path.join(folder, 'report.json')
+
+            call_command('benchmark_engines', folder, engine=['histogram'], repeat=1, json_path=output, stdout=io.StringIO())
+
+            with open(output) as f:
+                report = json.load(f)
+        self.assertEqual(report['pairs'], 1)
+        self.assertEqual([row['engine'] for row in report['engines']], ['histogram'])
+        self.assertEqual(report['engines'][0]['runs'], 1)
+        self.assertEqual(report['engines'][0]['errors'], 0)
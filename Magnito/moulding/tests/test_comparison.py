@@ -0,0 +1,60 @@
+import tempfile
+
+from django.test import SimpleTestCase, TestCase
+
+from moulding.defect_rules import get_rules
+from moulding.lazy import cv2
+from moulding.synthetic import DEFECTS, make_master, make_product
+from moulding.tasks import engine_options
+from moulding.utils import SSIM_BYTES_PER_PIXEL, DecodedMaster, compare_gray, compare_gray_tiled, run_engine
+
+
+def _boxes(result):
+    return sorted(tuple(defect.values()) for defect in result['defects'])
+
+
+class TiledComparisonTests(SimpleTestCase):
+    def test_tiled_defects_match_full_frame(self):
+        master = make_master(1600, 1200)
+        master_gray = cv2.cvtColor(master, cv2.COLOR_BGR2GRAY)
+        # 150 pixel tiles, so the part outline and most defects cross tile seams
+        budget = SSIM_BYTES_PER_PIXEL * 166 ** 2
+        for defect in DEFECTS:
+            with self.subTest(defect=defect):
+                product = cv2.cvtColor(make_product(master, defect), cv2.COLOR_BGR2GRAY)
+                full = compare_gray(master_gray, product)
+                tiled = compare_gray_tiled(master_gray, product, budget)
+                self.assertEqual(tiled['similarity_score'], full['similarity_score'])
+                self.assertEqual(_boxes(tiled), _boxes(full))
+                if defect in ('short_shot', 'flash', 'sink_mark'):
+                    self.assertTrue(any(box[2] > 150 or box[3] > 150 for box in _boxes(full)))
+
+
+class SyntheticDefectTests(TestCase):
+    """The generated pairs must tell good parts from defective ones at any size"""
+
+    def compare(self, master, product):
+        with tempfile.TemporaryDirectory() as folder:
+            master_path, product_path = f'{folder}/master.png', f'{folder}/product.jpg'
+            cv2.imwrite(master_path, master)
+            cv2.imwrite(product_path, product)
+            return run_engine('ssim', DecodedMaster(master_path), product_path, **engine_options())
+
+    def test_defects_fail_and_good_parts_pass(self):
+        rules = get_rules()
+        for width, height in [(640, 480), (1600, 1200)]:
+            master = make_master(width, height)
+            for defect in DEFECTS:
+                with self.subTest(resolution=f'{width}x{height}', defect=defect):
+                    result = self.compare(master, make_product(master, defect))
+                    passes = rules.band(result['similarity_score'])[0]
+                    if defect == 'none':
+                        self.assertTrue(passes, result['similarity_score'])
+                        # Boxes around camera noise are not reported on a passing part
+                        self.assertEqual(rules.evaluate(result['defects'], result['similarity_score'])[1], "")
+                    else:
+                        self.assertFalse(passes, result['similarity_score'])
+                    if defect in ('short_shot', 'flash', 'sink_mark'):
+                        self.assertGreater(result['defect_count'], 0)
+                    if defect == 'color_shift':
+                        self.assertTrue(result['color']['rejected'])
@@ -0,0 +1,21 @@
+from django.test import TestCase
+
+from moulding.defect_rules import get_rules, invalidate
+from moulding.models import DefectSizeClass, DefectType
+
+
+class SeededRulesTests(TestCase):
+    def test_every_hard_coded_defect_type_is_seeded(self):
+        for name in ('Short Shot', 'Flash', 'Sink Marks', 'Warpage', 'Flow Marks'):
+            with self.subTest(name=name):
+                defect_type = DefectType.objects.get(name__iexact=name)
+                self.assertTrue(defect_type.fix_instructions)
+
+    def test_large_defects_list_the_linked_types(self):
+        invalidate()
+        description, fix_instructions = get_rules().evaluate([{'area': 5000}], 80)
+
+        self.assertIn("1 defect area(s) identified", description)
+        large = DefectSizeClass.objects.get(name='Large')
+        for defect_type in large.defect_types.all():
+            self.assertIn(f"   - {defect_type.name}", fix_instructions)
@@ -0,0 +1,36 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from moulding.forms import ProductComparisonForm
+from moulding.lazy import cv2, np
+from moulding.synthetic import make_master, make_product
+
+from .base import MediaTestCase
+
+
+def _upload(image):
+    return SimpleUploadedFile('product.jpg', cv2.imencode('.jpg', image)[1].tobytes(), content_type='image/jpeg')
+
+
+class IdentifyMasterTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.master = make_master(640, 480)
+        self.sample = self.make_master_sample(self.master)
+
+    def form(self, image):
+        return ProductComparisonForm({'machine_number': '7'}, {'product_image': _upload(image)})
+
+    def test_photo_of_the_master_is_assigned(self):
+        form = self.form(make_product(self.master, 'flash'))
+
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['master_sample'], self.sample)
+
+    def test_off_catalogue_photo_is_not_assigned_to_the_only_master(self):
+        photo = np.full((480, 640, 3), 230, dtype=np.uint8)
+        cv2.circle(photo, (320, 240), 150, (30, 160, 40), -1)
+        form = self.form(photo)
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('master_sample', form.errors)
+        self.assertIsNone(form.identification)
@@ -0,0 +1,94 @@
+import os
+import zipfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from moulding import retention
+from moulding.models import ProductComparison
+from moulding.synthetic import make_master
+
+from .base import MediaTestCase, encode
+
+
+class RetentionTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sample = self.make_master_sample()
+
+    def comparison(self, **fields):
+        fields.setdefault('status', 'done')
+        comparison = ProductComparison(master_sample=self.sample, operator=self.user, machine_number='7', **fields)
+        comparison.product_image.save('product.png', encode(make_master(320, 240)), save=False)
+        comparison.save()
+        ProductComparison.objects.filter(pk=comparison.pk).update(created_at=timezone.now() - timedelta(days=400))
+        return comparison
+
+    def test_passing_comparisons_with_difference_areas_are_archived(self):
+        comparisons = [
+            self.comparison(similarity_score=98.5, defects_found=True, approved=True),
+            self.comparison(similarity_score=98.5, defects_found=True, approved=False),
+        ]
+
+        report = retention.apply()
+
+        self.assertEqual(report.counts['archived'], 2)
+        for comparison in comparisons:
+            comparison.refresh_from_db()
+            self.assertEqual(comparison.retention_tier, 'archived')
+            self.assertFalse(comparison.product_image)
+
+    def test_rejected_comparisons_are_kept(self):
+        kept = [
+            self.comparison(similarity_score=80, defects_found=True),
+            self.comparison(similarity_score=98.5, color_drift=True),
+            self.comparison(status='failed'),
+        ]
+
+        retention.apply()
+
+        for comparison in kept:
+            comparison.refresh_from_db()
+            self.assertEqual(comparison.retention_tier, 'full')
+
+    def test_approved_low_score_is_archived(self):
+        comparison = self.comparison(similarity_score=80, defects_found=True, approved=True)
+
+        retention.apply()
+
+        comparison.refresh_from_db()
+        self.assertEqual(comparison.retention_tier, 'archived')
+
+    def test_files_kept_for_another_comparison_are_not_reclaimed(self):
+        archived = self.comparison(similarity_score=98.5)
+        kept = self.comparison(similarity_score=80)
+        self.assertEqual(archived.product_image.name, kept.product_image.name)
+
+        report = retention.apply()
+
+        self.assertEqual(report.counts['archived'], 1)
+        self.assertEqual(report.reclaimed['archived'], 0)
+        self.assertTrue(kept.product_image.storage.exists(kept.product_image.name))
+
+    def test_shared_file_is_reclaimed_once_when_removed(self):
+        comparisons = [self.comparison(similarity_score=98.5) for _ in range(2)]
+        size = comparisons[0].product_image.size
+
+        report = retention.apply()
+
+        self.assertEqual(report.reclaimed['archived'], size)
+        self.assertFalse(comparisons[0].product_image.storage.exists(comparisons[0].product_image.name))
+
+    def test_archive_stores_images_uncompressed(self):
+        comparison = self.comparison(similarity_score=98.5)
+
+        retention.apply()
+
+        comparison.refresh_from_db()
+        with zipfile.ZipFile(os.path.join(settings.ARCHIVE_ROOT, comparison.archive_path)) as archive_file:
+            members = archive_file.infolist()
+        self.assertEqual([member.compress_type for member in members], [zipfile.ZIP_STORED])
+        retention.restore(comparison)
+        comparison.refresh_from_db()
+        self.assertTrue(comparison.product_image.storage.exists(comparison.product_image.name))
@@ -0,0 +1,39 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from moulding.models import ProductComparison
+from moulding.storage import is_hashed
+
+from .base import MediaTestCase
+
+
+class ContentAddressedStorageTests(MediaTestCase):
+    def test_identical_uploads_are_stored_once(self):
+        first = default_storage.save('product_comparisons/a.png', ContentFile(b'part'))
+        second = default_storage.save('product_comparisons/b.png', ContentFile(b'part'))
+
+        self.assertTrue(is_hashed(first))
+        self.assertEqual(first, second)
+
+    def test_unsafe_names_are_refused(self):
+        with self.assertRaises(SuspiciousFileOperation):
+            default_storage.save('../product_comparisons/a.png', ContentFile(b'part'))
+
+    def test_names_longer_than_max_length_are_refused(self):
+        with self.assertRaises(SuspiciousFileOperation):
+            default_storage.save('product_comparisons/a.png', ContentFile(b'part'), max_length=50)
+
+    def test_shared_file_is_kept_with_one_lookup(self):
+        sample = self.make_master_sample()
+        name = default_storage.save('product_comparisons/a.png', ContentFile(b'part'))
+        ProductComparison.objects.create(master_sample=sample, operator=self.user, machine_number='7', product_image=name)
+
+        # Only product_image uses the product_comparisons/ directory
+        with self.assertNumQueries(1):
+            default_storage.delete(name)
+        self.assertTrue(default_storage.exists(name))
+
+        ProductComparison.objects.all().delete()
+        default_storage.delete(name)
+        self.assertFalse(default_storage.exists(name))
@@ -0,0 +1,113 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+
+from moulding import tasks
+from moulding.defect_search import DefectIndex
+from moulding.models import ProductComparison
+from moulding.synthetic import make_master, make_product
+
+from .base import MediaTestCase, encode
+
+
+class RequeueStaleTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.master = make_master(320, 240)
+        self.sample = self.make_master_sample(self.master)
+
+    def comparison(self, queued_minutes_ago, **fields):
+        comparison = ProductComparison(master_sample=self.sample, operator=self.user, machine_number='7', **fields)
+        comparison.product_image.save('product.png', encode(make_product(self.master, 'flash')), save=False)
+        comparison.save()
+        ProductComparison.objects.filter(pk=comparison.pk).update(
+            queued_at=timezone.now() - timedelta(minutes=queued_minutes_ago)
+        )
+        return comparison
+
+    def test_stale_comparisons_are_compared_again(self):
+        lost = self.comparison(60, status='running', attempts=1)
+        waiting = self.comparison(1, status='pending', attempts=1)
+
+        jobs, failed = tasks.requeue_stale()
+
+        lost.refresh_from_db()
+        waiting.refresh_from_db()
+        self.assertEqual((len(jobs), failed), (1, []))
+        self.assertEqual(lost.status, 'done')
+        self.assertEqual(lost.attempts, 2)
+        self.assertEqual(waiting.status, 'pending')
+
+    @override_settings(COMPARISON_MAX_ATTEMPTS=2)
+    def test_comparisons_out_of_attempts_are_failed(self):
+        lost = self.comparison(60, status='pending', attempts=2)
+
+        jobs, failed = tasks.requeue_stale()
+
+        lost.refresh_from_db()
+        self.assertEqual((jobs, failed), ([], [lost.pk]))
+        self.assertEqual(lost.status, 'failed')
+
+
+class BatchComparisonTests(MediaTestCase):
+    @override_settings(COMPARISON_WORKERS=2)
+    def test_batch_is_compared_in_the_worker(self):
+        master = make_master(320, 240)
+        sample = self.make_master_sample(master)
+        comparisons = []
+        for defect in ['none', 'flash', 'none']:
+            comparison = ProductComparison(master_sample=sample, operator=self.user, machine_number='7', batch_id='tray')
+            comparison.product_image.save(f'{defect}.png', encode(make_product(master, defect)), save=False)
+            comparison.save()
+            comparisons.append(comparison)
+
+        with mock.patch('multiprocessing.get_context', side_effect=AssertionError('nested pool')):
+            statuses = tasks.run_comparison_batch([comparison.pk for comparison in comparisons])
+
+        self.assertEqual(statuses, ['done'] * 3)
+
+
+class DefectIndexRefreshTests(MediaTestCase):
+    def test_watermark_moves_past_unfinished_comparisons(self):
+        sample = self.make_master_sample()
+
+        def comparison(status):
+            return ProductComparison.objects.create(
+                master_sample=sample, operator=self.user, machine_number='7', status=status,
+                defects_found=True, product_phash='ff00ff00ff00ff00', defect_signature='0000000000000001',
+            )
+
+        stuck = comparison('running')
+        done = comparison('done')
+        index = DefectIndex()
+        index.refresh()
+
+        self.assertEqual(list(index.ids), [done.pk])
+        self.assertEqual(index._watermark, done.pk)
+
+        ProductComparison.objects.filter(pk=stuck.pk).update(status='done')
+        index.refresh()
+        self.assertEqual(sorted(index.ids), [stuck.pk, done.pk])
+
+    def test_rerun_comparisons_replace_their_codes(self):
+        sample = self.make_master_sample()
+        kept, changed = [
+            ProductComparison.objects.create(
+                master_sample=sample, operator=self.user, machine_number='7', status='done',
+                defects_found=True, product_phash='ff00ff00ff00ff00', defect_signature='0000000000000001',
+            )
+            for _ in range(2)
+        ]
+        index = DefectIndex()
+        index.refresh()
+
+        tasks.mark_queued([kept.pk, changed.pk])
+        index.refresh()
+        self.assertEqual(len(index), 0)
+
+        ProductComparison.objects.filter(pk=kept.pk).update(status='done', defect_signature='8000000000000000')
+        ProductComparison.objects.filter(pk=changed.pk).update(status='done', defects_found=False)
+        index.refresh()
+        self.assertEqual(index.search('ff00ff00ff00ff00', '8000000000000000'), [(kept.pk, 0)])
@@ -0,0 +1,57 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from moulding.forms import MAX_BATCH_IMAGES
+from moulding.image_ingest import thumbnail_name
+from moulding.lazy import cv2
+from moulding.models import ProductComparison
+from moulding.synthetic import make_master, make_product
+
+from .base import MediaTestCase
+
+
+def _upload(image, name='product.png'):
+    return SimpleUploadedFile(name, cv2.imencode('.png', image)[1].tobytes(), content_type='image/png')
+
+
+class BatchUploadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.master = make_master(320, 240)
+        self.sample = self.make_master_sample(self.master)
+
+    def post(self, images):
+        return self.client.post(reverse('product_comparison_batch_create'), {
+            'master_sample': self.sample.pk,
+            'machine_number': '7',
+            'product_images': images,
+        })
+
+    def test_batch_without_photos_is_rejected(self):
+        response = self.post([])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors['product_images'])
+        self.assertFalse(ProductComparison.objects.exists())
+
+    def test_batch_with_too_many_photos_is_rejected(self):
+        photo = cv2.imencode('.png', make_product(self.master, 'none'))[1].tobytes()
+        images = [SimpleUploadedFile(f'{n}.png', photo, content_type='image/png') for n in range(MAX_BATCH_IMAGES + 1)]
+
+        response = self.post(images)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors['product_images'])
+        self.assertFalse(ProductComparison.objects.exists())
+
+    def test_batch_photos_are_saved_through_the_model(self):
+        response = self.post([_upload(make_product(self.master, defect), f'{defect}.png') for defect in ('none', 'flash')])
+
+        comparisons = ProductComparison.objects.all()
+        batch_id = comparisons[0].batch_id
+        self.assertRedirects(response, reverse('comparison_batch_detail', args=[batch_id]), fetch_redirect_response=False)
+        self.assertEqual(len(comparisons), 2)
+        for comparison in comparisons:
+            self.assertEqual(comparison.batch_id, batch_id)
+            self.assertTrue(comparison.product_phash)
+            self.assertTrue(comparison.product_image.storage.exists(thumbnail_name(comparison.product_image.name, 'small')))
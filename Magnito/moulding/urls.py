@@ -7,6 +7,7 @@ urlpatterns = [
     path('', views_auth.login_home, name='login_home'),
     # Dashboard moved to /dashboard/ (authenticated users can visit after login)
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('live/<str:screen>/', views.live_stream, name='live_stream'),
     
     # Mould Changes
     path('mould-changes/', views.mould_change_list, name='mould_change_list'),
@@ -25,11 +26,18 @@ urlpatterns = [
     # Master Samples
     path('master-samples/', views.master_sample_list, name='master_sample_list'),
     path('master-samples/create/', views.master_sample_create, name='master_sample_create'),
+    path('master-samples/<int:pk>/heatmap.png', views.master_sample_heatmap, name='master_sample_heatmap'),
     
     # Product Comparison
     path('comparisons/', views.comparison_list, name='comparison_list'),
     path('comparisons/create/', views.product_comparison_create, name='product_comparison_create'),
     path('comparisons/<int:pk>/', views.comparison_detail, name='comparison_detail'),
+    path('comparisons/<int:pk>/status/', views.comparison_status, name='comparison_status'),
+    path('comparisons/<int:pk>/similar/', views.comparison_similar, name='comparison_similar'),
+    path('comparisons/batch/create/', views.product_comparison_batch_create, name='product_comparison_batch_create'),
+    path('comparisons/video/create/', views.product_comparison_video_create, name='product_comparison_video_create'),
+    path('comparisons/batch/<str:batch_id>/', views.comparison_batch_detail, name='comparison_batch_detail'),
+    path('comparisons/batch/<str:batch_id>/status/', views.comparison_batch_status, name='comparison_batch_status'),
     
     # Defect Types
     path('defect-types/', views.defect_types_list, name='defect_types_list'),
@@ -1,14 +1,33 @@
-try:
-    import cv2
-    import numpy as np
-    from PIL import Image
-    from skimage.metrics import structural_similarity as ssim
-    CV2_AVAILABLE = True
-except ImportError:
-    CV2_AVAILABLE = False
-    print("Warning: OpenCV not available. Image comparison features will be limited.")
-
+import functools
 import io
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .defect_rules import get_rules
+from .lazy import available, cv2, np, structural_similarity as ssim
+
+logger = logging.getLogger(__name__)
+
+# The libraries themselves are only imported by the first comparison
+CV2_AVAILABLE = available('cv2', 'numpy', 'PIL', 'skimage')
+
+
+@functools.lru_cache(maxsize=None)
+def _warn_opencv_missing():
+    logger.warning("OpenCV not available. Image comparison features will be limited.")
+
+
+def _opencv_missing():
+    _warn_opencv_missing()
+    return {
+        'similarity_score': 0,
+        'defects': [],
+        'defect_count': 0,
+        'error': 'OpenCV not installed. Please install: pip install opencv-python numpy scikit-image'
+    }
 
 
 def compare_images(master_image_path, product_image_path):
@@ -16,12 +35,7 @@ def compare_images(master_image_path, product_image_path):
     Compare two images and return similarity score and defect information
     """
     if not CV2_AVAILABLE:
-        return {
-            'similarity_score': 0,
-            'defects': [],
-            'defect_count': 0,
-            'error': 'OpenCV not installed. Please install: pip install opencv-python numpy scikit-image'
-        }
+        return _opencv_missing()
     
     # Load images
     master = cv2.imread(master_image_path)
@@ -30,22 +44,76 @@ def compare_images(master_image_path, product_image_path):
     if master is None or product is None:
         return None, "Error loading images"
     
+    master_gray = cv2.cvtColor(master, cv2.COLOR_BGR2GRAY)
+    return compare_gray(master_gray, product)
+
+
+def compare_to_master(master_gray, product_image_path, memory_budget=None):
+    """
+    Compare a product image with a preprocessed grayscale master
+    (see ``feature_store``), so only the product image is decoded.
+
+    When a full-resolution SSIM would need more than ``memory_budget`` bytes
+    the comparison is done tile by tile (see ``compare_gray_tiled``).
+    """
+    if not CV2_AVAILABLE:
+        return _opencv_missing()
+    
+    tiled = needs_tiling(master_gray, memory_budget)
+    product = cv2.imread(product_image_path, cv2.IMREAD_GRAYSCALE if tiled else cv2.IMREAD_COLOR)
+    if product is None:
+        return None, "Error loading images"
+    
+    if tiled:
+        return compare_gray_tiled(master_gray, product, memory_budget)
+    return compare_gray(master_gray, product)
+
+
+def _lap(timings, stage, started):
+    """Add the time since ``started`` to ``timings[stage]`` and restart the clock"""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0) + now - started
+    return now
+
+
+def compare_gray(master_gray, product, min_area=100, timings=None, mask=None):
+    """
+    Compare a BGR (or grayscale) product image against a grayscale master array
+
+    Pass a dict as ``timings`` to collect seconds spent per stage. With a
+    ``mask`` (nonzero where the part should be inspected) only masked pixels
+    count towards the score and the defect threshold.
+    """
+    started = time.perf_counter()
+    
     # Resize product image to match master
-    product = cv2.resize(product, (master.shape[1], master.shape[0]))
+    product = cv2.resize(product, (master_gray.shape[1], master_gray.shape[0]))
+    started = _lap(timings, 'resize', started)
     
     # Convert to grayscale
-    master_gray = cv2.cvtColor(master, cv2.COLOR_BGR2GRAY)
-    product_gray = cv2.cvtColor(product, cv2.COLOR_BGR2GRAY)
+    product_gray = product if product.ndim == 2 else cv2.cvtColor(product, cv2.COLOR_BGR2GRAY)
+    started = _lap(timings, 'grayscale', started)
     
     # Calculate SSIM
-    similarity_score, diff = ssim(master_gray, product_gray, full=True)
+    similarity_score, diff = ssim(np.asarray(master_gray), product_gray, full=True)
+    if mask is not None:
+        similarity_score = diff[mask > 0].mean() if mask.any() else 1.0
     similarity_percentage = similarity_score * 100
+    started = _lap(timings, 'ssim', started)
     
     # Convert difference to uint8
     diff = (diff * 255).astype("uint8")
     
     # Threshold the difference image
-    thresh = cv2.threshold(diff, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    if mask is None:
+        thresh = cv2.threshold(diff, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    else:
+        # Otsu level from the inspected pixels only
+        level = cv2.threshold(diff[mask > 0], 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[0] if mask.any() else 0
+        thresh = cv2.threshold(diff, level, 255, cv2.THRESH_BINARY_INV)[1]
+        thresh[mask == 0] = 0
+    started = _lap(timings, 'threshold', started)
     
     # Find contours
     contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -53,7 +121,7 @@ def compare_images(master_image_path, product_image_path):
     defects = []
     for contour in contours:
         area = cv2.contourArea(contour)
-        if area > 100:  # Filter small differences
+        if area > min_area:  # Filter small differences
             x, y, w, h = cv2.boundingRect(contour)
             defects.append({
                 'x': int(x),
@@ -62,6 +130,7 @@ def compare_images(master_image_path, product_image_path):
                 'height': int(h),
                 'area': int(area)
             })
+    _lap(timings, 'contours', started)
     
     return {
         'similarity_score': round(similarity_percentage, 2),
@@ -70,108 +139,721 @@ def compare_images(master_image_path, product_image_path):
     }
 
 
-def analyze_defects(defects, similarity_score):
+# Rough float64 working set of ``ssim(full=True)`` per pixel
+SSIM_BYTES_PER_PIXEL = 200
+# Tile overlap; must cover the 7x7 SSIM window radius
+TILE_OVERLAP = 8
+
+
+def needs_tiling(master_gray, memory_budget):
+    """Whether a full-resolution SSIM of this master would exceed the budget"""
+    return bool(memory_budget) and master_gray.size * SSIM_BYTES_PER_PIXEL > memory_budget
+
+
+def _otsu_threshold(hist):
+    """Otsu threshold from a 256-bin histogram, matching cv2.THRESH_OTSU"""
+    total = float(hist.sum())
+    mu = float((np.arange(256) * hist).sum()) / total
+    q1 = mu1 = max_sigma = 0.0
+    max_val = 0
+    eps = float(np.finfo(np.float32).eps)
+    for i in range(256):
+        p_i = hist[i] / total
+        mu1 *= q1
+        q1 += p_i
+        q2 = 1.0 - q1
+        if min(q1, q2) < eps or max(q1, q2) > 1.0 - eps:
+            continue
+        mu1 = (mu1 + i * p_i) / q1
+        mu2 = (mu - q1 * mu1) / q2
+        sigma = q1 * q2 * (mu1 - mu2) ** 2
+        if sigma > max_sigma:
+            max_sigma = sigma
+            max_val = i
+    return max_val
+
+
+def _product_tile(product_gray, shape, y0, y1, x0, x1):
+    """Region of the product resized to ``shape``, without resizing all of it"""
+    if product_gray.shape == shape:
+        return product_gray[y0:y1, x0:x1]
+    sy = product_gray.shape[0] / shape[0]
+    sx = product_gray.shape[1] / shape[1]
+    # Same pixel-centre mapping as cv2.resize with INTER_LINEAR
+    matrix = np.float32([
+        [sx, 0, (x0 + 0.5) * sx - 0.5],
+        [0, sy, (y0 + 0.5) * sy - 0.5],
+    ])
+    return cv2.warpAffine(
+        product_gray, matrix, (x1 - x0, y1 - y0),
+        flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+        borderMode=cv2.BORDER_REPLICATE
+    )
+
+
+def compare_gray_tiled(master_gray, product_gray, memory_budget, min_area=100):
     """
-    Analyze defects and provide fix instructions
+    Bounded-memory version of ``compare_gray`` for very large images.
+
+    SSIM is computed over overlapping tiles sized so the float64 working set
+    stays within ``memory_budget`` bytes. The overlap covers the SSIM window,
+    so the score matches a full-image SSIM. The uint8 difference map is
+    written to a temporary file when it would not fit in the budget. A global
+    Otsu threshold is taken from the merged histogram and contours are found
+    on the whole thresholded map (one byte per pixel), so the defects are
+    the same as those of ``compare_gray``.
     """
-    if similarity_score >= 95:
-        return "Product matches master sample. No defects detected.", ""
-    
-    defect_description = []
-    fix_instructions = []
-    
-    if similarity_score < 70:
-        defect_description.append("Major differences detected from master sample")
-        fix_instructions.append("1. Check if correct mould is being used")
-        fix_instructions.append("2. Verify material type and color match specifications")
-        fix_instructions.append("3. Review machine settings (temperature, pressure, cycle time)")
-    elif similarity_score < 85:
-        defect_description.append("Moderate differences detected")
-        fix_instructions.append("1. Check injection pressure and holding pressure")
-        fix_instructions.append("2. Verify cooling time is adequate")
-        fix_instructions.append("3. Inspect mould for wear or damage")
+    height, width = master_gray.shape
+    side = int((memory_budget / SSIM_BYTES_PER_PIXEL) ** 0.5) - 2 * TILE_OVERLAP
+    side = max(side, 64)
+    pad = 3  # skimage excludes the window radius at the image border from the mean
+
+    spill = None
+    if height * width > memory_budget // 4:
+        spill = tempfile.TemporaryFile()
+        diff = np.memmap(spill, dtype=np.uint8, mode='w+', shape=(height, width))
     else:
-        defect_description.append("Minor differences detected")
-        fix_instructions.append("1. Fine-tune injection speed")
-        fix_instructions.append("2. Check material temperature")
-        fix_instructions.append("3. Verify mould temperature is consistent")
+        diff = np.empty((height, width), dtype=np.uint8)
+
+    try:
+        hist = np.zeros(256, dtype=np.int64)
+        ssim_sum = 0.0
+        ssim_count = 0
+        for y0 in range(0, height, side):
+            y1 = min(y0 + side, height)
+            for x0 in range(0, width, side):
+                x1 = min(x0 + side, width)
+                py0, py1 = max(0, y0 - TILE_OVERLAP), min(height, y1 + TILE_OVERLAP)
+                px0, px1 = max(0, x0 - TILE_OVERLAP), min(width, x1 + TILE_OVERLAP)
+
+                master_tile = np.asarray(master_gray[py0:py1, px0:px1])
+                product_tile = _product_tile(product_gray, (height, width), py0, py1, px0, px1)
+                _, tile_map = ssim(master_tile, product_tile, full=True)
+                core = tile_map[y0 - py0:y1 - py0, x0 - px0:x1 - px0]
+
+                my0, my1 = max(y0, pad), min(y1, height - pad)
+                mx0, mx1 = max(x0, pad), min(x1, width - pad)
+                if my1 > my0 and mx1 > mx0:
+                    ssim_sum += float(core[my0 - y0:my1 - y0, mx0 - x0:mx1 - x0].sum(dtype=np.float64))
+                    ssim_count += (my1 - my0) * (mx1 - mx0)
+
+                tile_diff = (core * 255).astype("uint8")
+                diff[y0:y1, x0:x1] = tile_diff
+                hist += np.bincount(tile_diff.ravel(), minlength=256)
+                del tile_map, core
+
+        threshold = _otsu_threshold(hist)
+
+        # Threshold the map in place and find contours once over all of it,
+        # so defects crossing tile edges are outlined as in ``compare_gray``
+        for y0 in range(0, height, side):
+            rows = diff[y0:y0 + side]
+            rows[:] = np.where(rows > threshold, np.uint8(0), np.uint8(255))
+        contours, _ = cv2.findContours(np.asarray(diff), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    finally:
+        del diff
+        if spill is not None:
+            spill.close()
+
+    defects = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area > min_area:
+            x, y, w, h = cv2.boundingRect(contour)
+            defects.append({
+                'x': int(x),
+                'y': int(y),
+                'width': int(w),
+                'height': int(h),
+                'area': int(area)
+            })
+    similarity_percentage = (ssim_sum / ssim_count if ssim_count else 1.0) * 100
+
+    return {
+        'similarity_score': round(similarity_percentage, 2),
+        'defects': defects,
+        'defect_count': len(defects)
+    }
+
+
+def compare_to_master_cascade(master_levels, product_image_path, accept_score=95, reject_score=70, memory_budget=None):
+    """
+    Coarse-to-fine comparison against a master pyramid.
+
+    ``master_levels`` maps a downscale factor to the grayscale master at that
+    scale (``{4: ..., 2: ..., 1: ...}``). Levels are scored coarsest first and
+    the cascade stops as soon as a score is decisive (at or above
+    ``accept_score`` or below ``reject_score``); borderline products go on to
+    full resolution. Defect boxes are reported in full resolution
+    coordinates, and the time spent decoding and at each level is returned
+    under ``timings`` so the thresholds can be tuned. Levels too large for
+    ``memory_budget`` are compared tile by tile.
+    """
+    if not CV2_AVAILABLE:
+        return _opencv_missing()
     
-    if len(defects) > 0:
-        defect_description.append(f"{len(defects)} defect area(s) identified")
+    started = time.perf_counter()
+    tiled = any(needs_tiling(level, memory_budget) for level in master_levels.values())
+    product = cv2.imread(product_image_path, cv2.IMREAD_GRAYSCALE if tiled else cv2.IMREAD_COLOR)
+    if product is None:
+        return None, "Error loading images"
+    timings = {'decode': round(time.perf_counter() - started, 4), 'levels': []}
+    
+    scales = sorted(master_levels, reverse=True)
+    for scale in scales:
+        master_gray = master_levels[scale]
+        if scale != 1 and min(master_gray.shape) < 7:
+            continue  # Too small for the SSIM window
         
-        # Analyze defect patterns
-        large_defects = [d for d in defects if d['area'] > 1000]
-        if large_defects:
-            fix_instructions.append("4. Large defects detected - check for:")
-            fix_instructions.append("   - Short shots (incomplete filling)")
-            fix_instructions.append("   - Flash (excess material)")
-            fix_instructions.append("   - Sink marks")
+        started = time.perf_counter()
+        level_product = product
+        if scale != 1:
+            level_product = cv2.resize(product, (master_gray.shape[1], master_gray.shape[0]), interpolation=cv2.INTER_AREA)
+        if needs_tiling(master_gray, memory_budget):
+            result = compare_gray_tiled(master_gray, level_product, memory_budget, min_area=100 / (scale * scale))
+        else:
+            result = compare_gray(master_gray, level_product, min_area=100 / (scale * scale))
+        timings['levels'].append({
+            'scale': scale,
+            'similarity_score': float(result['similarity_score']),
+            'seconds': round(time.perf_counter() - started, 4),
+        })
         
-        small_defects = [d for d in defects if d['area'] <= 1000]
-        if small_defects:
-            fix_instructions.append("5. Small defects detected - check for:")
-            fix_instructions.append("   - Surface blemishes")
-            fix_instructions.append("   - Flow marks")
-            fix_instructions.append("   - Contamination")
+        if scale == 1 or result['similarity_score'] >= accept_score or result['similarity_score'] < reject_score:
+            break
     
-    return "\n".join(defect_description), "\n".join(fix_instructions)
+    if scale != 1:
+        for defect in result['defects']:
+            defect['x'] *= scale
+            defect['y'] *= scale
+            defect['width'] *= scale
+            defect['height'] *= scale
+            defect['area'] *= scale * scale
+    
+    result['scale'] = scale
+    result['timings'] = timings
+    return result
+
+
+# Smallest region SSIM can score (the 7x7 window)
+MIN_REGION_SIZE = 7
+
+
+@functools.lru_cache(maxsize=32)
+def _read_mask(mask_path, modified, shape):
+    mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+    if mask is None:
+        raise ValueError(f"Error loading mask image: {mask_path}")
+    mask = cv2.resize(mask, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+    mask[mask > 0] = 255
+    mask.setflags(write=False)
+    return mask
 
 
-def get_defect_fix_instructions(defect_type):
+def load_region_mask(mask_path, shape):
+    """Decode an inspection mask at the master's ``shape`` (cached until the file changes)"""
+    return _read_mask(mask_path, os.path.getmtime(mask_path), tuple(shape[:2]))
+
+
+def _clip_region(region, shape):
+    """Clamp an ``{x, y, width, height}`` region to the image, or None if too small"""
+    height, width = shape[:2]
+    x0 = max(0, int(region['x']))
+    y0 = max(0, int(region['y']))
+    x1 = min(width, int(region['x']) + int(region['width']))
+    y1 = min(height, int(region['y']) + int(region['height']))
+    if x1 - x0 < MIN_REGION_SIZE or y1 - y0 < MIN_REGION_SIZE:
+        return None
+    return x0, y0, x1, y1
+
+
+def _compare_region(master_gray, product_gray, box, mask, min_area, memory_budget):
+    x0, y0, x1, y1 = box
+    master_crop = np.asarray(master_gray[y0:y1, x0:x1])
+    product_crop = product_gray[y0:y1, x0:x1]
+    mask_crop = None if mask is None else mask[y0:y1, x0:x1]
+    if needs_tiling(master_crop, memory_budget):
+        result = compare_gray_tiled(master_crop, product_crop, memory_budget, min_area=min_area)
+        if mask_crop is not None:
+            # Tiles are scored unmasked; keep only defects centred on the part
+            result['defects'] = [
+                d for d in result['defects']
+                if mask_crop[d['y'] + d['height'] // 2, d['x'] + d['width'] // 2]
+            ]
+    else:
+        result = compare_gray(master_crop, product_crop, min_area=min_area, mask=mask_crop)
+    for defect in result['defects']:
+        defect['x'] += x0
+        defect['y'] += y0
+    return result
+
+
+def compare_regions(master_gray, product_image_path, regions=None, mask_path=None, min_area=100,
+                    max_workers=None, memory_budget=None):
     """
-    Get specific fix instructions based on defect type
+    Compare only inside the inspection regions of a master.
+
+    ``regions`` is a list of ``{name, x, y, width, height}`` rectangles in
+    master image pixels (one per cavity, say) and ``mask_path`` an optional
+    image that is nonzero where the part should be inspected. Without
+    regions the bounding box of the mask is used. Regions are scored in
+    parallel threads; the overall score is that of the worst region, so one
+    bad cavity fails the shot. Per-region results are returned under
+    ``regions`` and defect boxes are in full image coordinates.
     """
-    defect_fixes = {
-        'short_shot': {
-            'causes': 'Insufficient material, low injection pressure, cold material',
-            'fixes': [
-                'Increase injection pressure',
-                'Increase material temperature',
-                'Increase injection speed',
-                'Check for material blockage',
-                'Verify adequate material supply'
-            ]
-        },
-        'flash': {
-            'causes': 'Excessive injection pressure, worn mould, insufficient clamping',
-            'fixes': [
-                'Reduce injection pressure',
-                'Reduce material temperature',
-                'Increase clamping force',
-                'Inspect and repair mould parting line',
-                'Check mould alignment'
-            ]
-        },
-        'sink_marks': {
-            'causes': 'Insufficient packing pressure, inadequate cooling',
-            'fixes': [
-                'Increase packing pressure',
-                'Extend packing time',
-                'Reduce material temperature',
-                'Increase cooling time',
-                'Optimize gate location'
-            ]
-        },
-        'warpage': {
-            'causes': 'Uneven cooling, high material temperature, residual stress',
-            'fixes': [
-                'Optimize cooling system',
-                'Reduce material temperature',
-                'Adjust packing pressure',
-                'Increase cooling time',
-                'Check mould temperature uniformity'
-            ]
-        },
-        'flow_marks': {
-            'causes': 'Low injection speed, cold material, poor venting',
-            'fixes': [
-                'Increase injection speed',
-                'Increase material temperature',
-                'Improve mould venting',
-                'Optimize gate location',
-                'Increase mould temperature'
-            ]
-        }
+    if not CV2_AVAILABLE:
+        return _opencv_missing()
+
+    started = time.perf_counter()
+    product = cv2.imread(product_image_path, cv2.IMREAD_GRAYSCALE)
+    if product is None:
+        return None, "Error loading images"
+    shape = master_gray.shape
+    if product.shape != shape:
+        product = cv2.resize(product, (shape[1], shape[0]))
+    mask = load_region_mask(mask_path, shape) if mask_path else None
+    timings = {'decode': round(time.perf_counter() - started, 4)}
+
+    if not regions:
+        if mask is None:
+            regions = [{'name': 'Full image', 'x': 0, 'y': 0, 'width': shape[1], 'height': shape[0]}]
+        else:
+            x, y, w, h = cv2.boundingRect(mask)
+            regions = [{'name': 'Mask', 'x': x, 'y': y, 'width': w, 'height': h}]
+    boxes = [(region, _clip_region(region, shape)) for region in regions]
+    boxes = [(region, box) for region, box in boxes if box is not None]
+    if not boxes:
+        return None, "No inspection region lies inside the master image"
+
+    started = time.perf_counter()
+    compare = functools.partial(
+        _compare_region, master_gray, product, mask=mask, min_area=min_area, memory_budget=memory_budget
+    )
+    max_workers = min(max_workers or os.cpu_count() or 1, len(boxes))
+    if max_workers <= 1:
+        results = [compare(box) for _, box in boxes]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(compare, [box for _, box in boxes]))
+    timings['regions'] = round(time.perf_counter() - started, 4)
+
+    defects = [defect for result in results for defect in result['defects']]
+    return {
+        'similarity_score': min(result['similarity_score'] for result in results),
+        'defects': defects,
+        'defect_count': len(defects),
+        'regions': [
+            {
+                'name': region.get('name') or f'Region {index}',
+                'similarity_score': float(result['similarity_score']),
+                'defect_count': result['defect_count'],
+            }
+            for index, ((region, _), result) in enumerate(zip(boxes, results), start=1)
+        ],
+        'timings': timings,
+    }
+
+
+def downscale(gray, scale):
+    """Shrink an image by an integer factor (used for pyramid levels)"""
+    size = (max(1, gray.shape[1] // scale), max(1, gray.shape[0] // scale))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def color_histogram(image):
+    """Normalised 8x8x8 BGR colour histogram of an image"""
+    hist = cv2.calcHist([image], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
+    return cv2.normalize(hist, hist, 1, 0, cv2.NORM_L1)
+
+
+# Rows and columns of blocks compared by the colour prefilter
+LAB_GRID = (12, 16)
+
+
+def lab_blocks(image):
+    """Mean CIE Lab colour of each block of a ``LAB_GRID`` over a BGR image"""
+    lab = cv2.cvtColor(np.float32(image) / 255.0, cv2.COLOR_BGR2Lab)
+    return cv2.resize(lab, (LAB_GRID[1], LAB_GRID[0]), interpolation=cv2.INTER_AREA)
+
+
+def color_prefilter(master, product_image_path, drift_delta_e=5.0, reject_delta_e=20.0, reject_score=40.0):
+    """
+    Cheap colour check run before the structural comparison.
+
+    Compares the colour histograms (Bhattacharyya, as a 0-100 score) and
+    the per-block Lab colour (CIE76 delta E) of a 1/4 scale decode with the
+    master. The 75th percentile of the block delta E is reported, so a
+    colour change across the part counts while a local defect does not.
+    ``drift`` is set above ``drift_delta_e``; ``rejected`` means the part is
+    so far off in colour (beyond ``reject_delta_e``, or drifting with a
+    histogram score below ``reject_score``) that the structural comparison
+    can be skipped.
+    """
+    started = time.perf_counter()
+    product = cv2.imread(product_image_path, cv2.IMREAD_REDUCED_COLOR_4)
+    if product is None:
+        return None, "Error loading images"
+    
+    distance = cv2.compareHist(master.color_hist, color_histogram(product), cv2.HISTCMP_BHATTACHARYYA)
+    histogram_score = round(max(0.0, 1 - distance) * 100, 2)
+    delta_e = np.linalg.norm(np.asarray(master.lab_blocks) - lab_blocks(product), axis=2)
+    delta_e = round(float(np.percentile(delta_e, 75)), 2)
+    return {
+        'histogram_score': histogram_score,
+        'delta_e': delta_e,
+        'drift': delta_e > drift_delta_e,
+        'rejected': delta_e > reject_delta_e or (delta_e > drift_delta_e and histogram_score < reject_score),
+        'seconds': round(time.perf_counter() - started, 4),
     }
+
+
+DESCRIPTOR_SIZE = 32
+# Share of the descriptor similarity given to the thumbnail (the rest is colour)
+DESCRIPTOR_SHAPE_WEIGHT = 0.7
+
+
+def image_descriptor(image):
+    """
+    Compact global descriptor of a (reduced) BGR image for identifying which
+    master a photo shows: a zero-mean 32x32 grayscale thumbnail and the
+    square-rooted colour histogram, each unit length and weighted so the dot
+    product of two descriptors is a similarity in [-1, 1].
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    thumb = cv2.resize(gray, (DESCRIPTOR_SIZE, DESCRIPTOR_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    thumb -= thumb.mean()
+    thumb /= np.linalg.norm(thumb) or 1.0
+    hist = np.sqrt(color_histogram(image).ravel())
+    hist /= np.linalg.norm(hist) or 1.0
+    return np.concatenate([
+        thumb * np.sqrt(DESCRIPTOR_SHAPE_WEIGHT),
+        hist * np.sqrt(1 - DESCRIPTOR_SHAPE_WEIGHT),
+    ]).astype(np.float32)
+
+
+def perceptual_hash(image_path):
+    """
+    64-bit DCT perceptual hash of an image as 16 hex digits. Re-uploads and
+    near-identical shots of the same part get the same hash.
+    """
+    image = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        raise ValueError(f"Error loading image: {image_path}")
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(np.float32(small))[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return '%016x' % int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+DEFECT_KEYS = ('x', 'y', 'width', 'height', 'area')
+
+
+def pack_defects(defects):
+    """Defect boxes as little-endian int32 rows of x, y, width, height, area"""
+    return np.array(
+        [[defect[key] for key in DEFECT_KEYS] for defect in defects], dtype='<i4'
+    ).reshape(-1, len(DEFECT_KEYS)).tobytes()
+
+
+def unpack_defects(data):
+    """Inverse of ``pack_defects``"""
+    rows = np.frombuffer(bytes(data or b''), dtype='<i4').reshape(-1, len(DEFECT_KEYS))
+    return [dict(zip(DEFECT_KEYS, map(int, row))) for row in rows]
+
+
+def defect_signature(defects, shape, grid=8):
+    """
+    Where on the part the defects are, as a ``grid`` x ``grid`` occupancy
+    bitmap in 16 hex digits (for ``grid=8``). Cells touched by any defect
+    box are set, so comparisons with defects in the same place get close
+    signatures.
+    """
+    height, width = shape[:2]
+    cells = np.zeros((grid, grid), dtype=bool)
+    for defect in defects:
+        x0 = min(grid - 1, defect['x'] * grid // width)
+        y0 = min(grid - 1, defect['y'] * grid // height)
+        x1 = min(grid - 1, (defect['x'] + max(defect['width'], 1) - 1) * grid // width)
+        y1 = min(grid - 1, (defect['y'] + max(defect['height'], 1) - 1) * grid // height)
+        cells[y0:y1 + 1, x0:x1 + 1] = True
+    return '%0*x' % (grid * grid // 4, int(''.join('1' if cell else '0' for cell in cells.flatten()), 2))
+
+
+class DecodedMaster:
+    """
+    Master sample decoded from an image path, with the same interface as
+    ``feature_store.MasterFeatures`` (``gray``, ``level``, ``levels``,
+    ``color_hist`` and ``lab_blocks``) for comparisons outside the feature
+    store
+    """
+
+    def __init__(self, image_path):
+        self.image_path = image_path
+        self._levels = {}
+        self._color_hist = None
+        self._lab_blocks = None
+
+    @property
+    def gray(self):
+        return self.level(1)
+
+    @property
+    def shape(self):
+        return self.gray.shape
+
+    def level(self, scale):
+        if 1 not in self._levels:
+            master = cv2.imread(self.image_path)
+            if master is None:
+                raise ValueError("Error loading images")
+            self._levels[1] = cv2.cvtColor(master, cv2.COLOR_BGR2GRAY)
+        if scale not in self._levels:
+            self._levels[scale] = downscale(self._levels[1], scale)
+        return self._levels[scale]
+
+    def levels(self, scales):
+        return {scale: self.level(scale) for scale in scales}
+
+    def _reduced(self):
+        master = cv2.imread(self.image_path, cv2.IMREAD_REDUCED_COLOR_4)
+        if master is None:
+            raise ValueError("Error loading images")
+        return master
+
+    @property
+    def color_hist(self):
+        if self._color_hist is None:
+            self._color_hist = color_histogram(self._reduced())
+        return self._color_hist
+
+    @property
+    def lab_blocks(self):
+        if self._lab_blocks is None:
+            self._lab_blocks = lab_blocks(self._reduced())
+        return self._lab_blocks
+
+
+# Comparison engines
+#
+# An engine is called as ``engine(master, product_image_path, **options)``,
+# where ``master`` is a ``feature_store.MasterFeatures`` or ``DecodedMaster``,
+# and returns a result in the same format as ``compare_images``. Engines
+# ignore options they do not use. Each ``MasterSample`` picks its engine.
+
+ENGINES = {}
+DEFAULT_ENGINE = 'ssim'
+
+
+def register_engine(name, label, version=1):
+    """Decorator registering a comparison engine under ``name``.
+
+    Bump ``version`` whenever the engine's scores change, so cached results
+    (see ``result_cache``) are not reused.
+    """
+    def decorator(func):
+        func.engine_name = name
+        func.label = label
+        func.version = version
+        ENGINES[name] = func
+        return func
+    return decorator
+
+
+def get_engine(name):
+    """Look up a registered comparison engine"""
+    try:
+        return ENGINES[name or DEFAULT_ENGINE]
+    except KeyError:
+        raise ValueError(f"Unknown comparison engine: {name}")
+
+
+@register_engine('ssim', 'Structural similarity (SSIM)')
+def ssim_engine(master, product_image_path, cascade=None, memory_budget=None, regions=None, mask_path=None, **options):
+    """
+    SSIM with Otsu-thresholded defect contours. ``cascade`` holds
+    ``compare_to_master_cascade`` options plus the pyramid ``scales`` to use.
+    When the master defines inspection ``regions`` or a mask, only those are
+    compared, at full resolution (see ``compare_regions``).
+    """
+    if not CV2_AVAILABLE:
+        return _opencv_missing()
+    if regions or mask_path:
+        return compare_regions(
+            master.gray, product_image_path, regions, mask_path, memory_budget=memory_budget
+        )
+    if cascade is not None:
+        cascade = dict(cascade)
+        scales = cascade.pop('scales', (4, 1))
+        return compare_to_master_cascade(
+            master.levels(scales), product_image_path, memory_budget=memory_budget, **cascade
+        )
+    return compare_to_master(master.gray, product_image_path, memory_budget=memory_budget)
+
+
+@register_engine('histogram', 'Colour histogram distance')
+def histogram_engine(master, product_image_path, **options):
+    """
+    Colour histogram similarity (Bhattacharyya). Very fast and sensitive
+    to colour problems, but does not locate defects.
+    """
+    if not CV2_AVAILABLE:
+        return _opencv_missing()
+    
+    product = cv2.imread(product_image_path, cv2.IMREAD_REDUCED_COLOR_4)
+    if product is None:
+        return None, "Error loading images"
     
-    return defect_fixes.get(defect_type, {})
+    distance = cv2.compareHist(master.color_hist, color_histogram(product), cv2.HISTCMP_BHATTACHARYYA)
+    return {
+        'similarity_score': round(max(0.0, 1 - distance) * 100, 2),
+        'defects': [],
+        'defect_count': 0
+    }
+
+
+PHASE_DIFF_THRESHOLD = 40
+
+
+@register_engine('phase', 'Phase-correlation aligned difference')
+def phase_engine(master, product_image_path, min_area=100, **options):
+    """
+    Align the product to the master with phase correlation (estimated on the
+    1/4 scale level) before differencing, so small shifts of the part in the
+    fixture are not reported as defects. Scores with normalised
+    cross-correlation of the aligned images.
+    """
+    if not CV2_AVAILABLE:
+        return _opencv_missing()
+    
+    product = cv2.imread(product_image_path, cv2.IMREAD_GRAYSCALE)
+    if product is None:
+        return None, "Error loading images"
+    
+    master_gray = np.asarray(master.gray)
+    height, width = master_gray.shape
+    product = cv2.resize(product, (width, height))
+    
+    # Estimate the shift on the coarse level, then scale it up
+    coarse_master = np.float32(master.level(4))
+    coarse_product = np.float32(downscale(product, 4))
+    window = cv2.createHanningWindow((coarse_master.shape[1], coarse_master.shape[0]), cv2.CV_32F)
+    (dx, dy), _ = cv2.phaseCorrelate(coarse_master, coarse_product, window)
+    shift = np.float32([[1, 0, -dx * 4], [0, 1, -dy * 4]])
+    aligned = cv2.warpAffine(product, shift, (width, height), borderMode=cv2.BORDER_REPLICATE)
+    
+    correlation = cv2.matchTemplate(aligned, master_gray, cv2.TM_CCOEFF_NORMED)[0][0]
+    
+    diff = cv2.GaussianBlur(cv2.absdiff(master_gray, aligned), (5, 5), 0)
+    thresh = cv2.threshold(diff, PHASE_DIFF_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    
+    defects = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area > min_area:
+            x, y, w, h = cv2.boundingRect(contour)
+            defects.append({
+                'x': int(x),
+                'y': int(y),
+                'width': int(w),
+                'height': int(h),
+                'area': int(area)
+            })
+    
+    return {
+        'similarity_score': round(max(0.0, float(correlation)) * 100, 2),
+        'defects': defects,
+        'defect_count': len(defects),
+        'shift': [round(dx * 4, 2), round(dy * 4, 2)]
+    }
+
+
+ENGINE_CHOICES = [(name, engine.label) for name, engine in ENGINES.items()]
+
+
+def run_engine(name, master, product_image_path, color_check=None, **options):
+    """
+    Run comparison engine ``name``, preceded by the colour prefilter when
+    ``color_check`` holds its thresholds (see ``color_prefilter``). Parts
+    rejected on colour are not compared structurally; their score is the
+    colour histogram score. The prefilter result is returned under ``color``.
+    """
+    color = None
+    if color_check and CV2_AVAILABLE:
+        color = color_prefilter(master, product_image_path, **color_check)
+        if not isinstance(color, dict):
+            return color
+        if color['rejected']:
+            return {
+                'similarity_score': color['histogram_score'],
+                'defects': [],
+                'defect_count': 0,
+                'color': color,
+                'timings': {'color': color['seconds']},
+            }
+    
+    result = get_engine(name)(master, product_image_path, **options)
+    if isinstance(result, dict) and color is not None:
+        result['color'] = color
+        result['timings'] = dict(result.get('timings') or {}, color=color['seconds'])
+    return result
+
+
+def _compare_batch_item(product_image_path, master, engine, options):
+    try:
+        return run_engine(engine, master, product_image_path, **(options or {}))
+    except Exception as e:
+        return None, str(e)
+
+
+def compare_images_batch(master, product_image_paths, engine=DEFAULT_ENGINE, **options):
+    """
+    Compare many product images against one master.
+
+    ``master`` is an image path or a master object (see ``DecodedMaster``).
+    The master is decoded once and the products are compared one after the
+    other in this process: batches already run in a comparison worker, and
+    the worker pool spreads batches over the CPUs. Results come back in
+    input order, in the same format as ``compare_images``. ``options`` are
+    passed on to the engine.
+    """
+    if not CV2_AVAILABLE:
+        return [_opencv_missing() for _ in product_image_paths]
+    
+    if isinstance(master, str):
+        master = DecodedMaster(master)
+        try:
+            master.gray  # An unreadable master fails every product at once
+        except ValueError as e:
+            return [(None, str(e)) for _ in product_image_paths]
+    
+    return [_compare_batch_item(path, master, engine, options) for path in product_image_paths]
+
+
+def analyze_defects(defects, similarity_score):
+    """
+    Analyze defects and provide fix instructions from the score bands and
+    defect size classes (see ``defect_rules``)
+    """
+    return get_rules().evaluate(defects, similarity_score)
+
+
+def describe_color_drift(color, defect_description, fix_instructions):
+    """Add a colour drift finding to the ``analyze_defects`` texts"""
+    if color.get('rejected'):
+        defect_description = (
+            f"Colour does not match master sample (delta E {color['delta_e']}, "
+            f"histogram score {color['histogram_score']}%) - rejected before structural comparison"
+        )
+        fix_instructions = ""
+    else:
+        defect_description = f"Colour drift detected (delta E {color['delta_e']})\n{defect_description}"
+    steps = [
+        "Colour - check:",
+        "   - Masterbatch / colourant dosing ratio",
+        "   - Material lot and regrind percentage",
+        "   - Barrel temperature and residence time (degradation)",
+        "   - Material drying",
+    ]
+    fix_instructions = "\n".join(filter(None, [fix_instructions] + steps))
+    return defect_description, fix_instructions
@@ -11,10 +11,18 @@ from .forms import (
     MouldChangeForm, TroubleshootingLogForm, HourlyChecklistForm,
     MasterSampleForm, ProductComparisonForm, MouldRunForm, ProductionOrderForm,
     IssueForm, IssueResolveForm, MaintenanceJobCardForm, IssueCommentForm,
-    HousekeepingTaskForm, HousekeepingCompleteForm
+    HousekeepingTaskForm, HousekeepingCompleteForm, ProductComparisonBatchForm,
+    ProductComparisonVideoForm
 )
-from .utils import compare_images, analyze_defects
+from . import live
+from .dashboard import snapshot as dashboard_snapshot
+from .pagination import paginate
+from .tasks import enqueue_comparison, enqueue_comparison_batch, enqueue_video_comparison
+from django.db import transaction
+from django.db.models import Count
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 import os
+import uuid
 
 
 def dashboard(request):
@@ -26,26 +34,29 @@ def dashboard(request):
     if not request.user.is_authenticated:
         return redirect('login_home')
 
-    context = {
-        'active_moulds': Mould.objects.filter(is_active=True).count(),
-        'pending_changes': MouldChange.objects.filter(status='planned').count(),
-        'open_issues': Issue.objects.filter(status__in=['open', 'in_progress']).count(),
-        'recent_checklists': HourlyChecklist.objects.order_by('-check_time')[:5],
-        'active_runs': MouldRun.objects.filter(is_active=True).order_by('-start_time'),
-        'pending_orders': ProductionOrder.objects.filter(status='pending').order_by('priority', 'due_date'),
-        'urgent_orders': ProductionOrder.objects.filter(status='pending', priority='urgent').count(),
-        'critical_issues': Issue.objects.filter(status__in=['open', 'in_progress'], priority='critical').count(),
-        'open_issues_list': Issue.objects.filter(status__in=['open', 'in_progress']).order_by('-priority', '-reported_date')[:5],
-        'pending_housekeeping': HousekeepingTask.objects.filter(status='pending').count(),
-        'active_housekeeping': HousekeepingTask.objects.filter(status='in_progress').count(),
-    }
+    context = dashboard_snapshot()
     return render(request, 'moulding/dashboard.html', context)
 
 
+def live_stream(request, screen):
+    """Server-sent events with the changes to a wall screen (see live.py)"""
+    if not request.user.is_authenticated:
+        return HttpResponse(status=403)
+    if screen not in live.SCREENS:
+        raise Http404(f"Unknown screen: {screen}")
+    response = StreamingHttpResponse(live.stream(screen), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # Mould Change Views
 def mould_change_list(request):
     """List all mould changes"""
-    changes = MouldChange.objects.all().order_by('-scheduled_time')
+    changes = paginate(
+        request, MouldChange.objects.select_related('mould_from', 'mould_to', 'operator'), ['-scheduled_time']
+    )
     return render(request, 'moulding/mould_change_list.html', {'changes': changes})
 
 
@@ -75,12 +86,13 @@ def mould_change_create(request):
 def mould_change_update_status(request, pk, status):
     """Update mould change status"""
     change = get_object_or_404(MouldChange, pk=pk)
-    change.status = status
-    if status == 'in_progress' and not change.start_time:
-        change.start_time = timezone.now()
-    elif status == 'completed' and not change.end_time:
-        change.end_time = timezone.now()
-    change.save()
+    with transaction.atomic():
+        change.status = status
+        if status == 'in_progress' and not change.start_time:
+            change.start_time = timezone.now()
+        elif status == 'completed' and not change.end_time:
+            change.end_time = timezone.now()
+        change.save()
     messages.success(request, f'Mould change status updated to {status}')
     return redirect('mould_change_list')
 
@@ -89,7 +101,7 @@ def mould_change_update_status(request, pk, status):
 def troubleshooting_list(request):
     """List troubleshooting issues and logs"""
     issues = TroubleshootingIssue.objects.all()
-    logs = TroubleshootingLog.objects.all().order_by('-created_at')
+    logs = paginate(request, TroubleshootingLog.objects.select_related('issue', 'mould', 'operator'), ['-created_at'])
     return render(request, 'moulding/troubleshooting_list.html', {
         'issues': issues,
         'logs': logs
@@ -130,7 +142,7 @@ def troubleshooting_log_create(request):
 # Hourly Checklist Views
 def checklist_list(request):
     """List hourly checklists"""
-    checklists = HourlyChecklist.objects.all().order_by('-check_time')
+    checklists = paginate(request, HourlyChecklist.objects.select_related('mould', 'operator'), ['-check_time'])
     return render(request, 'moulding/checklist_list.html', {'checklists': checklists})
 
 
@@ -160,7 +172,7 @@ def checklist_create(request):
 # Master Sample and Comparison Views
 def master_sample_list(request):
     """List master samples"""
-    samples = MasterSample.objects.filter(is_active=True)
+    samples = MasterSample.objects.filter(is_active=True).select_related('defect_heatmap')
     return render(request, 'moulding/master_sample_list.html', {'samples': samples})
 
 
@@ -187,6 +199,20 @@ def master_sample_create(request):
     return render(request, 'moulding/master_sample_form.html', {'form': form})
 
 
+def master_sample_heatmap(request, pk):
+    """PNG of where defects have been found on a master sample"""
+    from .models import DefectHeatmap
+    from . import feature_store, heatmap
+    defect_heatmap = get_object_or_404(DefectHeatmap.objects.select_related('master_sample'), master_sample_id=pk)
+    try:
+        background = feature_store.load(defect_heatmap.master_sample).level(4)
+    except (OSError, ValueError):
+        background = None
+    response = HttpResponse(heatmap.render(defect_heatmap, background), content_type='image/png')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
 def product_comparison_create(request):
     """Compare product with master sample"""
     if request.method == 'POST':
@@ -202,31 +228,19 @@ def product_comparison_create(request):
                     defaults={'first_name': 'Default', 'last_name': 'Operator'}
                 )
                 comparison.operator = default_user
+            if form.identification:
+                comparison.identification_confidence = form.identification['confidence']
+            comparison.status = 'pending'
             comparison.save()
             
-            # Perform image comparison
-            master_path = comparison.master_sample.image.path
-            product_path = comparison.product_image.path
-            
+            # Queue the image comparison for the worker pool
             try:
-                result = compare_images(master_path, product_path)
-                if result:
-                    comparison.similarity_score = result['similarity_score']
-                    comparison.defects_found = result['defect_count'] > 0
-                    
-                    # Generate defect description and fix instructions
-                    defect_desc, fix_inst = analyze_defects(
-                        result['defects'],
-                        result['similarity_score']
-                    )
-                    comparison.defect_description = defect_desc
-                    comparison.fix_instructions = fix_inst
-                    
-                    comparison.save()
-                    messages.success(request, f'Comparison complete! Similarity: {result["similarity_score"]}%')
-                else:
-                    messages.error(request, 'Error comparing images')
+                enqueue_comparison(comparison.pk)
+                messages.success(request, 'Comparison queued. Results will appear shortly.')
             except Exception as e:
+                comparison.status = 'failed'
+                comparison.error_message = str(e)
+                comparison.save(update_fields=['status', 'error_message'])
                 messages.error(request, f'Error during comparison: {str(e)}')
             
             return redirect('comparison_detail', pk=comparison.pk)
@@ -235,15 +249,153 @@ def product_comparison_create(request):
     return render(request, 'moulding/product_comparison_form.html', {'form': form})
 
 
+def product_comparison_batch_create(request):
+    """Compare a tray of product photos with one master sample"""
+    if request.method == 'POST':
+        form = ProductComparisonBatchForm(request.POST, request.FILES)
+        if form.is_valid():
+            if request.user.is_authenticated:
+                operator = request.user
+            else:
+                from django.contrib.auth.models import User
+                operator, _ = User.objects.get_or_create(
+                    username='operator',
+                    defaults={'first_name': 'Default', 'last_name': 'Operator'}
+                )
+            batch_id = uuid.uuid4().hex
+            # Save each photo through the model (shrinking, thumbnails, hash
+            # and counter signals) but commit the tray as a whole
+            comparison_ids = []
+            with transaction.atomic():
+                for image in form.cleaned_data['product_images']:
+                    comparison = ProductComparison.objects.create(
+                        master_sample=form.cleaned_data['master_sample'],
+                        product_image=image,
+                        operator=operator,
+                        machine_number=form.cleaned_data['machine_number'],
+                        notes=form.cleaned_data['notes'],
+                        batch_id=batch_id,
+                    )
+                    comparison_ids.append(comparison.pk)
+            
+            # Queue the whole tray as one job so the master is loaded once
+            try:
+                enqueue_comparison_batch(comparison_ids)
+                messages.success(request, f'{len(comparison_ids)} comparisons queued.')
+            except Exception as e:
+                ProductComparison.objects.filter(batch_id=batch_id).update(
+                    status='failed', error_message=str(e)
+                )
+                messages.error(request, f'Error during comparison: {str(e)}')
+            
+            return redirect('comparison_batch_detail', batch_id=batch_id)
+    else:
+        form = ProductComparisonBatchForm()
+    return render(request, 'moulding/product_comparison_batch_form.html', {'form': form})
+
+
+def product_comparison_video_create(request):
+    """Compare the frames of a short product video clip with a master sample"""
+    if request.method == 'POST':
+        form = ProductComparisonVideoForm(request.POST, request.FILES)
+        if form.is_valid():
+            if request.user.is_authenticated:
+                operator = request.user
+            else:
+                from django.contrib.auth.models import User
+                operator, _ = User.objects.get_or_create(
+                    username='operator',
+                    defaults={'first_name': 'Default', 'last_name': 'Operator'}
+                )
+            comparison = ProductComparison.objects.create(
+                master_sample=form.cleaned_data['master_sample'],
+                product_video=form.cleaned_data['product_video'],
+                operator=operator,
+                machine_number=form.cleaned_data['machine_number'],
+                notes=form.cleaned_data['notes'],
+            )
+            
+            try:
+                enqueue_video_comparison(comparison.pk)
+                messages.success(request, 'Video comparison queued.')
+            except Exception as e:
+                comparison.status = 'failed'
+                comparison.error_message = str(e)
+                comparison.save(update_fields=['status', 'error_message'])
+                messages.error(request, f'Error during comparison: {str(e)}')
+            
+            return redirect('comparison_detail', pk=comparison.pk)
+    else:
+        form = ProductComparisonVideoForm()
+    return render(request, 'moulding/product_comparison_video_form.html', {'form': form})
+
+
+def comparison_batch_detail(request, batch_id):
+    """View the results of a batch comparison"""
+    comparisons = ProductComparison.objects.filter(batch_id=batch_id).select_related(
+        'master_sample__mould', 'operator'
+    ).order_by('pk')
+    if not comparisons:
+        raise Http404('Batch not found')
+    return render(request, 'moulding/comparison_batch_detail.html', {
+        'batch_id': batch_id,
+        'comparisons': comparisons,
+        'processing': any(comparison.is_processing() for comparison in comparisons),
+    })
+
+
+def comparison_batch_status(request, batch_id):
+    """Per-status counts for a batch, for polling while the workers run"""
+    counts = dict(
+        ProductComparison.objects.filter(batch_id=batch_id)
+        .values_list('status').annotate(total=Count('pk'))
+    )
+    return JsonResponse({
+        'batch_id': batch_id,
+        'counts': counts,
+        'complete': bool(counts) and not (counts.get('pending') or counts.get('running')),
+    })
+
+
 def comparison_detail(request, pk):
     """View comparison results"""
     comparison = get_object_or_404(ProductComparison, pk=pk)
     return render(request, 'moulding/comparison_detail.html', {'comparison': comparison})
 
 
+def comparison_similar(request, pk):
+    """Past comparisons that looked most like this one, with their fixes"""
+    from .defect_search import similar_comparisons
+    comparison = get_object_or_404(ProductComparison.objects.select_related('master_sample'), pk=pk)
+    same_master = request.GET.get('same_master') == '1'
+    matches = similar_comparisons(comparison, k=20, same_master=same_master)
+    return render(request, 'moulding/comparison_similar.html', {
+        'comparison': comparison,
+        'matches': matches,
+        'same_master': same_master,
+    })
+
+
+def comparison_status(request, pk):
+    """Lightweight comparison status for polling while the worker runs"""
+    comparison = get_object_or_404(
+        ProductComparison.objects.only('status', 'similarity_score', 'defects_found', 'error_message'),
+        pk=pk
+    )
+    return JsonResponse({
+        'id': comparison.pk,
+        'status': comparison.status,
+        'similarity_score': comparison.similarity_score,
+        'defects_found': comparison.defects_found,
+        'error_message': comparison.error_message,
+    })
+
+
 def comparison_list(request):
     """List all comparisons"""
-    comparisons = ProductComparison.objects.all().order_by('-created_at')
+    comparisons = paginate(
+        request, ProductComparison.objects.select_related('master_sample__mould', 'operator'), ['-created_at']
+    )
     return render(request, 'moulding/comparison_list.html', {'comparisons': comparisons})
 
 
@@ -263,8 +415,11 @@ def defect_type_detail(request, pk):
 # Mould Run Views
 def mould_run_list(request):
     """List all mould runs"""
-    runs = MouldRun.objects.all().order_by('-start_time')
-    return render(request, 'moulding/mould_run_list.html', {'runs': runs})
+    runs = MouldRun.objects.select_related('mould').order_by('-start_time')
+    return render(request, 'moulding/mould_run_list.html', {
+        'active_runs': runs.filter(is_active=True),
+        'completed_runs': paginate(request, runs.filter(is_active=False), ['-start_time']),
+    })
 
 
 def mould_run_create(request):
@@ -298,9 +453,10 @@ def mould_run_create(request):
 def mould_run_stop(request, pk):
     """Stop a mould run"""
     run = get_object_or_404(MouldRun, pk=pk)
-    run.is_active = False
-    run.end_time = timezone.now()
-    run.save()
+    with transaction.atomic():
+        run.is_active = False
+        run.end_time = timezone.now()
+        run.save()
     messages.success(request, f'Mould run stopped for {run.mould}')
     return redirect('dashboard')
 
@@ -350,17 +506,28 @@ def production_order_detail(request, pk):
 def production_order_update_status(request, pk, status):
     """Update production order status"""
     order = get_object_or_404(ProductionOrder, pk=pk)
-    order.status = status
-    if status == 'in_progress' and not order.start_date:
-        order.start_date = timezone.now().date()
-    elif status == 'completed' and not order.completion_date:
-        order.completion_date = timezone.now().date()
-    order.save()
+    with transaction.atomic():
+        order.status = status
+        if status == 'in_progress' and not order.start_date:
+            order.start_date = timezone.now().date()
+        elif status == 'completed' and not order.completion_date:
+            order.completion_date = timezone.now().date()
+        order.save()
     messages.success(request, f'Order {order.order_number} status updated to {status}')
     return redirect('production_order_list')
 
 
 # Issue Management Views
+# Summary count of issue_list for each category type
+ISSUE_CATEGORY_COUNTS = {
+    'customer_complaint': 'customer_complaints',
+    'mould_issue': 'mould_issues',
+    'product_defect': 'product_defects',
+    'machine_issue': 'machine_issues',
+    'maintenance': 'maintenance_issues',
+}
+
+
 def issue_list(request):
     """List all issues"""
     issues = Issue.objects.all()
@@ -376,16 +543,21 @@ def issue_list(request):
     if status_filter:
         issues = issues.filter(status=status_filter)
     
+    # One grouped query gives every summary count
+    counts = dict.fromkeys(['open_issues', 'resolved_issues', *ISSUE_CATEGORY_COUNTS.values()], 0)
+    groups = issues.order_by().values_list('status', 'category__category_type').annotate(total=Count('pk'))
+    for status, category_type, total in groups:
+        if status in ('open', 'in_progress'):
+            counts['open_issues'] += total
+        elif status == 'resolved':
+            counts['resolved_issues'] += total
+        if category_type in ISSUE_CATEGORY_COUNTS:
+            counts[ISSUE_CATEGORY_COUNTS[category_type]] += total
+    
     context = {
-        'issues': issues,
+        'issues': paginate(request, issues.select_related('category', 'reported_by'), Issue._meta.ordering),
         'categories': categories,
-        'open_issues': issues.filter(status__in=['open', 'in_progress']),
-        'resolved_issues': issues.filter(status='resolved'),
-        'customer_complaints': issues.filter(category__category_type='customer_complaint'),
-        'mould_issues': issues.filter(category__category_type='mould_issue'),
-        'product_defects': issues.filter(category__category_type='product_defect'),
-        'machine_issues': issues.filter(category__category_type='machine_issue'),
-        'maintenance_issues': issues.filter(category__category_type='maintenance'),
+        **counts,
     }
     return render(request, 'moulding/issue_list.html', context)
 
@@ -451,16 +623,17 @@ def issue_detail(request, pk):
 def issue_update_status(request, pk, status):
     """Update issue status"""
     issue = get_object_or_404(Issue, pk=pk)
-    issue.status = status
-    
-    if status == 'in_progress' and not issue.started_date:
-        issue.started_date = timezone.now()
-    elif status == 'resolved' and not issue.resolved_date:
-        issue.resolved_date = timezone.now()
-    elif status == 'closed' and not issue.closed_date:
-        issue.closed_date = timezone.now()
-    
-    issue.save()
+    with transaction.atomic():
+        issue.status = status
+        
+        if status == 'in_progress' and not issue.started_date:
+            issue.started_date = timezone.now()
+        elif status == 'resolved' and not issue.resolved_date:
+            issue.resolved_date = timezone.now()
+        elif status == 'closed' and not issue.closed_date:
+            issue.closed_date = timezone.now()
+        
+        issue.save()
     messages.success(request, f'Issue {issue.issue_number} status updated to {status}')
     return redirect('issue_detail', pk=pk)
 
@@ -472,10 +645,11 @@ def issue_resolve(request, pk):
     if request.method == 'POST':
         form = IssueResolveForm(request.POST, instance=issue)
         if form.is_valid():
-            issue = form.save(commit=False)
-            issue.status = 'resolved'
-            issue.resolved_date = timezone.now()
-            issue.save()
+            with transaction.atomic():
+                issue = form.save(commit=False)
+                issue.status = 'resolved'
+                issue.resolved_date = timezone.now()
+                issue.save()
             messages.success(request, f'Issue {issue.issue_number} resolved!')
             return redirect('issue_detail', pk=pk)
     else:
@@ -489,7 +663,7 @@ def job_card_list(request):
     """List all maintenance job cards"""
     job_cards = MaintenanceJobCard.objects.all()
     context = {
-        'job_cards': job_cards,
+        'job_cards': paginate(request, job_cards, MaintenanceJobCard._meta.ordering),
         'pending': job_cards.filter(status='pending'),
         'in_progress': job_cards.filter(status='in_progress'),
         'completed': job_cards.filter(status='completed'),
@@ -523,14 +697,15 @@ def job_card_create(request):
 def job_card_update_status(request, pk, status):
     """Update job card status"""
     job_card = get_object_or_404(MaintenanceJobCard, pk=pk)
-    job_card.status = status
-    
-    if status == 'in_progress' and not job_card.started_date:
-        job_card.started_date = timezone.now()
-    elif status == 'completed' and not job_card.completed_date:
-        job_card.completed_date = timezone.now()
-    
-    job_card.save()
+    with transaction.atomic():
+        job_card.status = status
+        
+        if status == 'in_progress' and not job_card.started_date:
+            job_card.started_date = timezone.now()
+        elif status == 'completed' and not job_card.completed_date:
+            job_card.completed_date = timezone.now()
+        
+        job_card.save()
     messages.success(request, f'Job card {job_card.job_card_number} status updated')
     return redirect('job_card_list')
 
@@ -553,7 +728,7 @@ def housekeeping_list(request):
     """List all housekeeping tasks"""
     tasks = HousekeepingTask.objects.all()
     context = {
-        'tasks': tasks,
+        'tasks': paginate(request, tasks.select_related('assigned_to'), HousekeepingTask._meta.ordering),
         'pending': tasks.filter(status='pending'),
         'in_progress': tasks.filter(status='in_progress'),
         'completed': tasks.filter(status='completed'),
@@ -599,10 +774,11 @@ def housekeeping_complete(request, pk):
     if request.method == 'POST':
         form = HousekeepingCompleteForm(request.POST, request.FILES, instance=task)
         if form.is_valid():
-            task = form.save(commit=False)
-            task.status = 'completed'
-            task.completed_at = timezone.now()
-            task.save()
+            with transaction.atomic():
+                task = form.save(commit=False)
+                task.status = 'completed'
+                task.completed_at = timezone.now()
+                task.save()
             messages.success(request, f'Housekeeping task {task.task_number} completed!')
             return redirect('housekeeping_detail', pk=pk)
     else:
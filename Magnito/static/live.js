@@ -0,0 +1,83 @@
+// Patches a wall screen from the server-sent events of moulding/live.py.
+//
+//   data-live-counter="name"   text replaced with the counter's value
+//   data-live-nonzero="name"   hidden while the counter is 0
+//   data-live-list="name"      children with data-live-id kept in the server's order
+//   data-live-empty="name"     shown only while the list is empty
+//   data-live-any="name"       shown only while the list has items
+(function () {
+    const url = document.currentScript.dataset.liveUrl;
+    if (!url || !window.EventSource) {
+        return;
+    }
+
+    function each(attribute, name, callback) {
+        document.querySelectorAll(`[${attribute}="${name}"]`).forEach(callback);
+    }
+
+    function fragment(html) {
+        const template = document.createElement('template');
+        template.innerHTML = html.trim();
+        return template.content.firstElementChild;
+    }
+
+    function updateCounters(counters) {
+        Object.entries(counters).forEach(([name, value]) => {
+            each('data-live-counter', name, element => { element.textContent = value; });
+            each('data-live-nonzero', name, element => { element.hidden = !value; });
+        });
+    }
+
+    function updateList(name, list) {
+        each('data-live-list', name, container => {
+            const existing = {};
+            container.querySelectorAll(':scope > [data-live-id]').forEach(element => {
+                existing[element.dataset.liveId] = element;
+            });
+
+            if (list.partial) {
+                // Newest first: change rows in place and add new ones at the top
+                let first = container.firstElementChild;
+                list.order.forEach(id => {
+                    if (!(id in list.html)) {
+                        return;
+                    }
+                    const element = fragment(list.html[id]);
+                    if (existing[id]) {
+                        existing[id].replaceWith(element);
+                    } else {
+                        container.insertBefore(element, first);
+                    }
+                });
+                return;
+            }
+
+            list.order.forEach(id => {
+                let element = existing[id];
+                if (id in list.html) {
+                    const updated = fragment(list.html[id]);
+                    if (element) {
+                        element.replaceWith(updated);
+                    }
+                    element = updated;
+                }
+                delete existing[id];
+                if (element) {
+                    container.appendChild(element);
+                }
+            });
+            Object.values(existing).forEach(element => element.remove());
+        });
+
+        const count = list.order.length;
+        each('data-live-empty', name, element => { element.hidden = count > 0; });
+        each('data-live-any', name, element => { element.hidden = count === 0; });
+    }
+
+    const source = new EventSource(url);
+    source.addEventListener('update', event => {
+        const delta = JSON.parse(event.data);
+        updateCounters(delta.counters || {});
+        Object.entries(delta.lists || {}).forEach(([name, list]) => updateList(name, list));
+    });
+})();
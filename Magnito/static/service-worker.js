@@ -14,6 +14,10 @@ self.addEventListener('install', event => {
 
 // Fetch from cache, fallback to network
 self.addEventListener('fetch', event => {
+  // Leave live update streams to the browser
+  if (event.request.headers.get('Accept') === 'text/event-stream') {
+    return;
+  }
   event.respondWith(
     caches.match(event.request)
       .then(response => {